@@ -0,0 +1,374 @@
+"""
+Benchmarks for the trees and segment trees.
+
+    python benchmark/bench.py --sizes 1000 100000 --output results.json
+    python benchmark/bench.py --baseline results.json --threshold 0.15
+
+Every case is a (structure, operation, distribution, size) tuple. Each operation is timed one call at a time, giving
+throughput and latency percentiles; peak memory is measured in a separate run of the build under `tracemalloc`, so
+tracing does not skew the timings. Inputs come from a seeded generator, so runs with the same arguments see the
+same keys. With `--baseline`, cases whose throughput drops or whose memory grows by more than `--threshold` are
+reported and the exit status is 1.
+"""
+import argparse
+import gc
+import heapq
+import json
+import math
+import operator
+import os
+import platform
+import random
+import sys
+from bisect import bisect_left
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pyds'))
+
+from SortedBlockMap import SortedBlockMap
+from tree.ArraySegmentTreeImpl import ArraySegmentTreeImpl
+from tree.BasicBSTImpl import BasicBSTImpl
+from tree.FenwickTreeImpl import FenwickTreeImpl
+from tree.RedBlackTreeImpl import RedBlackTreeImpl
+from tree.SplayTreeImpl import SplayTreeImpl
+from tree.TreapImpl import TreapImpl
+from treenode.BinaryIndexTreeNode import BinaryIndexTreeNode
+
+DISTRIBUTIONS = ('sorted', 'random', 'adversarial', 'zipfian')
+# about 90% of the draws then hit the hottest 1% of 10^5 keys
+ZIPF_EXPONENT = 1.3
+
+
+def make_keys(n, distribution, rnd):
+    """
+    :param distribution: 'sorted', 'random', or 'adversarial': alternately the smallest and largest keys left, which
+    keeps rebalancing busy and degenerates an unbalanced tree. 'zipfian' inserts in random order like 'random', its
+    lookups are skewed, see :func:`make_probes`
+    """
+    if distribution == 'sorted':
+        return list(range(n))
+    if distribution in ('random', 'zipfian'):
+        keys = list(range(n))
+        rnd.shuffle(keys)
+        return keys
+    if distribution == 'adversarial':
+        keys = []
+        low, high = 0, n - 1
+        while low <= high:
+            keys.append(low)
+            if low != high:
+                keys.append(high)
+            low += 1
+            high -= 1
+        return keys
+    raise ValueError("unknown distribution %s" % distribution)
+
+
+def zipf_sample(population, count, rnd, exponent=ZIPF_EXPONENT):
+    """
+    `count` items of `population` drawn with replacement, the i-th item with probability proportional to
+    1 / (i + 1) ** `exponent`. items are ranked in a random order, so the hot ones are spread over the key space
+    """
+    ranked = list(population)
+    rnd.shuffle(ranked)
+    weights = []
+    total = 0.0
+    for i in range(len(ranked)):
+        total += 1.0 / (i + 1) ** exponent
+        weights.append(total)
+    return [ranked[bisect_left(weights, rnd.random() * total)] for _ in range(count)]
+
+
+def zipf_distinct(population, count, rnd, exponent=ZIPF_EXPONENT):
+    """
+    up to `count` distinct items of `population`, drawn without replacement with the weights of :func:`zipf_sample`,
+    so the hot items tend to come first
+    """
+    ranked = list(population)
+    rnd.shuffle(ranked)
+    # Efraimidis-Spirakis: the items of greatest log(u) / weight form a weighted sample without replacement, in order
+    return [item for _, item in heapq.nlargest(
+        count, ((math.log(1.0 - rnd.random()) * (i + 1) ** exponent, item) for i, item in enumerate(ranked)))]
+
+
+def make_probes(keys, distribution, rnd, count, distinct=False):
+    """
+    keys for lookups and deletes: distinct keys picked uniformly, or following a Zipf distribution for 'zipfian'
+    :param distinct: draw 'zipfian' keys without replacement, so deletes never time a key already removed
+    """
+    if distribution == 'zipfian':
+        if distinct:
+            return zipf_distinct(keys, count, rnd)
+        return zipf_sample(keys, count, rnd)
+    return rnd.sample(keys, min(count, len(keys)))
+
+
+def make_ranges(n, distribution, rnd, count):
+    """
+    ranges for segment tree queries: 'sorted' slides a window over the array, 'random' picks random bounds,
+    'adversarial' spans all but the first and last element, which visits the most nodes, and 'zipfian' picks both
+    bounds from a Zipf distribution over the indices
+    """
+    if distribution == 'sorted':
+        width = max(n // 16, 1)
+        return [(i % n, min(i % n + width, n - 1)) for i in range(count)]
+    if distribution == 'random':
+        ranges = []
+        for _ in range(count):
+            low, high = rnd.randrange(n), rnd.randrange(n)
+            ranges.append((min(low, high), max(low, high)))
+        return ranges
+    if distribution == 'adversarial':
+        return [(1 % n, max(n - 2, 1 % n))] * count
+    if distribution == 'zipfian':
+        bounds = zipf_sample(range(n), 2 * count, rnd)
+        return [(min(low, high), max(low, high)) for low, high in zip(bounds[::2], bounds[1::2])]
+    raise ValueError("unknown distribution %s" % distribution)
+
+
+def _timed(func, args):
+    """
+    call `func` with each item of `args`
+    :return: list of latencies in seconds
+    """
+    latencies = []
+    timer = default_timer
+    for arg in args:
+        start = timer()
+        func(arg)
+        latencies.append(timer() - start)
+    return latencies
+
+
+class _TreeCase(object):
+    def __init__(self, factory, priorities=False):
+        self.factory = factory
+        self.priorities = priorities
+
+    def build(self, keys, rnd):
+        tree = self.factory()
+        if self.priorities:
+            for key in keys:
+                tree.insert(key=key, priority=rnd.random())
+        else:
+            for key in keys:
+                tree.insert(key=key)
+        return tree
+
+    def run(self, op, keys, distribution, rnd, ops):
+        """
+        :return: list of latencies of `op`
+        """
+        if op == 'insert':
+            tree = self.factory()
+            if self.priorities:
+                items = [(key, rnd.random()) for key in keys]
+                return _timed(lambda item: tree.insert(key=item[0], priority=item[1]), items)
+            return _timed(lambda key: tree.insert(key=key), keys)
+        tree = self.build(keys, rnd)
+        probes = make_probes(keys, distribution, rnd, ops, distinct=op == 'delete')
+        if op == 'search':
+            return _timed(tree.search, probes)
+        if op == 'delete':
+            return _timed(tree.delete, probes)
+        if op in ('split', 'join'):
+            latencies = []
+            for key in probes:
+                start = default_timer()
+                res = tree.split(key)
+                split = default_timer() - start
+                start = default_timer()
+                tree = tree.join(res.left, res.right)
+                latencies.append(split if op == 'split' else default_timer() - start)
+            return latencies
+        raise ValueError(op)
+
+
+class _SegmentCase(object):
+    def __init__(self, factory):
+        self.factory = factory
+
+    def build(self, keys, rnd):
+        tree = self.factory()
+        tree.build(keys)
+        return tree
+
+    def run(self, op, keys, distribution, rnd, ops):
+        if op == 'build':
+            tree = self.factory()
+            start = default_timer()
+            tree.build(keys)
+            return [default_timer() - start]
+        tree = self.build(keys, rnd)
+        ranges = make_ranges(len(keys), distribution, rnd, min(ops, len(keys)))
+        if op == 'query':
+            return _timed(lambda r: tree.query(r[0], r[1]), ranges)
+        if op == 'update':
+            # the low bound is the index, the high bound the new value
+            return _timed(lambda r: tree.update(r[0], r[1]), ranges)
+        raise ValueError(op)
+
+
+CASES = {
+    'BasicBSTImpl': (lambda: _TreeCase(lambda: BasicBSTImpl(BinaryIndexTreeNode)), ('insert', 'search', 'delete')),
+    'RedBlackTreeImpl': (lambda: _TreeCase(RedBlackTreeImpl), ('insert', 'search', 'delete')),
+    'SortedBlockMap': (lambda: _TreeCase(SortedBlockMap), ('insert', 'search', 'delete')),
+    'SplayTreeImpl': (lambda: _TreeCase(SplayTreeImpl), ('insert', 'search', 'delete')),
+    'TreapImpl': (lambda: _TreeCase(TreapImpl, priorities=True), ('insert', 'search', 'delete', 'split', 'join')),
+    'ArraySegmentTreeImpl': (lambda: _SegmentCase(lambda: ArraySegmentTreeImpl(operator.add)),
+                             ('build', 'query', 'update')),
+    'FenwickTreeImpl': (lambda: _SegmentCase(FenwickTreeImpl), ('build', 'query', 'update')),
+}
+
+# an unbalanced tree degenerates to a list on these inputs, so larger sizes would take hours
+SIZE_LIMITS = {
+    ('BasicBSTImpl', 'sorted'): 10 ** 4,
+    ('BasicBSTImpl', 'adversarial'): 10 ** 4,
+}
+
+
+def _percentile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_case(structure, op, distribution, size, seed, ops, repeat):
+    """
+    :return: dict of results, the best of `repeat` runs by throughput
+    """
+    best = None
+    for _ in range(repeat):
+        rnd = random.Random(seed)
+        case = CASES[structure][0]()
+        keys = make_keys(size, distribution, rnd)
+        gc.collect()
+        latencies = case.run(op, keys, distribution, rnd, ops)
+        total = sum(latencies)
+        if best is None or total / len(latencies) < best[0] / len(best[1]):
+            best = total, latencies
+    total, latencies = best
+    latencies.sort()
+    return {
+        'structure': structure, 'op': op, 'distribution': distribution, 'size': size, 'ops': len(latencies),
+        'throughput': len(latencies) / total if total else float('inf'),
+        'p50': _percentile(latencies, 0.5), 'p90': _percentile(latencies, 0.9),
+        'p99': _percentile(latencies, 0.99), 'max': latencies[-1],
+    }
+
+
+def peak_memory(structure, distribution, size, seed):
+    """
+    peak bytes traced while building the structure from `size` keys, None without `tracemalloc`
+    """
+    if tracemalloc is None:
+        return None
+    rnd = random.Random(seed)
+    case = CASES[structure][0]()
+    keys = make_keys(size, distribution, rnd)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.build(keys, rnd)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(structures, ops, distributions, sizes, seed=0, max_ops=100000, repeat=1, memory=True, log=None):
+    """
+    :param ops: operations to run, None for all those of each structure
+    :return: list of result dicts
+    """
+    results = []
+    for structure in structures:
+        for distribution in distributions:
+            for size in sizes:
+                if size > SIZE_LIMITS.get((structure, distribution), size):
+                    if log is not None:
+                        log('%-20s skipped on %s keys above %d' % (structure, distribution,
+                                                                   SIZE_LIMITS[structure, distribution]))
+                    continue
+                mem = peak_memory(structure, distribution, size, seed) if memory else None
+                for op in CASES[structure][1]:
+                    if ops and op not in ops:
+                        continue
+                    result = run_case(structure, op, distribution, size, seed, max_ops, repeat)
+                    result['peak_memory'] = mem
+                    results.append(result)
+                    if log is not None:
+                        log(format_result(result))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: list of messages, one per case slower or bigger than in `baseline` by more than `threshold`
+    """
+    old = dict((_case_id(result), result) for result in baseline)
+    regressions = []
+    for result in results:
+        before = old.get(_case_id(result))
+        if before is None:
+            continue
+        if result['throughput'] < before['throughput'] * (1 - threshold):
+            regressions.append('%s: throughput %.0f/s, baseline %.0f/s'
+                               % ('/'.join(map(str, _case_id(result))), result['throughput'], before['throughput']))
+        if result['peak_memory'] and before.get('peak_memory') and \
+                result['peak_memory'] > before['peak_memory'] * (1 + threshold):
+            regressions.append('%s: peak memory %d B, baseline %d B'
+                               % ('/'.join(map(str, _case_id(result))), result['peak_memory'], before['peak_memory']))
+    return regressions
+
+
+def _case_id(result):
+    return result['structure'], result['op'], result['distribution'], result['size']
+
+
+def format_result(result):
+    mem = '-' if result['peak_memory'] is None else '%.1f MiB' % (result['peak_memory'] / 2.0 ** 20)
+    return '%-20s %-7s %-11s %9d %12.0f/s  p50 %8.2fus  p99 %8.2fus  max %9.2fus  %s' % (
+        result['structure'], result['op'], result['distribution'], result['size'], result['throughput'],
+        result['p50'] * 1e6, result['p99'] * 1e6, result['max'] * 1e6, mem)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--structures', nargs='+', choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument('--ops', nargs='+', help='operations to run, default all of each structure')
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10 ** 3, 10 ** 4, 10 ** 5],
+                        help='element counts, up to 10^7')
+    parser.add_argument('--max-ops', type=int, default=100000, help='cap on timed calls for lookups and queries')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case, the fastest is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced build')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='tolerated relative regression')
+    parser.add_argument('--quiet', action='store_true', help='print nothing, regressions still set the exit status')
+    args = parser.parse_args(argv)
+    log = None if args.quiet else print
+
+    results = run(args.structures, args.ops, args.distributions, args.sizes, args.seed, args.max_ops, args.repeat,
+                  not args.no_memory, log=log)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(), 'seed': args.seed,
+                       'results': results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if log is not None:
+            for message in regressions:
+                log('REGRESSION ' + message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
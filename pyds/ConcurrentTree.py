@@ -0,0 +1,190 @@
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+class ReadWriteLock(object):
+    """
+    Lock shared by any number of readers or held by one writer. Waiting writers block new readers, so a steady
+    stream of reads can not starve writes. Not reentrant. Counts acquisitions and the time spent waiting for and
+    holding the lock, per mode.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._counters = dict(read_acquires=0, read_wait=0.0, read_hold=0.0, write_acquires=0, write_wait=0.0,
+                              write_hold=0.0, max_write_hold=0.0)
+
+    def acquire_read(self):
+        """
+        :return: time of acquisition, to be passed to :meth:`release_read`
+        """
+        start = default_timer()
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+            now = default_timer()
+            self._counters['read_acquires'] += 1
+            self._counters['read_wait'] += now - start
+        return now
+
+    def release_read(self, acquired):
+        with self._cond:
+            self._readers -= 1
+            self._counters['read_hold'] += default_timer() - acquired
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """
+        :return: time of acquisition, to be passed to :meth:`release_write`
+        """
+        start = default_timer()
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+            now = default_timer()
+            self._counters['write_acquires'] += 1
+            self._counters['write_wait'] += now - start
+        return now
+
+    def release_write(self, acquired):
+        with self._cond:
+            self._writer = False
+            held = default_timer() - acquired
+            self._counters['write_hold'] += held
+            self._counters['max_write_hold'] = max(self._counters['max_write_hold'], held)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        acquired = self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read(acquired)
+
+    @contextmanager
+    def writing(self):
+        acquired = self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write(acquired)
+
+    def stats(self):
+        """
+        :return: dict of counters: acquisitions, and total seconds waited and held, per mode, and the longest write
+        hold
+        """
+        with self._cond:
+            return dict(self._counters)
+
+
+class ConcurrentTree(object):
+    """
+    Wrapper sharing an :class:`OrderedBinaryTree` between threads. Lookups and scans run concurrently under a read
+    lock, `insert`, `delete` and `update` take the write lock. Range scans and iteration collect their nodes under the
+    lock and return a list, so no lock is held while the caller consumes them. Returned nodes stay owned by the tree
+    and must not be modified outside :meth:`transaction`.
+    """
+
+    def __init__(self, tree):
+        """
+        :param tree: the tree to share, not to be used directly afterwards
+        """
+        self._tree = tree
+        self._lock = ReadWriteLock()
+
+    def search(self, key):
+        with self._lock.reading():
+            return self._tree.search(key)
+
+    def __contains__(self, key):
+        return self.search(key) is not None
+
+    def __len__(self):
+        with self._lock.reading():
+            return len(self._tree)
+
+    def __iter__(self):
+        return iter(self.range())
+
+    def range(self, low=None, high=None, reverse=False):
+        """
+        see :meth:`OrderedBinaryTree.range`
+        :return: list of nodes
+        """
+        with self._lock.reading():
+            return list(self._tree.range(low, high, reverse))
+
+    def floor(self, key):
+        with self._lock.reading():
+            return self._tree.floor(key)
+
+    def ceiling(self, key):
+        with self._lock.reading():
+            return self._tree.ceiling(key)
+
+    def predecessor(self, key):
+        with self._lock.reading():
+            return self._tree.predecessor(key)
+
+    def successor(self, key):
+        with self._lock.reading():
+            return self._tree.successor(key)
+
+    def rank(self, key):
+        with self._lock.reading():
+            return self._tree.rank(key)
+
+    def select(self, idx):
+        with self._lock.reading():
+            return self._tree.select(idx)
+
+    def insert(self, *args, **kwargs):
+        """
+        arguments as for `insert` of the wrapped tree
+        """
+        with self._lock.writing():
+            return self._tree.insert(*args, **kwargs)
+
+    def delete(self, key):
+        with self._lock.writing():
+            return self._tree.delete(key)
+
+    def update(self, key, val):
+        with self._lock.writing():
+            return self._tree.update(key, val)
+
+    @contextmanager
+    def transaction(self):
+        """
+        hold the write lock for a batch of writes, e.g.
+        `with shared.transaction() as tree: tree.insert(key=1); tree.delete(2)`
+        :return: context manager yielding the wrapped tree, usable only inside the block
+        """
+        with self._lock.writing():
+            yield self._tree
+
+    @contextmanager
+    def reading(self):
+        """
+        hold the read lock for several lookups that must see the same version of the tree
+        :return: context manager yielding the wrapped tree, to be used for reads only
+        """
+        with self._lock.reading():
+            yield self._tree
+
+    def stats(self):
+        """
+        lock counters, see :meth:`ReadWriteLock.stats`
+        """
+        return self._lock.stats()
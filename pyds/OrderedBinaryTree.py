@@ -1,10 +1,18 @@
+import operator
 from abc import ABCMeta, abstractmethod
 
 import six
 
+from TreeStats import TreeStats
+
 
 @six.add_metaclass(ABCMeta)
 class OrderedBinaryTree(object):
+    _sized = False
+    _parent_links = True
+    _finger = None
+    _multiset = False
+
     @property
     @abstractmethod
     def root(self):
@@ -14,6 +22,60 @@ class OrderedBinaryTree(object):
     def delete(self, key):
         pass
 
+    def __copy__(self):
+        """
+        shallow copy sharing the nodes. pickling and `deepcopy` go through `__reduce__` of the subclass instead
+        """
+        tree = self.__class__.__new__(self.__class__)
+        tree.__dict__.update(self.__dict__)
+        tree.__dict__.pop('_finger', None)
+        stats = tree.__dict__.pop('_stats', None)
+        if stats is not None:
+            stats.detach(tree)
+        return tree
+
+    @property
+    def stats(self):
+        """
+        the :class:`TreeStats` of the tree, None unless enabled
+        """
+        return self.__dict__.get('_stats')
+
+    def enable_stats(self, hook=None):
+        """
+        start counting comparisons, rotations, fixups and search depths, see :class:`TreeStats`. operations run
+        slower while enabled, and as before once disabled
+        :param hook: optional function called as `hook(op, counts)` after each operation
+        :return: the :class:`TreeStats`
+        """
+        self.disable_stats()
+        self._stats = TreeStats(hook)
+        self._stats.attach(self)
+        return self._stats
+
+    def disable_stats(self):
+        stats = self.__dict__.pop('_stats', None)
+        if stats is not None:
+            stats.detach(self)
+
+    def _flatten(self, *fields):
+        """
+        attributes `fields` of all nodes in key order, one list per field. a field that is None on every node is
+        returned as None. in multiset mode the row of a node is repeated `count` times
+        """
+        columns = tuple([] for _ in fields)
+        getter = operator.attrgetter(*fields)
+        for node in self:
+            row = getter(node)
+            if len(fields) == 1:
+                row = (row,)
+            for column, item in zip(columns, row):
+                if self._multiset:
+                    column.extend([item] * node.count)
+                else:
+                    column.append(item)
+        return tuple(None if all(item is None for item in column) else column for column in columns)
+
     def update(self, key, val):
         node = self.search(key)
         if node is not None:
@@ -23,15 +85,419 @@ class OrderedBinaryTree(object):
     def search(self, key):
         return self._search(self._root, key)
 
-    def _search(self, node, key):
+    def count(self, key):
+        """
+        number of copies of `key` inserted and not removed. requires multiset mode
+        """
+        self._check_multiset()
+        node = self.search(key)
+        return 0 if node is None else node.count
+
+    def remove_one(self, key):
+        """
+        remove one copy of `key`, and its node with the last copy. requires multiset mode
+        :return: the node of `key`, or None if there is none
+        """
+        self._check_multiset()
+        node = self.search(key)
         if node is None:
-            return None
-        if self._key_eq(node.key, key):
             return node
-        if self._key_gt(node.key, key):
-            return self._search(node.left, key)
+        if node.count > 1:
+            node.count -= 1
+            return node
+        node.count = 0
+        return self.delete(key)
+
+    @property
+    def finger(self):
+        """
+        the node last reached by :meth:`finger_search` or added by `finger_insert`, None if there is none
+        """
+        return self._finger
+
+    def finger_search(self, key):
+        """
+        search starting from the finger: climb from it through parent links only until the key is known to lie
+        below, then descend. a key at distance d from the finger, in key order, costs O(log d) expected in a treap.
+        a red-black tree may have to climb further, up to the nearest common ancestor. the node found, or the last
+        node visited if there is none, becomes the finger
+        """
+        key = self._cmp_key(key)
+        node_key, eq, gt = self._node_key, self._key_eq, self._key_gt
+        node = self._finger_start(key)
+        last = None
+        while node is not None:
+            last = node
+            k = node_key(node)
+            if eq(k, key):
+                break
+            node = node.left if gt(k, key) else node.right
+        self._finger = last
+        return node
+
+    def _finger_start(self, key):
+        """
+        ancestor of the finger whose subtree holds the compared key `key`, or the root
+        """
+        node = self._finger
+        if node is None or not self._parent_links:
+            return self._root
+        node_key, gt = self._node_key, self._key_gt
+        k = node_key(node)
+        if gt(key, k):
+            # climb until a node reached from its left child is not below key
+            while True:
+                p = node.parent
+                if p is None:
+                    return node
+                if p.left is node and not gt(key, node_key(p)):
+                    return p
+                node = p
+        if gt(k, key):
+            while True:
+                p = node.parent
+                if p is None:
+                    return node
+                if p.right is node and not gt(node_key(p), key):
+                    return p
+                node = p
+        return node
+
+    def __len__(self):
+        """
+        O(1) with order statistics enabled, else the tree is walked
+        """
+        if self._sized:
+            return 0 if self._root is None else self._root.size
+        count = 0
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            count += 1
+            if node.left is not None:
+                stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+        return count
+
+    def __iter__(self):
+        """
+        nodes in ascending key order
+        """
+        return self.range()
+
+    def __reversed__(self):
+        return self.range(reverse=True)
+
+    def range(self, low=None, high=None, reverse=False):
+        """
+        iterate nodes with `low` <= key < `high` in ascending order, or descending if `reverse`. in O(log n + k),
+        with O(1) extra memory when nodes link to their parent, else O(log n)
+        :param low: inclusive lower bound, None for unbounded
+        :param high: exclusive upper bound, None for unbounded
+        """
+        if low is not None:
+            low = self._cmp_key(low)
+        if high is not None:
+            high = self._cmp_key(high)
+        if self._parent_links:
+            return self._linked_range(low, high, reverse)
+        return self._stacked_range(low, high, reverse)
+
+    def floor(self, key):
+        """
+        node with the greatest key <= `key`, or None
+        """
+        return self._bound(self._cmp_key(key), False, False)
+
+    def ceiling(self, key):
+        """
+        node with the least key >= `key`, or None
+        """
+        return self._bound(self._cmp_key(key), True, False)
+
+    def predecessor(self, key):
+        """
+        node with the greatest key < `key`, or None
+        """
+        return self._bound(self._cmp_key(key), False, True)
+
+    def successor(self, key):
+        """
+        node with the least key > `key`, or None
+        """
+        return self._bound(self._cmp_key(key), True, True)
+
+    def _bound(self, key, above, strict):
+        """
+        node closest to the compared key `key` from above or below, excluding equal keys if `strict`
+        """
+        node_key, gt = self._node_key, self._key_gt
+        node = self._root
+        best = None
+        while node is not None:
+            k = node_key(node)
+            if above:
+                hit = gt(k, key) if strict else not gt(key, k)
+            else:
+                hit = gt(key, k) if strict else not gt(k, key)
+            if hit:
+                best = node
+                node = node.left if above else node.right
+            else:
+                node = node.right if above else node.left
+        return best
+
+    def _linked_range(self, low, high, reverse):
+        node_key, gt = self._node_key, self._key_gt
+        if reverse:
+            node = self._extreme(self._root, False) if high is None else self._bound(high, False, True)
+            while node is not None and (low is None or not gt(low, node_key(node))):
+                yield node
+                node = self._step(node, False)
+        else:
+            node = self._extreme(self._root, True) if low is None else self._bound(low, True, False)
+            while node is not None and (high is None or gt(high, node_key(node))):
+                yield node
+                node = self._step(node, True)
+
+    def _stacked_range(self, low, high, reverse):
+        node_key, gt = self._node_key, self._key_gt
+        stack = []
+        node = self._root
+        while node is not None:
+            if reverse:
+                if high is None or gt(high, node_key(node)):
+                    stack.append(node)
+                    node = node.right
+                else:
+                    node = node.left
+            else:
+                if low is None or not gt(low, node_key(node)):
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = node.right
+        while stack:
+            node = stack.pop()
+            if reverse:
+                if low is not None and gt(low, node_key(node)):
+                    return
+                yield node
+                node = node.left
+                while node is not None:
+                    stack.append(node)
+                    node = node.right
+            else:
+                if high is not None and not gt(high, node_key(node)):
+                    return
+                yield node
+                node = node.right
+                while node is not None:
+                    stack.append(node)
+                    node = node.left
+
+    def _extreme(self, node, first):
+        """
+        leftmost node of the subtree at `node` if `first`, else rightmost
+        """
+        if node is None:
+            return None
+        if first:
+            while node.left is not None:
+                node = node.left
         else:
-            return self._search(node.right, key)
+            while node.right is not None:
+                node = node.right
+        return node
+
+    def _step(self, node, forward):
+        """
+        in-order successor of `node` if `forward`, else predecessor, following parent links
+        """
+        if forward:
+            if node.right is not None:
+                return self._extreme(node.right, True)
+            p = node.parent
+            while p is not None and node is p.right:
+                node, p = p, p.parent
+        else:
+            if node.left is not None:
+                return self._extreme(node.left, False)
+            p = node.parent
+            while p is not None and node is p.left:
+                node, p = p, p.parent
+        return p
+
+    def rank(self, key):
+        """
+        number of keys less than `key`, in O(log n). requires order statistics
+        """
+        self._check_sized()
+        key = self._cmp_key(key)
+        node_key, gt = self._node_key, self._key_gt
+        node = self._root
+        rank = 0
+        while node is not None:
+            if gt(key, node_key(node)):
+                rank += 1 if node.left is None else node.left.size + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def select(self, idx):
+        """
+        node at position `idx` in key order, negative `idx` counts from the end, in O(log n). requires order
+        statistics
+        """
+        self._check_sized()
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Index out of range")
+        node = self._root
+        while True:
+            left = 0 if node.left is None else node.left.size
+            if idx < left:
+                node = node.left
+            elif idx == left:
+                return node
+            else:
+                idx -= left + 1
+                node = node.right
+
+    def _check_sized(self):
+        if not self._sized:
+            raise ValueError("order statistics not enabled")
+
+    def _check_multiset(self):
+        if not self._multiset:
+            raise ValueError("multiset mode not enabled")
+
+    def _update_size(self, node):
+        node.size = 1 + (0 if node.left is None else node.left.size) + (0 if node.right is None else node.right.size)
+
+    def _resize_path(self, node, delta):
+        while node is not None:
+            node.size += delta
+            node = node.parent
+
+    def _init_keys(self, eq, gt, key):
+        """
+        set up key comparison. when `eq` and `gt` are the defaults and no `key` is given, descents compare with native
+        operators instead of calling `eq` and `gt`. when `key` is given, it is applied once per node and the result
+        is cached in `node.sort_key`
+        """
+        self._key_eq = eq
+        self._key_gt = gt
+        self._keyfunc = key
+        self._native = key is None and eq is operator.eq and gt is operator.gt
+        self._node_key = operator.attrgetter('key' if key is None else 'sort_key')
+
+    def _key_funcs(self):
+        """
+        `eq` and `gt` as given to the constructor, without the counting wrappers of :class:`TreeStats`
+        """
+        stats = self.stats
+        if stats is not None:
+            return stats._saved[:2]
+        return self._key_eq, self._key_gt
+
+    def _cmp_key(self, key):
+        return key if self._keyfunc is None else self._keyfunc(key)
+
+    def _cache_key(self, node):
+        if self._keyfunc is not None:
+            node.sort_key = self._keyfunc(node.key)
+
+    def _search(self, node, key):
+        if self._native:
+            while node is not None:
+                k = node.key
+                if k == key:
+                    return node
+                node = node.left if k > key else node.right
+            return None
+        key = self._cmp_key(key)
+        node_key, eq, gt = self._node_key, self._key_eq, self._key_gt
+        while node is not None:
+            k = node_key(node)
+            if eq(k, key):
+                return node
+            node = node.left if gt(k, key) else node.right
+        return None
+
+    def _attach_leaf(self, node, new):
+        """
+        descend from `node` and hang `new` as a leaf where its key belongs, equal keys go to the right
+        :return: the new parent of `new`
+        """
+        if self._native:
+            key = new.key
+            while True:
+                if node.key > key:
+                    if node.left is None:
+                        node.left = new
+                        return node
+                    node = node.left
+                else:
+                    if node.right is None:
+                        node.right = new
+                        return node
+                    node = node.right
+        node_key, gt = self._node_key, self._key_gt
+        key = node_key(new)
+        while True:
+            if gt(node_key(node), key):
+                if node.left is None:
+                    node.left = new
+                    return node
+                node = node.left
+            else:
+                if node.right is None:
+                    node.right = new
+                    return node
+                node = node.right
+
+    def _attach_distinct(self, node, new):
+        """
+        as :meth:`_attach_leaf`, unless a node of key equal to that of `new` is met on the way down, `new` is then
+        left out
+        :return: tuple of the new parent of `new` and None, or of None and the node of equal key
+        """
+        if self._native:
+            key = new.key
+            while True:
+                k = node.key
+                if k == key:
+                    return None, node
+                if k > key:
+                    if node.left is None:
+                        node.left = new
+                        return node, None
+                    node = node.left
+                else:
+                    if node.right is None:
+                        node.right = new
+                        return node, None
+                    node = node.right
+        node_key, eq, gt = self._node_key, self._key_eq, self._key_gt
+        key = node_key(new)
+        while True:
+            k = node_key(node)
+            if eq(k, key):
+                return None, node
+            if gt(k, key):
+                if node.left is None:
+                    node.left = new
+                    return node, None
+                node = node.left
+            else:
+                if node.right is None:
+                    node.right = new
+                    return node, None
+                node = node.right
 
     def _right_rotate(self, node):
         l = node.left
@@ -47,6 +513,9 @@ class OrderedBinaryTree(object):
             node.parent.right = l
         l.parent = node.parent
         node.parent = l
+        if self._sized:
+            l.size = node.size
+            self._update_size(node)
 
     def _left_rotate(self, node):
         r = node.right
@@ -62,3 +531,13 @@ class OrderedBinaryTree(object):
             node.parent.right = r
         r.parent = node.parent
         node.parent = r
+        if self._sized:
+            r.size = node.size
+            self._update_size(node)
+
+
+def _from_flat(cls, kwargs, *columns):
+    """
+    unpickle a tree written by `__reduce__` as flat lists in key order
+    """
+    return cls.from_sorted(*columns, **kwargs)
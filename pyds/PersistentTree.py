@@ -0,0 +1,78 @@
+from copy import copy
+
+from OrderedBinaryTree import OrderedBinaryTree
+
+
+class PersistentTree(OrderedBinaryTree):
+    """
+    Mixin for trees updated by path copying: nodes reachable from a root are never modified, every write copies the
+    O(log n) nodes it touches and shares the rest with older versions. Nodes keep no parent links, since a shared
+    node may have several parents.
+    """
+    _parent_links = False
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get('multiset'):
+            raise ValueError("multiset mode is not supported by persistent trees")
+        super(PersistentTree, self).__init__(*args, **kwargs)
+
+    def snapshot(self):
+        """
+        version of the tree as it is now, in O(1). later writes to either tree do not affect the other
+        """
+        return copy(self)
+
+    def finger_insert(self, *args, **kwargs):
+        """
+        same as `insert`, without parent links there is no finger to start from
+        """
+        return self.insert(*args, **kwargs)
+
+    def update(self, key, val):
+        path, node = self._find_path(key)
+        if node is None:
+            return node
+        new = self._clone(node)
+        new.val = val
+        self._root = self._rebuild_path(path, new)
+        return new
+
+    def _clone(self, node):
+        new = self._copy_node(node)
+        new.left = node.left
+        new.right = node.right
+        return new
+
+    def _find_path(self, key):
+        """
+        :return: tuple of the list of (node, went_left) from the root down to the first node of key `key`, and that
+        node, or None if there is none
+        """
+        key = self._cmp_key(key)
+        node_key, eq, gt = self._node_key, self._key_eq, self._key_gt
+        path = []
+        node = self._root
+        while node is not None:
+            k = node_key(node)
+            if eq(k, key):
+                return path, node
+            left = gt(k, key)
+            path.append((node, left))
+            node = node.left if left else node.right
+        return path, None
+
+    def _rebuild_path(self, path, node):
+        """
+        copy the nodes of `path`, as returned by :meth:`_find_path`, over `node` as the new subtree at its end
+        :return: the new root
+        """
+        for parent, left in reversed(path):
+            parent = self._clone(parent)
+            if left:
+                parent.left = node
+            else:
+                parent.right = node
+            if self._sized:
+                self._update_size(parent)
+            node = parent
+        return node
@@ -20,3 +20,10 @@ class SegmentTree(object):
     @abstractmethod
     def query(self, low, high):
         pass
+
+    def update_many(self, pairs):
+        for idx, val in pairs:
+            self.update(idx, val)
+
+    def query_many(self, lows, highs):
+        return [self.query(low, high) for low, high in zip(lows, highs)]
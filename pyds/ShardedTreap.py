@@ -0,0 +1,160 @@
+import operator
+from bisect import bisect_left
+from itertools import chain
+
+from tree.TreapImpl import TreapImpl
+
+
+class ShardedTreap(object):
+    """
+    Ordered map range-partitioned over several :class:`TreapImpl` shards. Shard i holds the keys k with
+    bounds[i - 1] < k <= bounds[i]. A shard growing beyond `max_shard_size` is split at its median with `split`, and
+    neighbours that shrink to a quarter of it together are merged with `join`. Keys, as compared, must be naturally
+    ordered, since shards are found by bisecting the bounds.
+    """
+
+    def __init__(self, boundaries=(), max_shard_size=1 << 16, executor=None, priority_lt=operator.lt, key=None):
+        """
+        :param boundaries: initial shard bounds, more are added as shards split
+        :param max_shard_size: size above which a shard is split
+        :param executor: optional :class:`concurrent.futures.Executor` for :meth:`insert_many` and :meth:`range`.
+        with a process pool, keys, values and `key` must be picklable, and :meth:`range` transfers every shard it
+        reads, so threads suit queries better
+        :param priority_lt: see :class:`TreapImpl`
+        :param key: see :class:`TreapImpl`
+        """
+        if max_shard_size < 2:
+            raise ValueError("max_shard_size must be at least 2")
+        self._kwargs = dict(priority_lt=priority_lt, key=key, order_statistics=True)
+        self._keyfunc = key
+        self._max = max_shard_size
+        self._executor = executor
+        self._bounds = sorted(self._cmp_key(bound) for bound in boundaries)
+        self._shards = [TreapImpl(**self._kwargs) for _ in range(len(self._bounds) + 1)]
+
+    @property
+    def shards(self):
+        """
+        the shards in key order, to be used for reads only
+        """
+        return tuple(self._shards)
+
+    @property
+    def bounds(self):
+        return tuple(self._bounds)
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def __iter__(self):
+        return chain.from_iterable(self._shards)
+
+    def _cmp_key(self, key):
+        return key if self._keyfunc is None else self._keyfunc(key)
+
+    def _shard_index(self, key):
+        return bisect_left(self._bounds, self._cmp_key(key))
+
+    def search(self, key):
+        return self._shards[self._shard_index(key)].search(key)
+
+    def update(self, key, val):
+        return self._shards[self._shard_index(key)].update(key, val)
+
+    def insert(self, key, priority, val=None):
+        idx = self._shard_index(key)
+        self._shards[idx].insert(key=key, priority=priority, val=val)
+        if len(self._shards[idx]) > self._max:
+            self._split(idx)
+
+    def delete(self, key):
+        idx = self._shard_index(key)
+        node = self._shards[idx].delete(key)
+        if node is not None:
+            self._merge(idx)
+        return node
+
+    def insert_many(self, triples):
+        """
+        insert many entries at once. entries are grouped by shard, each group is sorted and built into a treap
+        through the executor, and the treaps are merged into the shards with :meth:`TreapImpl.union`. entries of keys
+        already stored are added next to them, as with :meth:`insert`
+        :param triples: iterable of (key, priority, val)
+        """
+        batches = {}
+        for triple in triples:
+            batches.setdefault(self._shard_index(triple[0]), []).append(triple)
+        if self._executor is None:
+            built = dict((idx, _build_batch(self._kwargs, batch)) for idx, batch in batches.items())
+        else:
+            futures = dict((idx, self._executor.submit(_build_batch, self._kwargs, batch))
+                           for idx, batch in batches.items())
+            built = dict((idx, future.result()) for idx, future in futures.items())
+        # later shards first, so splits do not shift the indices still to be merged
+        for idx in sorted(built, reverse=True):
+            self._shards[idx] = TreapImpl.union(self._shards[idx], built[idx], keep_duplicates=True)
+            self._split(idx)
+
+    def range(self, low=None, high=None):
+        """
+        nodes with `low` <= key < `high` in ascending order, read from the shards in parallel when an executor is set
+        :return: list of nodes
+        """
+        first = 0 if low is None else self._shard_index(low)
+        last = len(self._shards) - 1 if high is None else self._shard_index(high)
+        shards = self._shards[first:last + 1]
+        if self._executor is None or len(shards) < 2:
+            parts = [_range_task(shard, low, high) for shard in shards]
+        else:
+            futures = [self._executor.submit(_range_task, shard, low, high) for shard in shards]
+            parts = [future.result() for future in futures]
+        return list(chain.from_iterable(parts))
+
+    def _split(self, idx):
+        """
+        split shard `idx` at its median until all parts fit, unless all its keys are equal. when no key is greater
+        than the median, the shard is split below it instead
+        """
+        pending = [idx]
+        while pending:
+            idx = pending.pop()
+            shard = self._shards[idx]
+            if len(shard) <= self._max:
+                continue
+            median = shard.select((len(shard) - 1) // 2)
+            bound = shard._node_key(median)
+            res = shard.split(median.key)
+            if res.right.root is None:
+                self._shards[idx] = shard = res.left
+                median = shard.predecessor(median.key)
+                if median is None:
+                    continue
+                bound = shard._node_key(median)
+                res = shard.split(median.key)
+            self._shards[idx:idx + 1] = [res.left, res.right]
+            self._bounds.insert(idx, bound)
+            pending.extend((idx, idx + 1))
+
+    def _merge(self, idx):
+        """
+        join shard `idx` with a neighbour if both together hold less than a quarter of `max_shard_size`
+        """
+        for left in (idx - 1, idx):
+            if 0 <= left < len(self._bounds):
+                if len(self._shards[left]) + len(self._shards[left + 1]) < self._max // 4:
+                    self._shards[left:left + 2] = [TreapImpl.join(self._shards[left], self._shards[left + 1])]
+                    del self._bounds[left]
+                    return
+
+
+def _build_batch(kwargs, triples):
+    tree = TreapImpl(**kwargs)
+    triples = sorted(triples, key=lambda triple: tree._cmp_key(triple[0]))
+    keys = [key for key, _, _ in triples]
+    priorities = [priority for _, priority, _ in triples]
+    vals = [val for _, _, val in triples]
+    return TreapImpl.from_sorted(keys, priorities, vals, **kwargs)
+
+
+def _range_task(shard, low, high):
+    return list(shard.range(low, high))
@@ -0,0 +1,288 @@
+from bisect import bisect_left, bisect_right
+
+
+class Entry(object):
+    """
+    key and value of one item of a :class:`SortedBlockMap`. created on demand by lookups, so changing `val` does not
+    change the map, use :meth:`SortedBlockMap.update` instead
+    """
+    __slots__ = ('key', 'val')
+
+    def __init__(self, key, val=None):
+        self.key = key
+        self.val = val
+
+
+class SortedBlockMap(object):
+    """
+    Ordered map kept as a list of sorted blocks of at most 2 * `load` items, with the surface of
+    :class:`BinarySearchTree`. A lookup bisects the list of block maxima, then the block; an insert or delete shifts
+    items within one block only. Keys and values are stored in plain lists, so there is no node object per item,
+    and lookups run through `bisect` in C instead of following node links. Duplicate keys are kept, a new one after
+    the equal ones already stored. Keys, as compared, must be naturally ordered, since blocks are bisected.
+    """
+
+    def __init__(self, load=512, key=None):
+        """
+        :param load: target block size. blocks are split above 2 * `load` items and merged with a neighbour below
+        `load` // 2
+        :param key: optional function mapping a key to the value compared, called once per insert and lookup
+        """
+        if load < 2:
+            raise ValueError("load must be at least 2")
+        self._load = load
+        self._keyfunc = key
+        self._maxes = []
+        self._keys = []
+        self._vals = []
+        # compared keys of each block, the lists of `_keys` themselves when there is no key function
+        self._sort_keys = []
+        self._len = 0
+
+    def _cmp_key(self, key):
+        return key if self._keyfunc is None else self._keyfunc(key)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        """
+        entries in ascending key order
+        """
+        return self.range()
+
+    def __reversed__(self):
+        return self.range(reverse=True)
+
+    def insert(self, node=None, key=None, val=None):
+        """
+        insert the key and value of `node` if it is provided, else `key` and `val`
+        """
+        if node is not None:
+            key, val = node.key, node.val
+        elif key is None:
+            raise ValueError("one of node and key must be passed")
+        k = self._cmp_key(key)
+        maxes = self._maxes
+        if not maxes:
+            self._maxes.append(k)
+            self._keys.append([key])
+            self._vals.append([val])
+            self._sort_keys.append(self._keys[0] if self._keyfunc is None else [k])
+            self._len = 1
+            return
+        i = bisect_right(maxes, k)
+        if i == len(maxes):
+            i -= 1
+            maxes[i] = k
+        sort_keys = self._sort_keys[i]
+        j = bisect_right(sort_keys, k)
+        self._keys[i].insert(j, key)
+        self._vals[i].insert(j, val)
+        if self._keyfunc is not None:
+            sort_keys.insert(j, k)
+        self._len += 1
+        if len(sort_keys) > 2 * self._load:
+            self._split(i)
+
+    def search(self, key):
+        """
+        :return: :class:`Entry` of the first item of key `key`, or None
+        """
+        # inlined `_locate`, lookups are the hot path
+        k = key if self._keyfunc is None else self._keyfunc(key)
+        maxes = self._maxes
+        i = bisect_left(maxes, k)
+        if i == len(maxes):
+            return None
+        sort_keys = self._sort_keys[i]
+        j = bisect_left(sort_keys, k)
+        if sort_keys[j] != k:
+            return None
+        return Entry(self._keys[i][j], self._vals[i][j])
+
+    def update(self, key, val):
+        i, j = self._locate(self._cmp_key(key))
+        if i is None:
+            return None
+        self._vals[i][j] = val
+        return Entry(self._keys[i][j], val)
+
+    def delete(self, key):
+        """
+        remove the first item of key `key`
+        :return: its :class:`Entry`, or None if there is none
+        """
+        i, j = self._locate(self._cmp_key(key))
+        if i is None:
+            return None
+        entry = Entry(self._keys[i].pop(j), self._vals[i].pop(j))
+        sort_keys = self._sort_keys[i]
+        if self._keyfunc is not None:
+            sort_keys.pop(j)
+        self._len -= 1
+        if not sort_keys:
+            del self._maxes[i], self._keys[i], self._vals[i], self._sort_keys[i]
+            return entry
+        self._maxes[i] = sort_keys[-1]
+        if len(sort_keys) < self._load // 2:
+            self._merge(i)
+        return entry
+
+    def range(self, low=None, high=None, reverse=False):
+        """
+        iterate entries with `low` <= key < `high` in ascending order, or descending if `reverse`
+        :param low: inclusive lower bound, None for unbounded
+        :param high: exclusive upper bound, None for unbounded
+        """
+        if not self._maxes:
+            return iter(())
+        if low is None:
+            start = 0, 0
+        else:
+            start = self._position(self._cmp_key(low), bisect_left)
+        if high is None:
+            stop = len(self._maxes) - 1, len(self._sort_keys[-1])
+        else:
+            stop = self._position(self._cmp_key(high), bisect_left)
+        return self._iter_range(start, stop, reverse)
+
+    def floor(self, key):
+        """
+        entry with the greatest key <= `key`, or None
+        """
+        return self._before(self._position(self._cmp_key(key), bisect_right))
+
+    def ceiling(self, key):
+        """
+        entry with the least key >= `key`, or None
+        """
+        return self._at(self._position(self._cmp_key(key), bisect_left))
+
+    def predecessor(self, key):
+        """
+        entry with the greatest key < `key`, or None
+        """
+        return self._before(self._position(self._cmp_key(key), bisect_left))
+
+    def successor(self, key):
+        """
+        entry with the least key > `key`, or None
+        """
+        return self._at(self._position(self._cmp_key(key), bisect_right))
+
+    def rank(self, key):
+        """
+        number of keys less than `key`, in O(log n + n / load)
+        """
+        i, j = self._position(self._cmp_key(key), bisect_left)
+        return sum(len(block) for block in self._keys[:i]) + j
+
+    def select(self, idx):
+        """
+        entry at position `idx` in key order, negative `idx` counts from the end, in O(n / load)
+        """
+        if idx < 0:
+            idx += self._len
+        if idx < 0 or idx >= self._len:
+            raise IndexError("Index out of range")
+        for i, block in enumerate(self._keys):
+            if idx < len(block):
+                return Entry(block[idx], self._vals[i][idx])
+            idx -= len(block)
+
+    def _locate(self, k):
+        """
+        :return: block and index of the first item of compared key `k`, or (None, None)
+        """
+        maxes = self._maxes
+        i = bisect_left(maxes, k)
+        if i == len(maxes):
+            return None, None
+        sort_keys = self._sort_keys[i]
+        j = bisect_left(sort_keys, k)
+        if sort_keys[j] != k:
+            return None, None
+        return i, j
+
+    def _position(self, k, bisect):
+        """
+        :param bisect: `bisect_left` for the position of the first item not less than `k`, `bisect_right` for the
+        first item greater
+        :return: (block, index) of that position, or one past the last item
+        """
+        maxes = self._maxes
+        if not maxes:
+            return 0, 0
+        i = bisect(maxes, k)
+        if i == len(maxes):
+            return i - 1, len(self._sort_keys[-1])
+        return i, bisect(self._sort_keys[i], k)
+
+    def _at(self, pos):
+        i, j = pos
+        if not self._keys:
+            return None
+        if j == len(self._keys[i]):
+            if i + 1 == len(self._keys):
+                return None
+            i, j = i + 1, 0
+        return Entry(self._keys[i][j], self._vals[i][j])
+
+    def _before(self, pos):
+        i, j = pos
+        if j == 0:
+            if i == 0:
+                return None
+            i, j = i - 1, len(self._keys[i - 1])
+        return Entry(self._keys[i][j - 1], self._vals[i][j - 1])
+
+    def _iter_range(self, start, stop, reverse):
+        keys, vals = self._keys, self._vals
+        if reverse:
+            for i in range(stop[0], start[0] - 1, -1):
+                low = start[1] if i == start[0] else 0
+                high = stop[1] if i == stop[0] else len(keys[i])
+                for j in range(high - 1, low - 1, -1):
+                    yield Entry(keys[i][j], vals[i][j])
+        else:
+            for i in range(start[0], stop[0] + 1):
+                low = start[1] if i == start[0] else 0
+                high = stop[1] if i == stop[0] else len(keys[i])
+                for j in range(low, high):
+                    yield Entry(keys[i][j], vals[i][j])
+
+    def _columns(self):
+        """
+        the lists of blocks to split and merge together, `_sort_keys` follows `_keys` when there is no key function
+        """
+        if self._keyfunc is None:
+            return self._keys, self._vals
+        return self._keys, self._vals, self._sort_keys
+
+    def _split(self, i):
+        half = len(self._keys[i]) // 2
+        for blocks in self._columns():
+            block = blocks[i]
+            blocks[i:i + 1] = [block[:half], block[half:]]
+        if self._keyfunc is None:
+            self._sort_keys[i:i + 1] = self._keys[i:i + 2]
+        self._maxes.insert(i, self._sort_keys[i][-1])
+
+    def _merge(self, i):
+        """
+        append block `i` to its left neighbour, or its right neighbour to it, and split the result if it grew too
+        large
+        """
+        if len(self._maxes) < 2:
+            return
+        if i == 0:
+            i = 1
+        for blocks in self._columns():
+            blocks[i - 1].extend(blocks[i])
+            del blocks[i]
+        if self._keyfunc is None:
+            del self._sort_keys[i]
+        del self._maxes[i - 1]
+        if len(self._keys[i - 1]) > 2 * self._load:
+            self._split(i - 1)
@@ -23,15 +23,16 @@ class Treap(OrderedBinaryTree):
 
     @classmethod
     @abstractmethod
-    def union(cls, t1, t2):
+    def union(cls, t1, t2, destructive=True, executor=None, parallel_depth=2, keep_duplicates=False,
+              parallel_min_size=1000):
         pass
 
     @classmethod
     @abstractmethod
-    def intersect(cls, t1, t2):
+    def intersect(cls, t1, t2, destructive=True, executor=None, parallel_depth=2, parallel_min_size=1000):
         pass
 
     @classmethod
     @abstractmethod
-    def difference(cls, left, right):
+    def difference(cls, left, right, destructive=True, executor=None, parallel_depth=2, parallel_min_size=1000):
         pass
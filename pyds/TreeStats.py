@@ -0,0 +1,144 @@
+from collections import Counter
+
+COUNTERS = ('comparisons', 'rotations', 'fixups', 'rolling_steps')
+_ROTATIONS = ('_left_rotate', '_right_rotate', '_rotate')
+# fixup loops and the methods reading how many levels they will climb
+_FIXUPS = (('_insert_fix', '_insert_climbs'), ('_delete_fixup', '_delete_climbs'))
+_ROLLING = ('_rolling_up', '_rolling_down')
+_OPS = ('insert', 'delete', 'search', 'update', 'update_priority', 'split', 'floor', 'ceiling', 'predecessor',
+        'successor', 'rank', 'select', 'finger_search', 'finger_insert', 'count', 'remove_one')
+
+
+class TreeStats(object):
+    """
+    Counters of the work done by one tree: key comparisons, rotations, levels climbed by red-black fixups after
+    recoloring, rotations done while rolling a treap node up or down, and the number of nodes visited by each search.
+    Counts are kept per public operation, calls made from inside another operation count towards the outer one.
+
+    The counting wrappers are installed as attributes of the tree instance, so trees without stats run the plain
+    class code. While stats are on, descents compare through the key functions instead of native operators. Trees
+    copied from an instrumented one, e.g. the sides of a `split`, start without stats.
+    """
+
+    def __init__(self, hook=None):
+        """
+        :param hook: optional function called as `hook(op, counts)` after each operation with the dict of counts of
+        that call, e.g. to feed a metrics exporter
+        """
+        self.hook = hook
+        self.reset()
+        self._wrapped = []
+        self._saved = None
+        self._level = 0
+        self._rolling = 0
+        self._visits = 0
+
+    def reset(self):
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.ops = {}
+        self.depths = Counter()
+
+    def report(self):
+        """
+        :return: dict of the `totals`, the calls and counts per operation under `ops`, and the histogram of search
+        depths under `depths`
+        """
+        return {'totals': dict(self.totals), 'ops': dict((op, dict(counts)) for op, counts in self.ops.items()),
+                'depths': dict(self.depths)}
+
+    def attach(self, tree):
+        self._saved = tree._key_eq, tree._key_gt, tree._native
+        key_eq, key_gt = tree._key_eq, tree._key_gt
+
+        def counted_eq(a, b):
+            # every node a search visits is tested for equality once
+            self._visits += 1
+            self.totals['comparisons'] += 1
+            return key_eq(a, b)
+
+        def counted_gt(a, b):
+            self.totals['comparisons'] += 1
+            return key_gt(a, b)
+
+        tree._key_eq = counted_eq
+        tree._key_gt = counted_gt
+        tree._native = False
+        for name in _ROTATIONS:
+            self._wrap(tree, name, self._rotation)
+        for name, climbs in _FIXUPS:
+            if hasattr(tree, climbs):
+                self._wrap(tree, name, lambda method, climbs=getattr(tree, climbs): self._fixup(method, climbs))
+        for name in _ROLLING:
+            self._wrap(tree, name, self._roll)
+        self._wrap(tree, '_search', self._search)
+        for name in _OPS:
+            self._wrap(tree, name, lambda method, name=name: self._op(name, method))
+
+    def detach(self, tree):
+        tree._key_eq, tree._key_gt, tree._native = self._saved
+        for name in self._wrapped:
+            tree.__dict__.pop(name, None)
+
+    def _wrap(self, tree, name, wrapper):
+        method = getattr(tree, name, None)
+        if method is not None:
+            setattr(tree, name, wrapper(method))
+            self._wrapped.append(name)
+
+    def _rotation(self, method):
+        def rotate(*args):
+            self.totals['rotations'] += 1
+            if self._rolling:
+                self.totals['rolling_steps'] += 1
+            return method(*args)
+
+        return rotate
+
+    def _fixup(self, method, climbs):
+        def fixup(*args):
+            # read before the fixup recolors the nodes the count depends on
+            self.totals['fixups'] += climbs(*args)
+            return method(*args)
+
+        return fixup
+
+    def _roll(self, method):
+        def roll(*args):
+            self._rolling += 1
+            try:
+                return method(*args)
+            finally:
+                self._rolling -= 1
+
+        return roll
+
+    def _search(self, method):
+        def search(*args):
+            visits = self._visits
+            result = method(*args)
+            self.depths[self._visits - visits] += 1
+            return result
+
+        return search
+
+    def _op(self, name, method):
+        def op(*args, **kwargs):
+            if self._level:
+                return method(*args, **kwargs)
+            before = dict(self.totals)
+            self._level += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._level -= 1
+                counts = dict((key, self.totals[key] - before[key]) for key in COUNTERS)
+                stats = self.ops.get(name)
+                if stats is None:
+                    stats = self.ops[name] = dict.fromkeys(('calls',) + COUNTERS, 0)
+                stats['calls'] += 1
+                for key in COUNTERS:
+                    stats[key] += counts[key]
+                if self.hook is not None:
+                    self.hook(name, counts)
+
+        return op
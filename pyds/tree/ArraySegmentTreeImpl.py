@@ -1,14 +1,52 @@
+import six
+
 from SegmentTree import SegmentTree
 
 
+def add_to_sum(tag, aggr, width):
+    return aggr + tag * width
+
+
+def add_to_extremum(tag, aggr, width):
+    return aggr + tag
+
+
+def add_compose(new, old):
+    return new + old
+
+
+def assign_to_sum(tag, aggr, width):
+    return tag * width
+
+
+def assign_to_extremum(tag, aggr, width):
+    return tag
+
+
+def assign_compose(new, old):
+    return new
+
+
 class ArraySegmentTreeImpl(SegmentTree):
     _nil = object()
 
-    def __init__(self, aggregation_func):
+    def __init__(self, aggregation_func, apply_func=None, compose_func=None):
+        """
+        :param aggregation_func: binary function aggregating two adjacent ranges
+        :param apply_func: function (tag, aggregate, width) returning the aggregate of a range of `width` elements
+        after the update `tag` is applied to each of them, required by `update_range`. e.g. `add_to_sum` or
+        `assign_to_extremum`
+        :param compose_func: function (new, old) merging two pending tags into one that applies `old` then `new`,
+        e.g. `add_compose` or `assign_compose`
+        """
         self._degree = 0
         self._length = 0
         self._arr = None
+        self._lazy = None
+        self._dirty = None
         self._aggr = aggregation_func
+        self._apply = apply_func
+        self._compose = compose_func
 
     def build(self, iterable):
         input = list(iterable)
@@ -20,23 +58,40 @@ class ArraySegmentTreeImpl(SegmentTree):
             i *= 2
         self._degree = i
         self._arr = [self._nil] * (2 * self._degree - 1)
-        self._arr[self._degree:self._degree + self._length] = input
-        low = self._degree
-        high = self.size + self._length
+        low = self._degree - 1
+        high = low + self._length
+        self._arr[low:high] = input
+        self._dirty = None
+        self._rebuild(low, high)
+        if self._apply is not None:
+            self._lazy = [None] * (self._degree - 1)
+
+    def _rebuild(self, low, high):
+        """
+        recompute every ancestor of the nodes in [low, high), which lie on one level, exactly once, level by level
+        """
+        arr = self._arr
         while low != 0:
-            for x in range(low, high):
-                if x % 2 == 0:
-                    self._arr[x // 2 - 1] = self._aggr(self._arr[x - 1], self._arr[x])
-                elif x == high - 1:
-                    self._arr[x // 2] = self._arr[x]
-            low = low // 2
-            high = (high + 1) // 2 - 1
+            low = (low - 1) // 2
+            high = high // 2
+            for pos in range(low, high):
+                ra = arr[pos * 2 + 2]
+                arr[pos] = arr[pos * 2 + 1] if ra is self._nil else self._aggr(arr[pos * 2 + 1], ra)
+
+    def _flush(self):
+        """
+        bring ancestors of leaves appended since the last flush up to date
+        """
+        if self._dirty is not None:
+            self._rebuild(self._dirty, self._degree - 1 + self._length)
+            self._dirty = None
 
     def query(self, low, high):
-        if not self._arr:
+        if self._arr is None:
             raise ValueError("Tree not yet built")
         if low >= self._length or high < 0:
             raise IndexError("No value hit by given range")
+        self._flush()
         return self._query(0, self._degree + low - 1, self._degree + high - 1, self._degree)
 
     def _query(self, pos, low, high, degree):
@@ -48,12 +103,15 @@ class ArraySegmentTreeImpl(SegmentTree):
         mid = left + degree // 2 - 1
         right = left + degree - 1
         if low > mid:
+            self._push(pos, degree)
             return self._query(pos * 2 + 2, low, high, degree // 2)
         elif high <= mid:
+            self._push(pos, degree)
             return self._query(pos * 2 + 1, low, high, degree // 2)
         elif low <= left and high >= right:
             return self._arr[pos]
         else:
+            self._push(pos, degree)
             la = self._query(pos * 2 + 1, low, high, degree // 2)
             ra = self._query(pos * 2 + 2, low, high, degree // 2)
             if ra is self._nil:
@@ -62,23 +120,130 @@ class ArraySegmentTreeImpl(SegmentTree):
                 return self._aggr(la, ra)
 
     def get(self, idx):
-        if not self._arr:
+        if self._arr is None:
             raise ValueError("Tree not yet built")
         if idx >= self._length or idx < 0:
             raise IndexError("Index out of range")
+        self._flush()
+        self._push_path(idx)
         return self._arr[self._degree + idx - 1]
 
     def update(self, idx, val):
-        if not self._arr:
+        if self._arr is None:
             raise ValueError("Tree not yet built")
         if idx >= self._length or idx < 0:
             raise IndexError("Index out of range")
+        self._flush()
+        self._push_path(idx)
         self._update(idx, val)
 
+    def update_many(self, pairs):
+        """
+        apply many point updates at once. leaves are written first, then each ancestor of an updated leaf is
+        recomputed once, level by level. for repeated indices the last value wins
+        :param pairs: iterable of (idx, val)
+        """
+        if self._arr is None:
+            raise ValueError("Tree not yet built")
+        updates = dict(pairs)
+        if not updates:
+            return
+        if min(updates) < 0 or max(updates) >= self._length:
+            raise IndexError("Index out of range")
+        self._flush()
+        if self._lazy is not None:
+            for idx in updates:
+                self._push_path(idx)
+        offset = self._degree - 1
+        for idx, val in six.iteritems(updates):
+            self._arr[offset + idx] = val
+        self._rebuild_many(sorted(offset + idx for idx in updates))
+
+    def _rebuild_many(self, positions):
+        """
+        recompute every ancestor of the nodes at sorted `positions`, which lie on one level, exactly once
+        """
+        arr = self._arr
+        while positions[0] != 0:
+            parents = []
+            for pos in positions:
+                pos = (pos - 1) // 2
+                if not parents or parents[-1] != pos:
+                    parents.append(pos)
+            for pos in parents:
+                ra = arr[pos * 2 + 2]
+                arr[pos] = arr[pos * 2 + 1] if ra is self._nil else self._aggr(arr[pos * 2 + 1], ra)
+            positions = parents
+
+    def update_range(self, low, high, tag):
+        """
+        apply the update `tag` to every element in the inclusive range, in O(log n). tags are kept on the highest
+        nodes covering the range and pushed down lazily by later queries and updates
+        """
+        if self._arr is None:
+            raise ValueError("Tree not yet built")
+        if self._apply is None:
+            raise ValueError("Tree has no apply_func")
+        if low >= self._length or high < 0:
+            raise IndexError("No value hit by given range")
+        low = max(low, 0)
+        high = min(high, self._length - 1)
+        self._flush()
+        self._update_range(0, self._degree + low - 1, self._degree + high - 1, self._degree, tag)
+
+    def _update_range(self, pos, low, high, degree, tag):
+        left = (pos + 1) * degree - 1
+        right = left + degree - 1
+        if low <= left and high >= right:
+            self._apply_tag(pos, degree, tag)
+            return
+        self._push(pos, degree)
+        mid = left + degree // 2 - 1
+        if low <= mid:
+            self._update_range(pos * 2 + 1, low, high, degree // 2, tag)
+        if high > mid:
+            self._update_range(pos * 2 + 2, low, high, degree // 2, tag)
+        la = self._arr[pos * 2 + 1]
+        ra = self._arr[pos * 2 + 2]
+        if ra is self._nil:
+            self._arr[pos] = la
+        else:
+            self._arr[pos] = self._aggr(la, ra)
+
+    def _apply_tag(self, pos, degree, tag):
+        left = (pos + 1) * degree - 1
+        width = min(degree, self._degree + self._length - 1 - left)
+        if width <= 0:
+            return
+        self._arr[pos] = self._apply(tag, self._arr[pos], width)
+        if degree > 1:
+            old = self._lazy[pos]
+            self._lazy[pos] = tag if old is None else self._compose(tag, old)
+
+    def _push(self, pos, degree):
+        if self._lazy is None or degree == 1:
+            return
+        tag = self._lazy[pos]
+        if tag is not None:
+            self._apply_tag(pos * 2 + 1, degree // 2, tag)
+            self._apply_tag(pos * 2 + 2, degree // 2, tag)
+            self._lazy[pos] = None
+
+    def _push_path(self, idx):
+        if self._lazy is None:
+            return
+        pos = 0
+        degree = self._degree
+        while degree > 1:
+            self._push(pos, degree)
+            degree //= 2
+            pos = pos * 2 + 1 if idx < degree else pos * 2 + 2
+            idx %= degree
+
     def _update(self, idx, val):
         pos = self._degree + idx - 1
         self._arr[pos] = val
-        while True:
+        while pos != 0:
             pos = (pos + 1) // 2 - 1
             la = self._arr[pos * 2 + 1]
             ra = self._arr[pos * 2 + 2]
@@ -86,21 +251,55 @@ class ArraySegmentTreeImpl(SegmentTree):
                 self._arr[pos] = la
             else:
                 self._arr[pos] = self._aggr(la, ra)
-            if pos == 0:
-                break
 
     def append(self, val):
-        if not self._arr:
-            self.build([val])
-        if self._length == self._degree:
-            self._degree *= 2
-            new_arr = [self._nil] * (2 * self._degree - 1)
-            degree = 1
-            new_arr[0] = self._arr[0]
-            while degree < self._degree:
-                pos = degree - 1
-                nex_pos = pos * 2 + 1
-                new_arr[nex_pos:nex_pos + degree] = self._arr[pos:pos + degree]
-                degree *= 2
-        self._length += 1
-        self._update(self._length, val)
+        """
+        append one element in amortized O(1). ancestors are recomputed by the next read
+        """
+        self.extend((val,))
+
+    def extend(self, iterable):
+        """
+        append elements. the new leaves are written in place, the storage grows geometrically, and every ancestor of
+        new leaves is recomputed once, level by level, by the next read
+        """
+        input = list(iterable)
+        if not input:
+            return
+        if self._arr is None:
+            self.build(input)
+            return
+        if self._dirty is None and self._lazy is not None:
+            # tags above the first new leaf were applied for the old width only
+            self._push_path(self._length)
+        while self._length + len(input) > self._degree:
+            self._grow()
+        low = self._degree - 1 + self._length
+        self._arr[low:low + len(input)] = input
+        if self._dirty is None:
+            self._dirty = low
+        self._length += len(input)
+
+    def _grow(self):
+        """
+        double the capacity in place. the old tree becomes the left subtree of the new root, so every level moves
+        one level down, deepest first so nothing is overwritten before it is moved
+        """
+        old = self._degree
+        self._degree *= 2
+        self._dirty = None if self._dirty is None else self._dirty + old
+        self._arr.extend([self._nil] * (2 * self._degree - 1 - len(self._arr)))
+        self._shift_levels(self._arr, old, self._nil)
+        self._arr[0] = self._arr[1]
+        if self._lazy is not None:
+            self._lazy.extend([None] * (self._degree - 1 - len(self._lazy)))
+            self._shift_levels(self._lazy, old // 2, None)
+            self._lazy[0] = None
+
+    @staticmethod
+    def _shift_levels(arr, width, fill):
+        while width >= 1:
+            start = width - 1
+            arr[2 * width - 1:3 * width - 1] = arr[start:start + width]
+            arr[3 * width - 1:4 * width - 1] = [fill] * width
+            width //= 2
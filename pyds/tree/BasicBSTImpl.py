@@ -1,22 +1,31 @@
 import operator
 
 from BinarySearchTree import BinarySearchTree
-from treenode.BinaryIndexTreeNode import BinaryIndexTreeNode
+from treenode.BinaryIndexTreeNode import BinaryIndexTreeNode, CountedBinaryIndexTreeNode
 
 
 class BasicBSTImpl(BinarySearchTree):
-    def __init__(self, nodeclass=BinaryIndexTreeNode, eq=operator.eq, gt=operator.gt):
+    _parent_links = False
+
+    def __init__(self, nodeclass=BinaryIndexTreeNode, eq=operator.eq, gt=operator.gt, key=None, multiset=False):
         """
         :param nodeclass: class of the node to be used when create new nodes, must have attribute `key`, `left`, and
-        `right`, and a __init__ requires no parameter. default to BinaryIndexTreeNode. Used when call `insert`
+        `right`, and a __init__ accepting (key, val). default to BinaryIndexTreeNode. Used when call `insert`
         without parameter `node`
         :param eq: binary function used to assert equality of key, default to operator.eq
         :param gt: binary function used to compare keys, default to operator.gt
+        :param key: optional function mapping a key to the value compared by `eq` and `gt`, like the `key` of
+        `sorted`. it is called once per node and cached in `node.sort_key`
+        :param multiset: store each distinct key once, with the number of times it was inserted in `node.count`, see
+        `count` and `remove_one`. `delete` removes all copies. the default `nodeclass` is then replaced by
+        CountedBinaryIndexTreeNode, a custom one must provide `count`
         """
+        if multiset and nodeclass is BinaryIndexTreeNode:
+            nodeclass = CountedBinaryIndexTreeNode
+        self._multiset = multiset
         self._root = None
         self._nodeclass = nodeclass
-        self._key_eq = eq
-        self._key_gt = gt
+        self._init_keys(eq, gt, key)
 
     @property
     def root(self):
@@ -28,42 +37,52 @@ class BasicBSTImpl(BinarySearchTree):
     def insert(self, node=None, key=None, val=None):
         """
         Insert the node if `node` is provided
-        Else a new node will be created by calling nodeclass(key=key), and `val` will be then inserted with name val
-        if provided
+        Else a new node will be created by calling nodeclass(key, val)
         One of `node` or `key` must be provided.
+        In multiset mode, a key already present only has its count increased
         :return:
         """
         if node is None:
             if key is None:
                 raise ValueError("one of node and key must be passed")
-            node = self._nodeclass()
-            node.key = key
-            if val is not None:
-                node.val = val
+            node = self._nodeclass(key, val)
+        self._cache_key(node)
+        if self._multiset:
+            node.count = 1
         if self._root is None:
             self._root = node
             return
         self._insert(self._root, node)
 
     def _insert(self, node, new):
-        if self._key_gt(node.key, new.key):
-            if node.left is None:
-                node.left = new
-            else:
-                self._insert(node.left, new)
-        else:
-            if node.right is None:
-                node.right = new
-            else:
-                self._insert(node.right, new)
+        if self._multiset:
+            equal = self._attach_distinct(node, new)[1]
+            if equal is not None:
+                equal.count += 1
+            return
+        self._attach_leaf(node, new)
 
     def delete(self, key):
         return self._delete(self.root, key, self, "_root")
 
     def _delete(self, node, key, parent, side):
-        if node is None:
-            return None
-        if self._key_eq(node.key, key):
+        if self._native:
+            while node is not None and node.key != key:
+                parent = node
+                if node.key > key:
+                    node, side = node.left, "left"
+                else:
+                    node, side = node.right, "right"
+        else:
+            key = self._cmp_key(key)
+            node_key = self._node_key
+            while node is not None and not self._key_eq(node_key(node), key):
+                parent = node
+                if self._key_gt(node_key(node), key):
+                    node, side = node.left, "left"
+                else:
+                    node, side = node.right, "right"
+        if node is not None:
             if node.left is None:
                 parent.__setattr__(side, node.right)
             elif node.right is None:
@@ -79,8 +98,4 @@ class BasicBSTImpl(BinarySearchTree):
                 if old is not None:
                     old.right = curr.left
                     curr.left = node.left
-            return node
-        if self._key_gt(node.key, key):
-            return self._delete(node.left, key, node, "left")
-        else:
-            return self._delete(node.right, key, node, "right")
+        return node
@@ -0,0 +1,96 @@
+import operator
+
+from SegmentTree import SegmentTree
+
+
+class FenwickTreeImpl(SegmentTree):
+    """
+    Binary indexed tree in a flat list. Needs an invertible, commutative aggregation, e.g. addition with
+    subtraction, or xor with itself. `_tree[i]` (1-based) aggregates the `i & -i` elements ending at element `i`.
+    """
+
+    def __init__(self, aggregation_func=operator.add, inverse_func=operator.sub):
+        """
+        :param aggregation_func: binary function aggregating two ranges
+        :param inverse_func: binary function undoing `aggregation_func`, i.e. inverse(aggr(a, b), b) == a
+        """
+        self._length = 0
+        self._tree = None
+        self._aggr = aggregation_func
+        self._inv = inverse_func
+
+    def build(self, iterable):
+        """
+        build in O(n) by pushing each slot into the next slot covering it
+        """
+        tree = [None]
+        tree.extend(iterable)
+        if len(tree) == 1:
+            raise ValueError("Can not build with empty list")
+        self._length = len(tree) - 1
+        for i in range(1, self._length + 1):
+            j = i + (i & -i)
+            if j <= self._length:
+                tree[j] = self._aggr(tree[j], tree[i])
+        self._tree = tree
+
+    def _prefix(self, count):
+        """
+        aggregate of the first `count` elements, `count` must be positive
+        """
+        tree = self._tree
+        res = tree[count]
+        count -= count & -count
+        while count:
+            res = self._aggr(tree[count], res)
+            count -= count & -count
+        return res
+
+    def query(self, low, high):
+        if self._tree is None:
+            raise ValueError("Tree not yet built")
+        if low >= self._length or high < 0:
+            raise IndexError("No value hit by given range")
+        high = min(high, self._length - 1)
+        if low <= 0:
+            return self._prefix(high + 1)
+        return self._inv(self._prefix(high + 1), self._prefix(low))
+
+    def get(self, idx):
+        if self._tree is None:
+            raise ValueError("Tree not yet built")
+        if idx >= self._length or idx < 0:
+            raise IndexError("Index out of range")
+        return self.query(idx, idx)
+
+    def update(self, idx, val):
+        if self._tree is None:
+            raise ValueError("Tree not yet built")
+        if idx >= self._length or idx < 0:
+            raise IndexError("Index out of range")
+        self._add(idx, self._inv(val, self.get(idx)))
+
+    def _add(self, idx, delta):
+        tree = self._tree
+        i = idx + 1
+        while i <= self._length:
+            tree[i] = self._aggr(tree[i], delta)
+            i += i & -i
+
+    def lower_bound(self, target):
+        """
+        smallest index whose prefix aggregate is not less than `target`, or the length of the tree if there is none.
+        prefix aggregates must be non-decreasing, e.g. sums of non-negative values. O(log n)
+        """
+        if self._tree is None:
+            raise ValueError("Tree not yet built")
+        tree = self._tree
+        pos = 0
+        step = 1 << (self._length.bit_length() - 1)
+        while step:
+            nxt = pos + step
+            if nxt <= self._length and tree[nxt] < target:
+                pos = nxt
+                target = self._inv(target, tree[nxt])
+            step >>= 1
+        return pos
@@ -0,0 +1,57 @@
+import numpy as np
+
+from tree.FenwickTreeImpl import FenwickTreeImpl
+
+
+class NumpyFenwickTreeImpl(FenwickTreeImpl):
+    """
+    Binary indexed tree over numeric values in a typed ndarray. The build is one vectorized pass over the running
+    aggregate, and `query_many` walks all ranges at once.
+    """
+
+    def __init__(self, aggregation_func=np.add, inverse_func=np.subtract, dtype=None):
+        """
+        :param aggregation_func: binary :class:`numpy.ufunc` with an identity, e.g. np.add or np.bitwise_xor
+        :param inverse_func: binary :class:`numpy.ufunc` undoing `aggregation_func`
+        :param dtype: dtype of the stored values, inferred from the input when None
+        """
+        if not isinstance(aggregation_func, np.ufunc) or aggregation_func.identity is None:
+            raise ValueError("aggregation_func must be a numpy ufunc with an identity")
+        super(NumpyFenwickTreeImpl, self).__init__(aggregation_func, inverse_func)
+        self._dtype = dtype
+
+    def build(self, iterable):
+        input = np.asarray(iterable if hasattr(iterable, '__len__') else list(iterable), dtype=self._dtype)
+        if input.ndim != 1 or not len(input):
+            raise ValueError("Can not build with empty list")
+        self._length = len(input)
+        acc = np.empty(self._length + 1, dtype=input.dtype)
+        acc[0] = self._aggr.identity
+        self._aggr.accumulate(input, out=acc[1:])
+        idx = np.arange(self._length + 1)
+        self._tree = self._inv(acc, acc[idx - (idx & -idx)])
+
+    def _prefix_many(self, counts):
+        res = np.full(len(counts), self._aggr.identity, dtype=self._tree.dtype)
+        counts = counts.copy()
+        while True:
+            live = counts > 0
+            if not live.any():
+                return res
+            res[live] = self._aggr(res[live], self._tree[counts[live]])
+            counts[live] -= counts[live] & -counts[live]
+
+    def query_many(self, lows, highs):
+        """
+        answer many inclusive ranges at once, in O(log n) vectorized passes
+        :return: ndarray of aggregates
+        """
+        if self._tree is None:
+            raise ValueError("Tree not yet built")
+        lows = np.asarray(lows, dtype=np.int64)
+        highs = np.asarray(highs, dtype=np.int64)
+        if np.any(lows >= self._length) or np.any(highs < 0):
+            raise IndexError("No value hit by given range")
+        highs = np.minimum(highs, self._length - 1)
+        lows = np.maximum(lows, 0)
+        return self._inv(self._prefix_many(highs + 1), self._prefix_many(lows))
@@ -0,0 +1,233 @@
+import struct
+
+import numpy as np
+
+from tree.ArraySegmentTreeImpl import ArraySegmentTreeImpl
+
+
+class NumpySegmentTreeImpl(ArraySegmentTreeImpl):
+    """
+    Segment tree over numeric values stored in a typed ndarray, with the same layout as
+    :class:`ArraySegmentTreeImpl`. Each level is built with one vectorized call of the aggregation ufunc. Slots not
+    covering any element are left uninitialized and never read.
+    """
+
+    _magic = b'PYDSSEG1'
+    _header = struct.Struct('<8sQQ16s16s')
+    _header_size = 64
+
+    def __init__(self, aggregation_func=np.add, dtype=None):
+        """
+        :param aggregation_func: binary :class:`numpy.ufunc`, e.g. np.add, np.minimum or np.maximum
+        :param dtype: dtype of the stored values, inferred from the input when None
+        """
+        if not isinstance(aggregation_func, np.ufunc) or aggregation_func.nin != 2:
+            raise ValueError("aggregation_func must be a binary numpy ufunc")
+        super(NumpySegmentTreeImpl, self).__init__(aggregation_func)
+        self._dtype = dtype
+
+    def build(self, iterable):
+        input = np.asarray(iterable if hasattr(iterable, '__len__') else list(iterable), dtype=self._dtype)
+        if input.ndim != 1 or not len(input):
+            raise ValueError("Can not build with empty list")
+        self._length = len(input)
+        i = 1
+        while self._length > i:
+            i *= 2
+        self._degree = i
+        self._arr = np.empty(2 * self._degree - 1, dtype=input.dtype)
+        low = self._degree - 1
+        high = low + self._length
+        self._arr[low:high] = input
+        self._dirty = None
+        self._rebuild(low, high)
+
+    def _rebuild(self, low, high):
+        """
+        recompute the ancestors of the nodes in [low, high) with one vectorized call per level. a parent whose right
+        child covers no element takes the value of its left child
+        """
+        arr = self._arr
+        start = (1 << ((low + 1).bit_length() - 1)) - 1
+        width = self._degree // (start + 1)
+        while low != 0:
+            covered = start + -(-self._length // width)
+            low = (low - 1) // 2
+            high = high // 2
+            start = (start - 1) // 2
+            width *= 2
+            full = min(high, (covered - 1) // 2)
+            if low < full:
+                self._aggr(arr[2 * low + 1:2 * full + 1:2], arr[2 * low + 2:2 * full + 2:2], out=arr[low:full])
+            if full < high and 2 * full + 1 < covered:
+                arr[full] = arr[2 * full + 1]
+
+    def _grow(self):
+        old = self._degree
+        self._degree *= 2
+        self._dirty = None if self._dirty is None else self._dirty + old
+        arr = np.empty(2 * self._degree - 1, dtype=self._arr.dtype)
+        width = old
+        while width >= 1:
+            arr[2 * width - 1:3 * width - 1] = self._arr[width - 1:2 * width - 1]
+            width //= 2
+        arr[0] = arr[1]
+        self._arr = arr
+
+    def query(self, low, high):
+        if self._arr is None:
+            raise ValueError("Tree not yet built")
+        if low >= self._length or high < 0:
+            raise IndexError("No value hit by given range")
+        self._flush()
+        l = self._degree - 1 + max(low, 0)
+        r = self._degree - 1 + min(high, self._length - 1)
+        la = ra = None
+        while l <= r:
+            if l % 2 == 0:
+                la = self._arr[l] if la is None else self._aggr(la, self._arr[l])
+                l += 1
+            if r % 2 == 1:
+                ra = self._arr[r] if ra is None else self._aggr(self._arr[r], ra)
+                r -= 1
+            l = (l - 1) // 2
+            r = (r - 1) // 2
+        if la is None:
+            return ra
+        if ra is None:
+            return la
+        return self._aggr(la, ra)
+
+    def query_many(self, lows, highs):
+        """
+        answer many inclusive ranges at once, walking all of them up the tree together in one vectorized pass per
+        level
+        :return: ndarray of aggregates
+        """
+        if self._arr is None:
+            raise ValueError("Tree not yet built")
+        lows = np.asarray(lows, dtype=np.int64)
+        highs = np.asarray(highs, dtype=np.int64)
+        if np.any(lows >= self._length) or np.any(highs < 0):
+            raise IndexError("No value hit by given range")
+        self._flush()
+        l = self._degree - 1 + np.maximum(lows, 0)
+        r = self._degree - 1 + np.minimum(highs, self._length - 1)
+        la = np.zeros(len(l), dtype=self._arr.dtype)
+        ra = np.zeros(len(l), dtype=self._arr.dtype)
+        has_la = np.zeros(len(l), dtype=bool)
+        has_ra = np.zeros(len(l), dtype=bool)
+        done = l > r
+        while not done.all():
+            take = ~done & (l % 2 == 0)
+            val = self._arr[np.where(take, l, 0)]
+            la = np.where(take, np.where(has_la, self._aggr(la, val), val), la)
+            has_la |= take
+            l = np.where(take, l + 1, l)
+            take = ~done & (r % 2 == 1) & (l <= r)
+            val = self._arr[np.where(take, r, 0)]
+            ra = np.where(take, np.where(has_ra, self._aggr(val, ra), val), ra)
+            has_ra |= take
+            r = np.where(take, r - 1, r)
+            done |= l > r
+            l = (l - 1) // 2
+            r = (r - 1) // 2
+        both = self._aggr(la, ra)
+        return np.where(has_la & has_ra, both, np.where(has_la, la, ra))
+
+    def update_many(self, pairs):
+        """
+        apply many point updates at once, see :meth:`update_arrays`
+        :param pairs: iterable of (idx, val)
+        """
+        pairs = list(pairs)
+        self.update_arrays([idx for idx, _ in pairs], [val for _, val in pairs])
+
+    def update_arrays(self, idxs, vals):
+        """
+        apply many point updates at once, recomputing each level of dirty ancestors in one vectorized pass. for
+        repeated indices the last value wins
+        :param idxs: array of indices
+        :param vals: array of values, paired with `idxs`
+        """
+        if self._arr is None:
+            raise ValueError("Tree not yet built")
+        idxs = np.asarray(idxs, dtype=np.int64)
+        vals = np.asarray(vals, dtype=self._arr.dtype)
+        if not len(idxs):
+            return
+        if idxs.min() < 0 or idxs.max() >= self._length:
+            raise IndexError("Index out of range")
+        self._flush()
+        # keep the last occurrence of every index
+        idxs, last = np.unique(idxs[::-1], return_index=True)
+        pos = self._degree - 1 + idxs
+        self._arr[pos] = vals[::-1][last]
+        width = 1
+        while pos[0] != 0:
+            pos = np.unique((pos - 1) // 2)
+            width *= 2
+            right = pos * 2 + 2
+            both = (right - (self._degree * 2 // width - 1)) * (width // 2) < self._length
+            self._arr[pos[both]] = self._aggr(self._arr[right[both] - 1], self._arr[right[both]])
+            self._arr[pos[~both]] = self._arr[right[~both] - 1]
+
+    def _update(self, idx, val):
+        pos = self._degree - 1 + idx
+        self._arr[pos] = val
+        width = 1
+        while pos != 0:
+            pos = (pos - 1) // 2
+            width *= 2
+            if self._covers(pos * 2 + 2, width // 2):
+                self._arr[pos] = self._aggr(self._arr[pos * 2 + 1], self._arr[pos * 2 + 2])
+            else:
+                self._arr[pos] = self._arr[pos * 2 + 1]
+
+    def _covers(self, pos, width):
+        """
+        whether the node at `pos`, spanning `width` leaves, covers at least one element
+        """
+        first = pos - (self._degree // width - 1)
+        return first * width < self._length
+
+    def save(self, path):
+        """
+        write the tree to `path`: a fixed-size header holding length, degree, dtype and the name of the aggregation
+        ufunc, followed by the flat array
+        """
+        if self._arr is None:
+            raise ValueError("Tree not yet built")
+        self._flush()
+        header = self._header.pack(self._magic, self._length, self._degree, self._arr.dtype.str.encode('ascii'),
+                                   self._aggr.__name__.encode('ascii'))
+        with open(path, 'wb') as f:
+            f.write(header.ljust(self._header_size, b'\0'))
+            self._arr.tofile(f)
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        """
+        load a tree written by :meth:`save`
+        :param mmap: map the file read-only instead of reading it. queries then run on the mapped buffer without
+        copying, and processes opening the same file share its pages. updates raise ValueError
+        """
+        with open(path, 'rb') as f:
+            raw = f.read(cls._header_size)
+        if len(raw) != cls._header_size:
+            raise ValueError("Not a segment tree file")
+        magic, length, degree, dtype, aggr = cls._header.unpack(raw[:cls._header.size])
+        if magic != cls._magic:
+            raise ValueError("Not a segment tree file")
+        aggr = getattr(np, aggr.rstrip(b'\0').decode('ascii'), None)
+        if not isinstance(aggr, np.ufunc):
+            raise ValueError("Unknown aggregation")
+        dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+        tree = cls(aggr, dtype)
+        tree._length = length
+        tree._degree = degree
+        if mmap:
+            tree._arr = np.memmap(path, dtype=dtype, mode='r', offset=cls._header_size, shape=(2 * degree - 1,))
+        else:
+            tree._arr = np.fromfile(path, dtype=dtype, count=2 * degree - 1, offset=cls._header_size)
+        return tree
@@ -0,0 +1,296 @@
+from PersistentTree import PersistentTree
+from tree.RedBlackTreeImpl import RedBlackTreeImpl
+
+
+class PersistentRedBlackTreeImpl(PersistentTree, RedBlackTreeImpl):
+    """
+    Red-black tree updated by path copying. insert and delete copy the O(log n) nodes on the search path, plus the
+    few siblings recolored or rotated by the fixup. :meth:`snapshot` is O(1) and every version stays usable. Nodes
+    must not be modified or freed to a pool while any version uses them. There is no `split` or `join`, as
+    :class:`RedBlackTreeImpl` has none; use :class:`PersistentTreapImpl` for those.
+    """
+
+    def insert(self, node=None, key=None, val=None):
+        if node is None:
+            if key is None:
+                raise ValueError("one of node and key must be passed")
+            node = self._nodeclass(key, val)
+        self._cache_key(node)
+        node.red = True
+        node.left = node.right = node.parent = None
+        if self._sized:
+            node.size = 1
+        if self._root is None:
+            node.red = False
+            self._root = node
+            return
+        key = self._node_key(node)
+        node_key, gt = self._node_key, self._key_gt
+        path = []
+        p = self._root
+        while p is not None:
+            left = gt(node_key(p), key)
+            path.append((p, left))
+            p = p.left if left else p.right
+        path = self._copy_path(path, 1)
+        if left:
+            path[-1].left = node
+        else:
+            path[-1].right = node
+        self._insert_fix(path, node)
+
+    def _insert_climbs(self, path, node):
+        """
+        counterpart of :meth:`RedBlackTreeImpl._insert_climbs` over the copied ancestors `path`
+        """
+        climbs = 0
+        i = len(path) - 1
+        while i > 0 and path[i].red:
+            p, gp = path[i], path[i - 1]
+            uncle = gp.right if p is gp.left else gp.left
+            if uncle is None or not uncle.red:
+                break
+            climbs += 1
+            i -= 2
+        return climbs
+
+    def _insert_fix(self, path, node):
+        """
+        :param path: copied ancestors of `node` from the root down
+        """
+        while path:
+            p = path.pop()
+            if not p.red:
+                break
+            gp = path.pop()
+            if p is gp.left:
+                uncle = gp.right
+                # red uncle
+                if uncle is not None and uncle.red:
+                    gp.right = uncle = self._clone(uncle)
+                    uncle.red = False
+                    p.red = False
+                    gp.red = True
+                    node = gp
+                    continue
+                # left-right
+                if node is p.right:
+                    self._rotate(gp, p, True)
+                    p = node
+                # left-left
+                p.red = False
+                gp.red = True
+                self._rotate(path[-1] if path else None, gp, False)
+            else:
+                uncle = gp.left
+                # red uncle
+                if uncle is not None and uncle.red:
+                    gp.left = uncle = self._clone(uncle)
+                    uncle.red = False
+                    p.red = False
+                    gp.red = True
+                    node = gp
+                    continue
+                # right-left
+                if node is p.left:
+                    self._rotate(gp, p, False)
+                    p = node
+                # right-right
+                p.red = False
+                gp.red = True
+                self._rotate(path[-1] if path else None, gp, True)
+            break
+        self._root.red = False
+
+    def delete(self, key):
+        path, found = self._find_path(key)
+        if found is None:
+            return found
+        node = found
+        moved = None
+        if node.left is not None and node.right is not None:
+            # the predecessor takes the place of the node and is removed instead
+            moved = len(path)
+            path.append((node, True))
+            node = node.left
+            while node.right is not None:
+                path.append((node, False))
+                node = node.right
+        left = path[-1][1] if path else False
+        copies = self._copy_path(path, -1)
+        if moved is not None:
+            moved = copies[moved]
+            moved.key = node.key
+            moved.val = node.val
+            if self._keyfunc is not None:
+                moved.sort_key = node.sort_key
+        p = copies[-1] if copies else None
+        child = node.left if node.right is None else node.right
+        if not node.red and child is not None and child.red:
+            # black + red = black
+            child = self._clone(child)
+            child.red = False
+        self._link(p, left, child)
+        # black + black = double black
+        if not node.red and child is None and copies:
+            self._delete_fixup(copies, left)
+        return found
+
+    def _copy_path(self, path, delta):
+        """
+        copy the nodes of `path`, as returned by :meth:`_find_path`, from the root down. sizes change by `delta`
+        :return: list of the copies, from the new root down
+        """
+        copies = []
+        parent = None
+        side = False
+        for node, left in path:
+            node = self._clone(node)
+            if self._sized:
+                node.size += delta
+            self._link(parent, side, node)
+            copies.append(node)
+            parent, side = node, left
+        return copies
+
+    def _copy_node(self, node):
+        new = self._nodeclass(node.key, node.val)
+        new.red = node.red
+        if self._keyfunc is not None:
+            new.sort_key = node.sort_key
+        if self._sized:
+            new.size = node.size
+        return new
+
+    def _link(self, parent, left, node):
+        """
+        hang `node` as the left child of the copied `parent` if `left`, else as the right child, or make it the root
+        if `parent` is None
+        """
+        if parent is None:
+            self._root = node
+        elif left:
+            parent.left = node
+        else:
+            parent.right = node
+
+    def _rotate(self, parent, node, left):
+        """
+        rotate the copied `node`, child of the copied `parent`, to the left if `left` else to the right. the child
+        moving up must be a copy too
+        """
+        side = parent is not None and parent.left is node
+        if left:
+            up = node.right
+            node.right = up.left
+            up.left = node
+        else:
+            up = node.left
+            node.left = up.right
+            up.right = node
+        self._link(parent, side, up)
+        if self._sized:
+            up.size = node.size
+            self._update_size(node)
+        return up
+
+    def _delete_climbs(self, path, left):
+        """
+        counterpart of :meth:`RedBlackTreeImpl._delete_climbs` over the copied ancestors `path`
+        """
+        climbs = 0
+        i = len(path) - 1
+        while i >= 0 and not path[i].red:
+            p = path[i]
+            sibling = p.right if left else p.left
+            if sibling.red or any(niece is not None and niece.red for niece in (sibling.left, sibling.right)):
+                break
+            climbs += 1
+            left = i > 0 and path[i - 1].left is p
+            i -= 1
+        return climbs
+
+    def _delete_fixup(self, path, left):
+        """
+        :param path: copied ancestors of the doubly black position, from the root down
+        :param left: whether the position is the left child of the last node of `path`
+        """
+        while path:
+            p = path.pop()
+            gp = path[-1] if path else None
+            if left:
+                sibling = p.right = self._clone(p.right)
+                # red sibling: change to black
+                if sibling.red:
+                    p.red = True
+                    sibling.red = False
+                    self._rotate(gp, p, True)
+                    gp = sibling
+                    sibling = p.right = self._clone(p.right)
+                leftniece = sibling.left
+                rightniece = sibling.right
+                lnr = leftniece is not None and leftniece.red
+                rnr = rightniece is not None and rightniece.red
+                if not lnr and not rnr:
+                    sibling.red = True
+                    # red parent and black niece: recolor
+                    if p.red:
+                        p.red = False
+                        return
+                    # black parent and black niece: recolor, move up
+                    left = gp is not None and gp.left is p
+                    continue
+                # black right niece: change to red
+                if not rnr:
+                    leftniece = sibling.left = self._clone(leftniece)
+                    sibling.red = True
+                    leftniece.red = False
+                    self._rotate(p, sibling, False)
+                    rightniece = sibling
+                    sibling = leftniece
+                else:
+                    rightniece = sibling.right = self._clone(rightniece)
+                # red right niece: rotate
+                sibling.red = p.red
+                p.red = False
+                rightniece.red = False
+                self._rotate(gp, p, True)
+                return
+            else:
+                sibling = p.left = self._clone(p.left)
+                # red sibling: change to black
+                if sibling.red:
+                    p.red = True
+                    sibling.red = False
+                    self._rotate(gp, p, False)
+                    gp = sibling
+                    sibling = p.left = self._clone(p.left)
+                leftniece = sibling.left
+                rightniece = sibling.right
+                lnr = leftniece is not None and leftniece.red
+                rnr = rightniece is not None and rightniece.red
+                if not lnr and not rnr:
+                    sibling.red = True
+                    # red parent and black niece: recolor
+                    if p.red:
+                        p.red = False
+                        return
+                    # black parent and black niece: recolor, move up
+                    left = gp is not None and gp.left is p
+                    continue
+                # black left niece: change to red
+                if not lnr:
+                    rightniece = sibling.right = self._clone(rightniece)
+                    sibling.red = True
+                    rightniece.red = False
+                    self._rotate(p, sibling, True)
+                    leftniece = sibling
+                    sibling = rightniece
+                else:
+                    leftniece = sibling.left = self._clone(leftniece)
+                # red left niece: rotate
+                sibling.red = p.red
+                p.red = False
+                leftniece.red = False
+                self._rotate(gp, p, False)
+                return
@@ -0,0 +1,141 @@
+from copy import copy
+
+from PersistentTree import PersistentTree
+from tree.TreapImpl import TreapImpl
+
+
+class PersistentTreapImpl(PersistentTree, TreapImpl):
+    """
+    Treap updated by path copying. insert, delete, `split` and `join` copy O(log n) expected nodes, :meth:`snapshot`
+    is O(1) and every version stays usable. Nodes must not be modified or freed to a pool while any version uses
+    them. Set operations build their result from copies, as in non-destructive mode.
+    """
+
+    def insert(self, node=None, key=None, priority=None, val=None):
+        if node is None:
+            node = self._new_node(key, priority, val)
+        self._cache_key(node)
+        self._insert_node(node)
+
+    def _insert_node(self, new):
+        """
+        copy the path down to where `new` outranks the subtree, and split that subtree around it. equal keys go to
+        the right
+        """
+        key = self._node_key(new)
+        node_key, gt = self._node_key, self._key_gt
+        path = []
+        node = self._root
+        while node is not None and not self._priority_lt(new.priority, node.priority):
+            left = gt(node_key(node), key)
+            path.append((node, left))
+            node = node.left if left else node.right
+        new.left, _, new.right = self._split_copy(node, key, False)
+        new.parent = None
+        if self._sized:
+            self._update_size(new)
+        self._root = self._rebuild_path(path, new)
+        return new
+
+    def delete(self, key):
+        path, node = self._find_path(key)
+        if node is not None:
+            self._root = self._rebuild_path(path, self._join_copy(node.left, node.right))
+        return node
+
+    def update_priority(self, key, priority):
+        node = self.delete(key)
+        if node is None:
+            return node
+        new = self._copy_node(node)
+        new.priority = priority
+        return self._insert_node(new)
+
+    def split(self, key, keep_pivot=True):
+        """
+        split into keys up to `key` and keys above. the tree itself is left unchanged
+        :param keep_pivot: if False and `key` is present, its node is the pivot and in neither side. else the pivot
+        is a new node of `key` and equal keys stay on the left
+        """
+        less, pivot, greater = self._split_copy(self._root, self._cmp_key(key), not keep_pivot)
+        if pivot is None:
+            pivot = self._nodeclass(key, self._top)
+        left = copy(self)
+        left._root = less
+        right = copy(self)
+        right._root = greater
+        return self.SplitResult(left, right, pivot)
+
+    @classmethod
+    def join(cls, left, right):
+        joined = copy(left)
+        joined._root = left._join_copy(left.root, right.root)
+        return joined
+
+    @classmethod
+    def _set_operation(cls, op, t1, t2, destructive, executor, parallel_depth, parallel_min_size):
+        result = super(PersistentTreapImpl, cls)._set_operation(op, t1, t2, False, executor, parallel_depth,
+                                                                 parallel_min_size)
+        if destructive:
+            t1._root = t2._root = None
+        return result
+
+    def _split_copy(self, node, key, stop_at_equal):
+        """
+        copying counterpart of :meth:`_split_node`
+        :param key: key as compared
+        :param stop_at_equal: take out the first node equal to `key` met on the way down, else equal keys go left
+        :return: tuple of (less, equal, greater)
+        """
+        node_key, key_eq, key_gt = self._node_key, self._key_eq, self._key_gt
+        lchain = []
+        rchain = []
+        eq = lrest = rrest = None
+        while node is not None:
+            k = node_key(node)
+            if stop_at_equal and key_eq(k, key):
+                eq, lrest, rrest = node, node.left, node.right
+                break
+            node = self._clone(node)
+            if key_gt(k, key):
+                rchain.append(node)
+                node = node.left
+            else:
+                lchain.append(node)
+                node = node.right
+        for node in reversed(lchain):
+            node.right = lrest
+            if self._sized:
+                self._update_size(node)
+            lrest = node
+        for node in reversed(rchain):
+            node.left = rrest
+            if self._sized:
+                self._update_size(node)
+            rrest = node
+        return lrest, eq, rrest
+
+    def _join_copy(self, a, b):
+        """
+        copying counterpart of :meth:`_join_nodes`
+        """
+        chain = []
+        while a is not None and b is not None:
+            if self._priority_lt(b.priority, a.priority):
+                b = self._clone(b)
+                chain.append((b, True))
+                b = b.left
+            else:
+                a = self._clone(a)
+                chain.append((a, False))
+                a = a.right
+        node = b if a is None else a
+        for parent, left in reversed(chain):
+            if left:
+                parent.left = node
+            else:
+                parent.right = node
+            if self._sized:
+                self._update_size(parent)
+            node = parent
+        return node
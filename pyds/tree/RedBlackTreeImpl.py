@@ -1,20 +1,106 @@
 import operator
 
 from BinarySearchTree import BinarySearchTree
-from treenode.RedBlackTreeNode import RedBlackTreeNode
+from OrderedBinaryTree import _from_flat
+from treenode.RedBlackTreeNode import CountedRedBlackTreeNode, RedBlackTreeNode, SizedCountedRedBlackTreeNode, \
+    SizedRedBlackTreeNode
 
 
 class RedBlackTreeImpl(BinarySearchTree):
-    def __init__(self, nodeclass=RedBlackTreeNode, eq=operator.eq, gt=operator.gt):
+    def __init__(self, nodeclass=RedBlackTreeNode, eq=operator.eq, gt=operator.gt, key=None, order_statistics=False,
+                 multiset=False):
         """
-        :param nodeclass: the class of tree node, should be derived from :class:`RedBlackTreeNode`
+        :param nodeclass: the class of tree node, should be derived from :class:`RedBlackTreeNode`, or a
+        :class:`RedBlackNodePool` to keep nodes in flat arrays
         :param eq: function used to evaluate equality of `nodeclass`.key
         :param gt: function used to evaluate priority of `nodeclass`.key
+        :param key: optional function mapping `nodeclass`.key to the value compared by `eq` and `gt`, called once
+        per node and cached in `sort_key`
+        :param order_statistics: keep subtree sizes in `size` of each node for `rank`, `select` and O(1) `len`. the
+        default `nodeclass` is then replaced by :class:`SizedRedBlackTreeNode`, a custom one must provide `size`
+        :param multiset: store each distinct key in one node, with the number of times it was inserted in `count`,
+        see `count` and `remove_one`. `delete` removes all copies, and sizes, `rank` and `select` count distinct
+        keys. the default `nodeclass` is then replaced by a counted one, a custom one must provide `count` and a
+        pool must be created with `counted=True`
         """
+        if nodeclass is RedBlackTreeNode:
+            if multiset:
+                nodeclass = SizedCountedRedBlackTreeNode if order_statistics else CountedRedBlackTreeNode
+            elif order_statistics:
+                nodeclass = SizedRedBlackTreeNode
+        self._multiset = multiset
         self._root = None
         self._nodeclass = nodeclass
-        self._key_eq = eq
-        self._key_gt = gt
+        self._sized = order_statistics
+        self._init_keys(eq, gt, key)
+
+    @classmethod
+    def from_sorted(cls, keys, vals=None, **kwargs):
+        """
+        build a balanced tree from keys in ascending order in linear time. in multiset mode, runs of equal keys are
+        stored as one node, with the value of the first
+        :param keys: iterable of keys in ascending order, may be a generator
+        :param vals: optional iterable of values, paired with `keys`
+        :param kwargs: passed to the constructor
+        :return: the new tree
+        """
+        tree = cls(**kwargs)
+        pairs = ((key, None) for key in keys) if vals is None else zip(keys, vals)
+        nodes = []
+        for key, val in pairs:
+            node = tree._nodeclass(key, val)
+            tree._cache_key(node)
+            if nodes and tree._key_gt(tree._node_key(nodes[-1]), tree._node_key(node)):
+                raise ValueError("keys must be in ascending order")
+            if nodes and tree._multiset and tree._key_eq(tree._node_key(nodes[-1]), tree._node_key(node)):
+                nodes[-1].count += 1
+                continue
+            nodes.append(node)
+        tree._root = tree._link_sorted(nodes)
+        return tree
+
+    def __reduce__(self):
+        """
+        pickle as flat lists of keys and values in key order, loaded by :meth:`from_sorted` in linear time. the
+        comparison functions and `nodeclass` must be picklable
+        """
+        keys, vals = self._flatten('key', 'val')
+        eq, gt = self._key_funcs()
+        kwargs = dict(nodeclass=self._nodeclass, eq=eq, gt=gt, key=self._keyfunc, order_statistics=self._sized,
+                      multiset=self._multiset)
+        return _from_flat, (self.__class__, kwargs, keys or [], vals)
+
+    def _link_sorted(self, nodes):
+        """
+        link `nodes`, ordered by key, into a complete tree. only nodes on the deepest level are red, so every path
+        holds the same number of black nodes
+        """
+        if not nodes:
+            return None
+        height = len(nodes).bit_length() - 1
+        root = None
+        stack = [(0, len(nodes), None, False, 0)]
+        while stack:
+            low, high, parent, left, depth = stack.pop()
+            mid = (low + high) // 2
+            node = nodes[mid]
+            node.parent = parent
+            node.left = node.right = None
+            node.red = depth == height
+            if self._sized:
+                node.size = high - low
+            if parent is None:
+                root = node
+            elif left:
+                parent.left = node
+            else:
+                parent.right = node
+            if mid + 1 < high:
+                stack.append((mid + 1, high, node, False, depth + 1))
+            if low < mid:
+                stack.append((low, mid, node, True, depth + 1))
+        root.red = False
+        return root
 
     @property
     def root(self):
@@ -22,90 +108,130 @@ class RedBlackTreeImpl(BinarySearchTree):
 
     def insert(self, node=None, key=None, val=None):
         """
-        insert a shallow copy of `node` if it is provided, else insert a new node of given `key` adn `value`
+        insert a shallow copy of `node` if it is provided, else insert a new node of given `key` adn `value`. in
+        multiset mode, a key already present only has its count increased
         :param node:
         :param key:
         :param val:
         """
-        if node is None:
-            if key is None:
-                raise ValueError("one of node and key must be passed")
-            node = self._nodeclass()
-            node.key = key
-            if val is not None:
-                node.val = val
-        node.red = True
+        node = self._prepare_node(node, key, val)
         if self._root is None:
             self._root = node
             self._insert_fix(node)
             return
         self._insert(self._root, node)
 
+    def finger_insert(self, node=None, key=None, val=None):
+        """
+        as :meth:`insert`, descending from the finger instead of the root, see :meth:`finger_search`. the new node
+        becomes the finger
+        """
+        node = self._prepare_node(node, key, val)
+        if self._root is None:
+            self._root = node
+            self._insert_fix(node)
+        else:
+            node = self._insert(self._finger_start(self._node_key(node)), node)
+        self._finger = node
+
+    def _prepare_node(self, node, key, val):
+        if node is None:
+            if key is None:
+                raise ValueError("one of node and key must be passed")
+            node = self._nodeclass(key, val)
+        self._cache_key(node)
+        node.red = True
+        if self._sized:
+            node.size = 1
+        if self._multiset:
+            node.count = 1
+        return node
+
     def _insert(self, node, new):
-        if self._key_gt(node.key, new.key):
-            if node.left is None:
-                node.left = new
-                new.parent = node
-                self._insert_fix(new)
-            else:
-                self._insert(node.left, new)
+        """
+        :return: the node holding the key of `new`, `new` itself unless an equal key is found in multiset mode
+        """
+        if self._multiset:
+            new.parent, equal = self._attach_distinct(node, new)
+            if equal is not None:
+                equal.count += 1
+                return equal
         else:
-            if node.right is None:
-                node.right = new
-                new.parent = node
-                self._insert_fix(new)
-            else:
-                self._insert(node.right, new)
+            new.parent = self._attach_leaf(node, new)
+        if self._sized:
+            self._resize_path(new.parent, 1)
+        self._insert_fix(new)
+        return new
 
-    def _insert_fix(self, node):
+    def _insert_climbs(self, node):
+        """
+        number of levels :meth:`_insert_fix` will climb from `node` after recoloring a red uncle, read before it runs.
+        used by :class:`TreeStats`, so the fixup loop itself counts nothing
+        """
+        climbs = 0
         p = node.parent
-        if p is None:
-            node.red = False
-            return
-        if not p.red:
-            return
-        gp = p.parent
-        # left case
-        if p is gp.left:
-            # red uncle
-            if gp.right and gp.right.red:
-                gp.right.red = False
+        while p is not None and p.red:
+            gp = p.parent
+            uncle = gp.right if p is gp.left else gp.left
+            if uncle is None or not uncle.red:
+                break
+            climbs += 1
+            p = gp.parent
+        return climbs
+
+    def _insert_fix(self, node):
+        while True:
+            p = node.parent
+            if p is None:
+                node.red = False
+                return
+            if not p.red:
+                return
+            gp = p.parent
+            # left case
+            if p is gp.left:
+                # red uncle
+                if gp.right and gp.right.red:
+                    gp.right.red = False
+                    p.red = False
+                    gp.red = True
+                    node = gp
+                    continue
+                # left-right
+                if node is p.right:
+                    self._left_rotate(p)
+                    p = node
+                # left-left
                 p.red = False
                 gp.red = True
-                self._insert_fix(gp)
-                return
-            # left-right
-            if node is p.right:
-                self._left_rotate(p)
-                p = node
-            # left-left
-            p.red = False
-            gp.red = True
-            self._right_rotate(gp)
-        else:
-            # red uncle
-            if gp.left and gp.left.red:
-                gp.left.red = False
+                self._right_rotate(gp)
+            else:
+                # red uncle
+                if gp.left and gp.left.red:
+                    gp.left.red = False
+                    p.red = False
+                    gp.red = True
+                    node = gp
+                    continue
+                # right-left
+                if node is p.left:
+                    self._right_rotate(p)
+                    p = node
+                # right-right
                 p.red = False
                 gp.red = True
-                self._insert_fix(gp)
-                return
-            # right-left
-            if node is p.left:
-                self._right_rotate(p)
-                p = node
-            # right-right
-            p.red = False
-            gp.red = True
-            self._left_rotate(gp)
+                self._left_rotate(gp)
+            return
 
     def delete(self, key):
-        return self._delete(self.root, key)
+        node = self._delete(self.root, key)
+        if node is not None and node is self._finger:
+            self._finger = None
+        return node
 
     def _delete(self, node, key):
-        if node is None:
-            return None
-        if self._key_eq(node.key, key):
+        node = self._search(node, key)
+        if node is not None:
             p = node.parent
             l = p and p.left is node
             if node.left is None:
@@ -117,6 +243,8 @@ class RedBlackTreeImpl(BinarySearchTree):
                     p.right = node.right
                 if node.right:
                     node.right.parent = p
+                if self._sized:
+                    self._resize_path(p, -1)
                 # delete red is fine
                 if not node.red:
                     # black + red = black
@@ -134,6 +262,8 @@ class RedBlackTreeImpl(BinarySearchTree):
                 else:
                     p.right = node.left
                 node.left.parent = p
+                if self._sized:
+                    self._resize_path(p, -1)
                 # delete red is fine
                 if not node.red:
                     # black + red = black
@@ -164,6 +294,9 @@ class RedBlackTreeImpl(BinarySearchTree):
                     curr.left = node.left
                     curr.left.parent = curr
                 curr.parent = node.parent
+                if self._sized:
+                    curr.size = node.size
+                    self._resize_path(cp if cp is not node else curr, -1)
                 temp = curr.red
                 curr.red = node.red
                 # delete red is fine
@@ -182,88 +315,97 @@ class RedBlackTreeImpl(BinarySearchTree):
                         # black + black = double black
                         else:
                             self._delete_fixup(curr, True)
+        return node
 
-            return node
-        if self._key_gt(node.key, key):
-            return self._delete(node.left, key)
-        else:
-            return self._delete(node.right, key)
+    def _delete_climbs(self, p, left):
+        """
+        number of levels :meth:`_delete_fixup` will climb from the doubly black child of `p` after recoloring a black
+        sibling, read before it runs. used by :class:`TreeStats`
+        """
+        climbs = 0
+        while p is not None and not p.red:
+            sibling = p.right if left else p.left
+            if sibling.red or any(niece is not None and niece.red for niece in (sibling.left, sibling.right)):
+                break
+            climbs += 1
+            left = p.parent is not None and p.parent.left is p
+            p = p.parent
+        return climbs
 
     def _delete_fixup(self, p, left):
         # root case
-        if not p:
-            return
-        # left case
-        if left:
-            sibling = p.right
-            # red sibling: change to black
-            if sibling.red:
-                p.red = True
-                sibling.red = False
-                self._left_rotate(p)
+        while p:
+            # left case
+            if left:
                 sibling = p.right
-            leftniece = sibling.left
-            rightniece = sibling.right
-            lnr = leftniece is not None and leftniece.red
-            rnr = rightniece is not None and rightniece.red
-            # black parent and black niece: recolor
-            if not p.red and not lnr and not rnr:
-                sibling.red = True
-                l = p.parent and p.praent.left is p
-                self._delete_fixup(p.parent, l)
-                return
-            # red parent and black niece: recolor
-            if p.red and not lnr and not rnr:
+                # red sibling: change to black
+                if sibling.red:
+                    p.red = True
+                    sibling.red = False
+                    self._left_rotate(p)
+                    sibling = p.right
+                leftniece = sibling.left
+                rightniece = sibling.right
+                lnr = leftniece is not None and leftniece.red
+                rnr = rightniece is not None and rightniece.red
+                # black parent and black niece: recolor
+                if not p.red and not lnr and not rnr:
+                    sibling.red = True
+                    left = p.parent and p.parent.left is p
+                    p = p.parent
+                    continue
+                # red parent and black niece: recolor
+                if p.red and not lnr and not rnr:
+                    p.red = False
+                    sibling.red = True
+                    return
+                # black right niece: change to red
+                if not rnr:
+                    sibling.red = True
+                    leftniece.red = False
+                    self._right_rotate(sibling)
+                    rightniece = sibling
+                    sibling = leftniece
+                # red right niece: rotate
+                sibling.red = p.red
                 p.red = False
-                sibling.red = True
+                rightniece.red = False
+                self._left_rotate(p)
                 return
-            # black right niece: change to red
-            if not rnr:
-                sibling.red = True
-                leftniece.red = False
-                self._right_rotate(sibling)
-                rightniece = sibling
-                sibling = leftniece
-            # red right niece: rotate
-            sibling.red = p.red
-            p.red = False
-            rightniece.red = False
-            self._left_rotate(p)
-            return
-        # right case
-        else:
-            sibling = p.left
-            # red sibling: change to black
-            if sibling.red:
-                p.red = True
-                sibling.red = False
-                self._right_rotate(p)
+            # right case
+            else:
                 sibling = p.left
-            leftniece = sibling.left
-            rightniece = sibling.right
-            lnr = leftniece is not None and leftniece.red
-            rnr = rightniece is not None and rightniece.red
-            # black parent and black niece: recolor
-            if not p.red and not lnr and not rnr:
-                sibling.red = True
-                l = p.parent and p.praent.left is p
-                self._delete_fixup(p.parent, l)
-                return
-            # red parent and black niece: recolor
-            if p.red and not lnr and not rnr:
+                # red sibling: change to black
+                if sibling.red:
+                    p.red = True
+                    sibling.red = False
+                    self._right_rotate(p)
+                    sibling = p.left
+                leftniece = sibling.left
+                rightniece = sibling.right
+                lnr = leftniece is not None and leftniece.red
+                rnr = rightniece is not None and rightniece.red
+                # black parent and black niece: recolor
+                if not p.red and not lnr and not rnr:
+                    sibling.red = True
+                    left = p.parent and p.parent.left is p
+                    p = p.parent
+                    continue
+                # red parent and black niece: recolor
+                if p.red and not lnr and not rnr:
+                    p.red = False
+                    sibling.red = True
+                    return
+                # black left niece: change to red
+                if not lnr:
+                    sibling.red = True
+                    rightniece.red = False
+                    self._left_rotate(sibling)
+                    leftniece = sibling
+                    sibling = rightniece
+                # red left niece: rotate
+                sibling.red = p.red
                 p.red = False
-                sibling.red = True
+                leftniece.red = False
+                self._right_rotate(p)
                 return
-            # black left niece: change to red
-            if not lnr:
-                sibling.red = True
-                rightniece.red = False
-                self._left_rotate(sibling)
-                leftniece = sibling
-                sibling = rightniece
-            # red left niece: rotate
-            sibling.red = p.red
-            p.red = False
-            leftniece.red = False
-            self._right_rotate(p)
-            return
@@ -0,0 +1,374 @@
+import operator
+
+from BinarySearchTree import BinarySearchTree
+from treenode.SplayTreeNode import SizedSplayTreeNode, SplayTreeNode
+
+
+class SplayTreeImpl(BinarySearchTree):
+    """
+    Self-adjusting tree: every node inserted or searched for is moved to the root, so keys looked up often stay
+    near the top. Operations take amortized O(log n), and a key accessed with frequency p costs amortized
+    O(log 1/p). Since `search` restructures the tree, it is a write: the tree can not be shared under a read lock.
+
+    Splaying is top-down: a single descent compares each node on the path once and hangs the nodes it passes on a
+    left and a right tree, which are joined under the node reached at the end. Only relinked nodes have their parent
+    links fixed. A search that finds its key within two levels of the root returns the node without splaying, which
+    leaves the shape unchanged for the hottest keys; insert and delete always splay. Zig-zig steps rotate through
+    `_left_rotate` and `_right_rotate`, which :class:`TreeStats` counts, except in the loop specialized for native
+    keys, which never runs with stats on. Linking a node to the left or right tree is not counted as a rotation.
+    """
+
+    def __init__(self, nodeclass=SplayTreeNode, eq=operator.eq, gt=operator.gt, key=None, order_statistics=False):
+        """
+        :param nodeclass: the class of tree node, should be derived from :class:`SplayTreeNode`
+        :param eq: function used to evaluate equality of keys
+        :param gt: function used to compare keys
+        :param key: optional function mapping a key to the value compared by `eq` and `gt`, called once per node and
+        cached in `sort_key`
+        :param order_statistics: keep subtree sizes in `size` of each node for `rank`, `select` and O(1) `len`. the
+        default `nodeclass` is then replaced by :class:`SizedSplayTreeNode`, a custom one must provide `size`
+        """
+        if order_statistics and nodeclass is SplayTreeNode:
+            nodeclass = SizedSplayTreeNode
+        self._root = None
+        self._nodeclass = nodeclass
+        self._sized = order_statistics
+        self._init_keys(eq, gt, key)
+
+    @property
+    def root(self):
+        return self._root
+
+    def insert(self, node=None, key=None, val=None):
+        """
+        insert `node` if it is provided, else a new node of given `key` and `val`, as the new root
+        """
+        if node is None:
+            if key is None:
+                raise ValueError("one of node and key must be passed")
+            node = self._nodeclass(key, val)
+        self._cache_key(node)
+        node.left = node.right = node.parent = None
+        if self._root is None:
+            if self._sized:
+                node.size = 1
+            self._root = node
+            return
+        k = self._node_key(node)
+        t = self._splay(self._root, k, False)[0]
+        # `t` is the neighbour of the new key, the new node takes it and the subtree beyond it as children
+        if self._key_gt(self._node_key(t), k):
+            node.left, node.right = t.left, t
+            t.left = None
+        else:
+            node.left, node.right = t, t.right
+            t.right = None
+        for child in (node.left, node.right):
+            if child is not None:
+                child.parent = node
+        if self._sized:
+            self._update_size(t)
+            self._update_size(node)
+        self._root = node
+
+    def search(self, key):
+        """
+        splay the node found, or the last node visited if there is none, to the root. a node found within two levels
+        of the root is returned as is
+        """
+        if self._native and not self._sized:
+            if self._root is None:
+                return None
+            self._root, node = self._splay_native(self._root, key, True)
+            return node
+        return self._search(self._root, key)
+
+    def _search(self, node, key):
+        if node is None:
+            return None
+        self._root, node = self._splay(node, self._cmp_key(key), True)
+        return node
+
+    def delete(self, key):
+        if self._root is None:
+            return None
+        self._root, node = self._splay(self._root, self._cmp_key(key), False)
+        if node is None:
+            return node
+        if node is self._finger:
+            self._finger = None
+        left, right = node.left, node.right
+        node.left = node.right = None
+        if left is None:
+            self._root = right
+            if right is not None:
+                right.parent = None
+            return node
+        # the greatest node of the left subtree has no right child once splayed
+        left.parent = None
+        top = self._root = self._splay_max(left)
+        top.right = right
+        if right is not None:
+            right.parent = top
+        if self._sized:
+            self._update_size(top)
+        return node
+
+    def _splay(self, t, key, shallow):
+        """
+        top-down splay of the subtree at `t` for the compared key `key`
+        :param shallow: return a node found within two levels of `t` without splaying
+        :return: tuple of the new root of the subtree, which is the node of key `key` or the last node visited if
+        there is none, and the node of key `key`, or None
+        """
+        if self._native and not self._sized:
+            return self._splay_native(t, key, shallow)
+        node_key, eq, gt = self._node_key, self._key_eq, self._key_gt
+        k = node_key(t)
+        if eq(k, key):
+            return t, t
+        # the left tree collects nodes less than `key` along its right spine, the right tree greater ones along
+        # its left spine
+        lroot = ltail = rroot = rtail = None
+        spines = [] if self._sized else None
+        found = None
+        while True:
+            # `t` is known not to hold `key`, `k` is its compared key
+            if gt(k, key):
+                y = t.left
+                if y is None:
+                    break
+                ky = node_key(y)
+                if eq(ky, key):
+                    found = y
+                    z = None
+                else:
+                    z = y.left if gt(ky, key) else y.right
+                    if z is not None:
+                        k = node_key(z)
+                        if eq(k, key):
+                            found = z
+                if found is not None and shallow and ltail is None and rtail is None:
+                    return t, found
+                if z is not None and z is y.left:
+                    # zig-zig
+                    self._right_rotate(t)
+                    t = y
+                # link `t` to the right tree
+                if rtail is None:
+                    rroot = t
+                else:
+                    rtail.left = t
+                    t.parent = rtail
+                rtail = t
+                if spines is not None:
+                    spines.append(t)
+                if z is None:
+                    t = y
+                    break
+                if t is not y:
+                    # zig-zag: link `y` to the left tree
+                    if ltail is None:
+                        lroot = y
+                    else:
+                        ltail.right = y
+                        y.parent = ltail
+                    ltail = y
+                    if spines is not None:
+                        spines.append(y)
+            else:
+                y = t.right
+                if y is None:
+                    break
+                ky = node_key(y)
+                if eq(ky, key):
+                    found = y
+                    z = None
+                else:
+                    z = y.left if gt(ky, key) else y.right
+                    if z is not None:
+                        k = node_key(z)
+                        if eq(k, key):
+                            found = z
+                if found is not None and shallow and ltail is None and rtail is None:
+                    return t, found
+                if z is not None and z is y.right:
+                    # zag-zag
+                    self._left_rotate(t)
+                    t = y
+                # link `t` to the left tree
+                if ltail is None:
+                    lroot = t
+                else:
+                    ltail.right = t
+                    t.parent = ltail
+                ltail = t
+                if spines is not None:
+                    spines.append(t)
+                if z is None:
+                    t = y
+                    break
+                if t is not y:
+                    # zag-zig: link `y` to the right tree
+                    if rtail is None:
+                        rroot = y
+                    else:
+                        rtail.left = y
+                        y.parent = rtail
+                    rtail = y
+                    if spines is not None:
+                        spines.append(y)
+            t = z
+            if found is not None:
+                break
+        return self._assemble(t, lroot, ltail, rroot, rtail, spines), found
+
+    def _splay_native(self, t, key, shallow):
+        """
+        :meth:`_splay` specialized for native comparisons without order statistics, which lookups spend their time in
+        """
+        k = t.key
+        if k == key:
+            return t, t
+        lroot = ltail = rroot = rtail = None
+        found = None
+        while True:
+            if k > key:
+                y = t.left
+                if y is None:
+                    break
+                ky = y.key
+                if ky == key:
+                    found = y
+                    z = None
+                else:
+                    z = y.left if ky > key else y.right
+                    if z is not None:
+                        k = z.key
+                        if k == key:
+                            found = z
+                if found is not None and shallow and ltail is None and rtail is None:
+                    return t, found
+                if z is not None and z is y.left:
+                    b = t.left = y.right
+                    if b is not None:
+                        b.parent = t
+                    y.right = t
+                    t.parent = y
+                    t = y
+                if rtail is None:
+                    rroot = t
+                else:
+                    rtail.left = t
+                    t.parent = rtail
+                rtail = t
+                if z is None:
+                    t = y
+                    break
+                if t is not y:
+                    if ltail is None:
+                        lroot = y
+                    else:
+                        ltail.right = y
+                        y.parent = ltail
+                    ltail = y
+            else:
+                y = t.right
+                if y is None:
+                    break
+                ky = y.key
+                if ky == key:
+                    found = y
+                    z = None
+                else:
+                    z = y.left if ky > key else y.right
+                    if z is not None:
+                        k = z.key
+                        if k == key:
+                            found = z
+                if found is not None and shallow and ltail is None and rtail is None:
+                    return t, found
+                if z is not None and z is y.right:
+                    b = t.right = y.left
+                    if b is not None:
+                        b.parent = t
+                    y.left = t
+                    t.parent = y
+                    t = y
+                if ltail is None:
+                    lroot = t
+                else:
+                    ltail.right = t
+                    t.parent = ltail
+                ltail = t
+                if z is None:
+                    t = y
+                    break
+                if t is not y:
+                    if rtail is None:
+                        rroot = y
+                    else:
+                        rtail.left = y
+                        y.parent = rtail
+                    rtail = y
+            t = z
+            if found is not None:
+                break
+        return self._assemble(t, lroot, ltail, rroot, rtail, None), found
+
+    def _splay_max(self, t):
+        """
+        top-down splay of the greatest node of the subtree at `t`
+        :return: that node, the new root of the subtree
+        """
+        sized = self._sized
+        lroot = ltail = None
+        spines = [] if sized else None
+        while t.right is not None:
+            y = t.right
+            if y.right is not None:
+                # zag-zag: rotate left
+                b = t.right = y.left
+                if b is not None:
+                    b.parent = t
+                y.left = t
+                t.parent = y
+                if sized:
+                    self._update_size(t)
+                t = y
+            if ltail is None:
+                lroot = t
+            else:
+                ltail.right = t
+                t.parent = ltail
+            ltail = t
+            t = t.right
+            if sized:
+                spines.append(ltail)
+        return self._assemble(t, lroot, ltail, None, None, spines)
+
+    def _assemble(self, t, lroot, ltail, rroot, rtail, spines):
+        """
+        join the left and right trees built by a top-down splay under `t`
+        :param spines: with order statistics, the nodes linked to either tree in the order they were linked
+        """
+        if ltail is not None:
+            a = ltail.right = t.left
+            if a is not None:
+                a.parent = ltail
+            t.left = lroot
+            lroot.parent = t
+        if rtail is not None:
+            b = rtail.left = t.right
+            if b is not None:
+                b.parent = rtail
+            t.right = rroot
+            rroot.parent = t
+        t.parent = None
+        if spines:
+            # a node linked later hangs below one linked earlier on the same side
+            for node in reversed(spines):
+                self._update_size(node)
+        if self._sized:
+            self._update_size(t)
+        return t
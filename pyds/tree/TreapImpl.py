@@ -1,9 +1,12 @@
 import operator
+import random
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 
+from OrderedBinaryTree import _from_flat
 from Treap import Treap
-from treenode.TreapNode import TreapNode
+from treenode.TreapNode import CountedTreapNode, SizedCountedTreapNode, SizedTreapNode, TreapNode
 
 
 class TreapImpl(Treap):
@@ -11,13 +14,118 @@ class TreapImpl(Treap):
     _bot = object()
     _leaf = object()
     SplitResult = namedtuple('SplitResult', ['left', 'right', 'pivot'])
+    # set on the result of a non-destructive set operation while it runs: nodes of the operands are read, not linked
+    _copying = False
 
-    def __init__(self, nodeclass=TreapNode, key_eq=operator.eq, key_gt=operator.gt, priority_lt=operator.lt):
+    def __init__(self, nodeclass=TreapNode, key_eq=operator.eq, key_gt=operator.gt, priority_lt=operator.lt,
+                 key=None, order_statistics=False, random_priorities=False, seed=None, multiset=False):
+        """
+        :param nodeclass: the class of tree node, should be derived from :class:`TreapNode`, or a
+        :class:`TreapNodePool`
+        :param key_eq: function used to evaluate equality of keys
+        :param key_gt: function used to compare keys
+        :param priority_lt: function used to compare priorities, nodes of lesser priority are closer to the root
+        :param key: optional function mapping a key to the value compared by `key_eq` and `key_gt`, called once per
+        node and cached in `sort_key`
+        :param order_statistics: keep subtree sizes in `size` of each node for `rank`, `select` and O(1) `len`. the
+        default `nodeclass` is then replaced by :class:`SizedTreapNode`, a custom one must provide `size`
+        :param random_priorities: draw a uniform priority in [0, 1) for every node inserted without one, which keeps
+        the expected depth O(log n) whatever the order of the keys. explicit priorities are still accepted and must
+        then be comparable with floats
+        :param seed: seed of the generator drawing random priorities, for reproducible shapes
+        :param multiset: store each distinct key in one node, with the number of times it was inserted in `count`,
+        see `count` and `remove_one`. a repeated insert keeps the priority of the node. `delete` removes all copies,
+        and sizes, `rank` and `select` count distinct keys. on equal keys, set operations add the counts in a union,
+        keep the lesser in an intersection and subtract them in a difference. the default `nodeclass` is then
+        replaced by a counted one, a custom one must provide `count` and a pool must be created with `counted=True`
+        """
+        if nodeclass is TreapNode:
+            if multiset:
+                nodeclass = SizedCountedTreapNode if order_statistics else CountedTreapNode
+            elif order_statistics:
+                nodeclass = SizedTreapNode
+        self._multiset = multiset
         self._root = None
         self._nodeclass = nodeclass
-        self._key_eq = key_eq
-        self._key_gt = key_gt
+        self._sized = order_statistics
+        self._init_keys(key_eq, key_gt, key)
+        self._natural_priority_lt = priority_lt
         self._priority_lt = self._make_priority_lt(priority_lt)
+        self._random_priorities = random_priorities
+        self._seed = seed
+        self._random = random.Random(seed).random if random_priorities else None
+
+    @classmethod
+    def from_sorted(cls, keys, priorities=None, vals=None, **kwargs):
+        """
+        build a treap from keys in ascending order in linear time, as a cartesian tree over the priorities. in
+        multiset mode, runs of equal keys are stored as one node, with the priority and value of the first
+        :param keys: iterable of keys in ascending order, may be a generator
+        :param priorities: iterable of priorities, paired with `keys`, or None to draw them with `random_priorities`
+        :param vals: optional iterable of values, paired with `keys`
+        :param kwargs: passed to the constructor
+        :return: the new treap
+        """
+        tree = cls(**kwargs)
+        if priorities is None:
+            if tree._random is None:
+                raise ValueError("priorities must be passed without random_priorities")
+            keys = list(keys)
+            priorities = [tree._random() for _ in keys]
+        if vals is None:
+            triples = ((key, priority, None) for key, priority in zip(keys, priorities))
+        else:
+            triples = zip(keys, priorities, vals)
+        nodes = []
+        for key, priority, val in triples:
+            node = tree._nodeclass(key, priority, val)
+            tree._cache_key(node)
+            if nodes and tree._key_gt(tree._node_key(nodes[-1]), tree._node_key(node)):
+                raise ValueError("keys must be in ascending order")
+            if nodes and tree._multiset and tree._key_eq(tree._node_key(nodes[-1]), tree._node_key(node)):
+                nodes[-1].count += 1
+                continue
+            nodes.append(node)
+        tree._root = tree._link_cartesian(nodes)
+        return tree
+
+    def __reduce__(self):
+        """
+        pickle as flat lists of keys, priorities and values in key order, loaded by :meth:`from_sorted` in linear
+        time into the same shape. the comparison functions and `nodeclass` must be picklable
+        """
+        keys, priorities, vals = self._flatten('key', 'priority', 'val')
+        key_eq, key_gt = self._key_funcs()
+        kwargs = dict(nodeclass=self._nodeclass, key_eq=key_eq, key_gt=key_gt,
+                      priority_lt=self._natural_priority_lt, key=self._keyfunc, order_statistics=self._sized,
+                      random_priorities=self._random_priorities, seed=self._seed, multiset=self._multiset)
+        return _from_flat, (self.__class__, kwargs, keys or [], priorities or [], vals)
+
+    def _link_cartesian(self, nodes):
+        """
+        link `nodes`, ordered by key, into a treap. the stack holds the right spine of the treap built so far
+        """
+        stack = []
+        for node in nodes:
+            last = None
+            while stack and self._priority_lt(node.priority, stack[-1].priority):
+                last = stack.pop()
+                if self._sized:
+                    self._update_size(last)
+            node.left = last
+            node.right = None
+            if last is not None:
+                last.parent = node
+            if stack:
+                stack[-1].right = node
+                node.parent = stack[-1]
+            else:
+                node.parent = None
+            stack.append(node)
+        if self._sized:
+            for node in reversed(stack):
+                self._update_size(node)
+        return stack[0] if stack else None
 
     @classmethod
     def _make_priority_lt(cls, natural_priority_lt):
@@ -39,34 +147,66 @@ class TreapImpl(Treap):
         return self._root
 
     def insert(self, node=None, key=None, priority=None, val=None):
-        if node is None:
-            if key is None or priority is None:
-                raise ValueError("one of node and (key, priority) must be passed")
-            node = self._nodeclass()
-            node.key = key
-            node.priority = priority
-            if val is not None:
-                node.val = val
+        """
+        insert `node` if it is provided, else a new node of given `key`, `priority` and `val`. `priority` may be
+        omitted with `random_priorities`. in multiset mode, a key already present only has its count increased
+        """
+        node = self._prepare_node(node, key, priority, val)
         if self._root is None:
             self._root = node
             return
         self._insert(self._root, node)
 
+    def finger_insert(self, node=None, key=None, priority=None, val=None):
+        """
+        as :meth:`insert`, descending from the finger instead of the root, see :meth:`finger_search`. the new node
+        becomes the finger
+        """
+        node = self._prepare_node(node, key, priority, val)
+        if self._root is None:
+            self._root = node
+        else:
+            node = self._insert(self._finger_start(self._node_key(node)), node)
+        self._finger = node
+
+    def _prepare_node(self, node, key, priority, val):
+        if node is None:
+            node = self._new_node(key, priority, val)
+        self._cache_key(node)
+        if self._sized:
+            node.size = 1
+        if self._multiset:
+            node.count = 1
+        return node
+
+    def _new_node(self, key, priority, val):
+        if priority is None and self._random is not None:
+            priority = self._random()
+        if key is None or priority is None:
+            raise ValueError("one of node and (key, priority) must be passed")
+        return self._nodeclass(key, priority, val)
+
     def _insert(self, node, new):
-        if self._key_gt(node.key, new.key):
-            if node.left is None:
-                node.left = new
-                new.parent = node
-                self._rolling_up(new)
-            else:
-                self._insert(node.left, new)
+        """
+        :return: the node holding the key of `new`, `new` itself unless an equal key is found in multiset mode
+        """
+        if self._multiset:
+            new.parent, equal = self._attach_distinct(node, new)
+            if equal is not None:
+                equal.count += 1
+                return equal
         else:
-            if node.right is None:
-                node.right = new
-                new.parent = node
-                self._rolling_up(new)
-            else:
-                self._insert(node.right, new)
+            new.parent = self._attach_leaf(node, new)
+        return self._insert_leaf(new)
+
+    def _insert_leaf(self, new):
+        """
+        restore the heap order after `new` was attached as a leaf
+        """
+        if self._sized:
+            self._resize_path(new.parent, 1)
+        self._rolling_up(new)
+        return new
 
     def _rolling_up(self, node):
         p = node.parent
@@ -94,12 +234,22 @@ class TreapImpl(Treap):
             return node
         node.priority = self._bot
         self._rolling_down(node)
+        self._detach_leaf(node)
+        if node is self._finger:
+            self._finger = None
+        return node
+
+    def _detach_leaf(self, node):
         p = node.parent
-        if p.left is node:
+        if p is None:
+            self._root = None
+        elif p.left is node:
             p.left = None
         else:
             p.right = None
-        return node
+        node.parent = None
+        if self._sized:
+            self._resize_path(p, -1)
 
     def update_priority(self, key, priority):
         node = self.search(key)
@@ -114,11 +264,18 @@ class TreapImpl(Treap):
         return node
 
     def split(self, key, keep_pivot=True):
+        self._finger = None
         node = None
         if not keep_pivot:
             node = self.search(key)
         if node is None:
-            self.insert(key=key, priority=self._top)
+            # attached as a new node even in multiset mode, a node of equal key then ends up on the left
+            pivot = self._prepare_node(None, key, self._top, None)
+            if self._root is None:
+                self._root = pivot
+            else:
+                pivot.parent = self._attach_leaf(self._root, pivot)
+                self._insert_leaf(pivot)
         else:
             node.priority = self._top
             self._rolling_up(node)
@@ -135,28 +292,329 @@ class TreapImpl(Treap):
     @classmethod
     def join(cls, left, right):
         joined = copy(left)
+        if left.root is None or right.root is None:
+            joined._root = right.root if left.root is None else left.root
+            return joined
         node = joined._nodeclass(left.root.key, cls._bot)
         joined._root = node
-        node.left = left.root
-        node.left.parent = node
-        node.right = right.root
-        node.right.parent = node
+        joined._set_children(node, left.root, right.root)
         joined._rolling_down(node)
-        p = node.parent
-        if p.left is node:
-            p.left = None
-        else:
-            p.right = None
+        joined._detach_leaf(node)
         return joined
 
     @classmethod
-    def union(cls, t1, t2):
-        return NotImplemented
+    def union(cls, t1, t2, destructive=True, executor=None, parallel_depth=2, keep_duplicates=False,
+              parallel_min_size=1000):
+        """
+        union of two treaps in O(m log(n/m + 1)) expected time, where m <= n are their sizes. on equal keys the node
+        with the higher priority is kept
+        :param destructive: reuse the nodes of `t1` and `t2` and leave both empty, else leave both unchanged and copy
+        only the nodes on the split paths and those of the result, as the operation reaches them
+        :param executor: optional :class:`concurrent.futures.Executor` to process subtrees in parallel. with a process
+        pool, keys, values, nodes and comparison functions must be picklable
+        :param parallel_depth: number of recursion levels whose subtrees may be handed to `executor`
+        :param parallel_min_size: subtrees of fewer nodes, counting both operands, are processed in the calling
+        thread, so small and lopsided inputs do not pay for a task
+        :param keep_duplicates: keep the nodes of both treaps on equal keys, as repeated inserts would. in multiset
+        mode the counts of equal keys are always added, as repeated inserts would
+        :return: a new treap configured as `t1`
+        """
+        op = '_union_all_nodes' if keep_duplicates and not t1._multiset else '_union_nodes'
+        return cls._set_operation(op, t1, t2, destructive, executor, parallel_depth, parallel_min_size)
 
     @classmethod
-    def intersect(cls, t1, t2):
-        return NotImplemented
+    def intersect(cls, t1, t2, destructive=True, executor=None, parallel_depth=2, parallel_min_size=1000):
+        """
+        intersection of two treaps, keeping the nodes of `t1`. see :meth:`union` for the parameters
+        """
+        return cls._set_operation('_intersect_nodes', t1, t2, destructive, executor, parallel_depth,
+                                  parallel_min_size)
 
     @classmethod
-    def difference(cls, left, right):
-        return NotImplemented
+    def difference(cls, left, right, destructive=True, executor=None, parallel_depth=2, parallel_min_size=1000):
+        """
+        nodes of `left` whose key is not in `right`. see :meth:`union` for the parameters
+        """
+        return cls._set_operation('_difference_nodes', left, right, destructive, executor, parallel_depth,
+                                  parallel_min_size)
+
+    @classmethod
+    def _set_operation(cls, op, t1, t2, destructive, executor, parallel_depth, parallel_min_size):
+        result = copy(t1)
+        a, b = t1._root, t2._root
+        if destructive:
+            t1._root = t2._root = None
+            t1._finger = t2._finger = None
+        else:
+            result._copying = True
+        fork = None if executor is None or parallel_depth <= 0 else (executor, parallel_depth, parallel_min_size)
+        try:
+            result._root = getattr(result, op)(a, b, fork)
+        finally:
+            result.__dict__.pop('_copying', None)
+        if result._root is not None:
+            result._root.parent = None
+        return result
+
+    def _ctor_args(self):
+        key_eq, key_gt = self._key_funcs()
+        return (self._nodeclass, key_eq, key_gt, self._natural_priority_lt, self._keyfunc, self._sized,
+                self._random_priorities, self._seed, self._multiset)
+
+    def _copy_node(self, node):
+        new = self._nodeclass(node.key, node.priority, node.val)
+        if self._keyfunc is not None:
+            new.sort_key = node.sort_key
+        if self._sized:
+            new.size = node.size
+        if self._multiset:
+            new.count = node.count
+        return new
+
+    def _writable(self, node):
+        """
+        `node` itself, or while copying a copy of it with the same children, to be changed in place
+        """
+        if not self._copying:
+            return node
+        new = self._copy_node(node)
+        new.left = node.left
+        new.right = node.right
+        return new
+
+    def _adopt(self, node):
+        """
+        subtree at `node` as a part of the result, copied whole while copying
+        """
+        return self._copy_nodes(node) if self._copying else node
+
+    def _copy_nodes(self, node):
+        if node is None:
+            return None
+        root = self._copy_node(node)
+        stack = [(node, root)]
+        while stack:
+            src, dst = stack.pop()
+            if src.left is not None:
+                dst.left = self._copy_node(src.left)
+                dst.left.parent = dst
+                stack.append((src.left, dst.left))
+            if src.right is not None:
+                dst.right = self._copy_node(src.right)
+                dst.right.parent = dst
+                stack.append((src.right, dst.right))
+        return root
+
+    def _set_children(self, node, left, right):
+        node.left = left
+        if left is not None:
+            left.parent = node
+        node.right = right
+        if right is not None:
+            right.parent = node
+        if self._sized:
+            self._update_size(node)
+
+    def _split_node(self, node, key):
+        """
+        split the subtree at `node` into subtrees of keys less than and greater than `key`, and the node equal to
+        `key` if there is one
+        :param key: key as compared, i.e. already mapped by the `key` function of the treap
+        :return: tuple of (less, equal, greater). while copying, the nodes on the path are copies and the subtrees
+        off the path are shared with the input, for reading only
+        """
+        node_key, key_eq, key_gt = self._node_key, self._key_eq, self._key_gt
+        copying = self._copying
+        lroot = rroot = ltail = rtail = None
+        eq = lrest = rrest = None
+        while node is not None:
+            if copying:
+                node = self._writable(node)
+            k = node_key(node)
+            if key_eq(k, key):
+                eq, lrest, rrest = node, node.left, node.right
+                node.left = node.right = node.parent = None
+                if self._sized:
+                    node.size = 1
+                break
+            if key_gt(k, key):
+                if rtail is None:
+                    rroot = node
+                else:
+                    rtail.left = node
+                node.parent = rtail
+                rtail = node
+                node = node.left
+            else:
+                if ltail is None:
+                    lroot = node
+                else:
+                    ltail.right = node
+                node.parent = ltail
+                ltail = node
+                node = node.right
+        if ltail is None:
+            lroot = lrest
+        else:
+            ltail.right = lrest
+        if lrest is not None and not copying:
+            lrest.parent = ltail
+        if rtail is None:
+            rroot = rrest
+        else:
+            rtail.left = rrest
+        if rrest is not None and not copying:
+            rrest.parent = rtail
+        if self._sized:
+            for node in (ltail, rtail):
+                while node is not None:
+                    self._update_size(node)
+                    node = node.parent
+        return lroot, eq, rroot
+
+    def _join_nodes(self, a, b):
+        """
+        join subtrees `a` and `b`, all keys of `a` must be less than those of `b`
+        """
+        root = parent = None
+        left = False
+        while True:
+            if a is None or b is None:
+                node = b if a is None else a
+            elif self._priority_lt(b.priority, a.priority):
+                node = b
+            else:
+                node = a
+            if parent is None:
+                root = node
+            elif left:
+                parent.left = node
+            else:
+                parent.right = node
+            if node is not None:
+                node.parent = parent
+            if a is None or b is None:
+                if self._sized:
+                    while parent is not None:
+                        self._update_size(parent)
+                        parent = parent.parent
+                return root
+            if node is a:
+                a = a.right
+                left = False
+            else:
+                b = b.left
+                left = True
+            parent = node
+
+    def _count_nodes(self, roots, limit):
+        """
+        number of nodes in the subtrees at `roots`, exact with order statistics, else counted up to `limit`
+        """
+        if self._sized:
+            return sum(root.size for root in roots if root is not None)
+        count = 0
+        stack = [root for root in roots if root is not None]
+        while stack and count < limit:
+            node = stack.pop()
+            count += 1
+            if node.left is not None:
+                stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+        return count
+
+    def _both(self, op, a1, b1, a2, b2, fork):
+        """
+        `op` of (a1, b1) and of (a2, b2). the first pair goes to the executor of `fork` if it holds at least
+        `parallel_min_size` nodes, else the second pair may still fork further down
+        """
+        if fork is None:
+            return getattr(self, op)(a1, b1, None), getattr(self, op)(a2, b2, None)
+        executor, depth, min_size = fork
+        if self._count_nodes((a1, b1), min_size) < min_size:
+            return getattr(self, op)(a1, b1, None), getattr(self, op)(a2, b2, fork)
+        # threads can read the operands in place. nodes sent to a process would drag the operands along their
+        # parent links, and node pools allocate without locking, so those get detached copies
+        copying = self._copying and isinstance(executor, ThreadPoolExecutor) and isinstance(self._nodeclass, type)
+        if self._copying and not copying:
+            a1, b1 = self._copy_nodes(a1), self._copy_nodes(b1)
+        for node in (a1, b1):
+            if node is not None and not copying:
+                node.parent = None
+        future = executor.submit(_set_operation_task, type(self), self._ctor_args(), op, a1, b1, copying)
+        right = getattr(self, op)(a2, b2, (executor, depth - 1, min_size) if depth > 1 else None)
+        return future.result(), right
+
+    def _union_nodes(self, a, b, fork=None):
+        if a is None:
+            return self._adopt(b)
+        if b is None:
+            return self._adopt(a)
+        if self._priority_lt(b.priority, a.priority):
+            a, b = b, a
+        l, eq, r = self._split_node(b, self._node_key(a))
+        left, right = self._both('_union_nodes', a.left, l, a.right, r, fork)
+        a = self._writable(a)
+        if eq is not None and self._multiset:
+            a.count += eq.count
+        self._set_children(a, left, right)
+        return a
+
+    def _union_all_nodes(self, a, b, fork=None):
+        if a is None:
+            return self._adopt(b)
+        if b is None:
+            return self._adopt(a)
+        if self._priority_lt(b.priority, a.priority):
+            a, b = b, a
+        l, eq, r = self._split_node(b, self._node_key(a))
+        left, right = self._both('_union_all_nodes', a.left, l, a.right, r, fork)
+        a = self._writable(a)
+        if eq is not None:
+            # keys of `left` are at most that of `eq`, which may rank below them
+            left = self._join_nodes(left, eq)
+        self._set_children(a, left, right)
+        return a
+
+    def _intersect_nodes(self, a, b, fork=None):
+        if a is None or b is None:
+            return None
+        if self._priority_lt(b.priority, a.priority):
+            l, eq, r = self._split_node(a, self._node_key(b))
+            left, right = self._both('_intersect_nodes', l, b.left, r, b.right, fork)
+            if eq is not None:
+                if self._multiset:
+                    eq.count = min(eq.count, b.count)
+                # the node of `a` may rank below nodes of `b`, so it is joined in rather than placed at the top
+                left = self._join_nodes(left, eq)
+            return self._join_nodes(left, right)
+        l, eq, r = self._split_node(b, self._node_key(a))
+        left, right = self._both('_intersect_nodes', a.left, l, a.right, r, fork)
+        if eq is None:
+            return self._join_nodes(left, right)
+        a = self._writable(a)
+        if self._multiset:
+            a.count = min(a.count, eq.count)
+        self._set_children(a, left, right)
+        return a
+
+    def _difference_nodes(self, a, b, fork=None):
+        if a is None or b is None:
+            return self._adopt(a)
+        l, eq, r = self._split_node(b, self._node_key(a))
+        left, right = self._both('_difference_nodes', a.left, l, a.right, r, fork)
+        if eq is not None and not (self._multiset and a.count > eq.count):
+            return self._join_nodes(left, right)
+        a = self._writable(a)
+        if eq is not None:
+            a.count -= eq.count
+        self._set_children(a, left, right)
+        return a
+
+
+def _set_operation_task(cls, args, op, a, b, copying):
+    tree = cls(*args)
+    if copying:
+        tree._copying = True
+    return getattr(tree, op)(a, b)
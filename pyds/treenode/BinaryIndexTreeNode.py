@@ -1,6 +1,16 @@
 class BinaryIndexTreeNode(object):
+    __slots__ = ('key', 'val', 'left', 'right', 'sort_key')
+
     def __init__(self, key, val=None):
         self.key = key
         self.val = val
         self.left = None
         self.right = None
+
+
+class CountedBinaryIndexTreeNode(BinaryIndexTreeNode):
+    __slots__ = ('count',)
+
+    def __init__(self, key, val=None):
+        super(CountedBinaryIndexTreeNode, self).__init__(key, val)
+        self.count = 1
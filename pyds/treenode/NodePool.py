@@ -0,0 +1,229 @@
+from array import array
+from weakref import ref
+
+_none = -1
+
+
+class PooledNode(object):
+    """
+    Handle to a node stored in a :class:`NodePool`. Handles only live while something references them, the node
+    itself is kept in the pool's arrays. A pool hands out at most one live handle per slot, so `is` comparisons
+    between nodes work as they do for ordinary node objects.
+    """
+    __slots__ = ('_pool', '_idx', '__weakref__')
+
+    def __init__(self, pool, idx):
+        self._pool = pool
+        self._idx = idx
+
+    @property
+    def key(self):
+        return self._pool._key[self._idx]
+
+    @key.setter
+    def key(self, key):
+        self._pool._key[self._idx] = key
+
+    @property
+    def val(self):
+        return self._pool._val[self._idx]
+
+    @val.setter
+    def val(self, val):
+        self._pool._val[self._idx] = val
+
+    @property
+    def sort_key(self):
+        return self._pool._sort_key[self._idx]
+
+    @sort_key.setter
+    def sort_key(self, sort_key):
+        self._pool._sort_key[self._idx] = sort_key
+
+    @property
+    def size(self):
+        return self._pool._size[self._idx]
+
+    @size.setter
+    def size(self, size):
+        self._pool._size[self._idx] = size
+
+    @property
+    def count(self):
+        return self._pool._count[self._idx]
+
+    @count.setter
+    def count(self, count):
+        self._pool._count[self._idx] = count
+
+    @property
+    def left(self):
+        return self._pool._handle(self._pool._left[self._idx])
+
+    @left.setter
+    def left(self, node):
+        self._pool._left[self._idx] = _none if node is None else node._idx
+
+    @property
+    def right(self):
+        return self._pool._handle(self._pool._right[self._idx])
+
+    @right.setter
+    def right(self, node):
+        self._pool._right[self._idx] = _none if node is None else node._idx
+
+    @property
+    def parent(self):
+        return self._pool._handle(self._pool._parent[self._idx])
+
+    @parent.setter
+    def parent(self, node):
+        self._pool._parent[self._idx] = _none if node is None else node._idx
+
+
+class PooledRedBlackNode(PooledNode):
+    __slots__ = ()
+
+    @property
+    def red(self):
+        return bool(self._pool._red[self._idx])
+
+    @red.setter
+    def red(self, red):
+        self._pool._red[self._idx] = 1 if red else 0
+
+
+class PooledTreapNode(PooledNode):
+    __slots__ = ()
+
+    @property
+    def priority(self):
+        return self._pool._priority[self._idx]
+
+    @priority.setter
+    def priority(self, priority):
+        self._pool._priority[self._idx] = priority
+
+
+class NodePool(object):
+    """
+    Struct-of-arrays node store. Keys, values and links of every node live in parallel arrays addressed by integer
+    handles, so a node costs a few array slots instead of a Python object. Pass an instance as `nodeclass` of a tree.
+    """
+    _handleclass = PooledNode
+
+    def __init__(self, sized=False, counted=False):
+        """
+        :param sized: also store subtree sizes, required by trees with order statistics
+        :param counted: also store key counts, required by trees in multiset mode
+        """
+        self._key = []
+        self._val = []
+        self._sort_key = []
+        self._left = array('i')
+        self._right = array('i')
+        self._parent = array('i')
+        self._size = array('i') if sized else None
+        self._count = array('l') if counted else None
+        self._free = []
+        self._handles = {}
+
+    def __len__(self):
+        return len(self._key) - len(self._free)
+
+    def __reduce__(self):
+        """
+        a pool pickles as an empty pool of the same kind, trees holding it recreate their nodes when loaded
+        """
+        return self.__class__, (self._size is not None, self._count is not None)
+
+    def _alloc(self, key, val):
+        if self._free:
+            idx = self._free.pop()
+            self._key[idx] = key
+            self._val[idx] = val
+            self._sort_key[idx] = None
+            self._left[idx] = self._right[idx] = self._parent[idx] = _none
+            if self._size is not None:
+                self._size[idx] = 1
+            if self._count is not None:
+                self._count[idx] = 1
+        else:
+            idx = len(self._key)
+            self._key.append(key)
+            self._val.append(val)
+            self._sort_key.append(None)
+            self._left.append(_none)
+            self._right.append(_none)
+            self._parent.append(_none)
+            if self._size is not None:
+                self._size.append(1)
+            if self._count is not None:
+                self._count.append(1)
+        return idx
+
+    def _handle(self, idx):
+        if idx == _none:
+            return None
+        r = self._handles.get(idx)
+        node = r and r()
+        if node is None:
+            node = self._handleclass(self, idx)
+            self._handles[idx] = ref(node, self._make_release(idx))
+        return node
+
+    def _make_release(self, idx):
+        handles = self._handles
+
+        def release(r):
+            if handles.get(idx) is r:
+                del handles[idx]
+
+        return release
+
+    def free(self, node):
+        """
+        release the slot of a node that is no longer part of any tree, e.g. the node returned by `delete`. the
+        handle must not be used afterwards
+        :param node: handle returned by this pool
+        """
+        idx = node._idx
+        self._key[idx] = self._val[idx] = self._sort_key[idx] = None
+        self._handles.pop(idx, None)
+        self._free.append(idx)
+
+
+class RedBlackNodePool(NodePool):
+    _handleclass = PooledRedBlackNode
+
+    def __init__(self, sized=False, counted=False):
+        super(RedBlackNodePool, self).__init__(sized, counted)
+        self._red = bytearray()
+
+    def __call__(self, key, val=None):
+        idx = self._alloc(key, val)
+        if idx == len(self._red):
+            self._red.append(1)
+        else:
+            self._red[idx] = 1
+        return self._handle(idx)
+
+
+class TreapNodePool(NodePool):
+    _handleclass = PooledTreapNode
+
+    def __init__(self, sized=False, counted=False):
+        super(TreapNodePool, self).__init__(sized, counted)
+        self._priority = []
+
+    def __call__(self, key, priority, val=None):
+        idx = self._alloc(key, val)
+        if idx == len(self._priority):
+            self._priority.append(priority)
+        else:
+            self._priority[idx] = priority
+        return self._handle(idx)
+
+    def free(self, node):
+        self._priority[node._idx] = None
+        super(TreapNodePool, self).free(node)
@@ -1,4 +1,6 @@
 class RedBlackTreeNode(object):
+    __slots__ = ('key', 'val', 'left', 'right', 'red', 'parent', 'sort_key')
+
     def __init__(self, key, val=None):
         self.key = key
         self.val = val
@@ -6,3 +8,27 @@ class RedBlackTreeNode(object):
         self.right = None
         self.red = True
         self.parent = None
+
+
+class SizedRedBlackTreeNode(RedBlackTreeNode):
+    __slots__ = ('size',)
+
+    def __init__(self, key, val=None):
+        super(SizedRedBlackTreeNode, self).__init__(key, val)
+        self.size = 1
+
+
+class CountedRedBlackTreeNode(RedBlackTreeNode):
+    __slots__ = ('count',)
+
+    def __init__(self, key, val=None):
+        super(CountedRedBlackTreeNode, self).__init__(key, val)
+        self.count = 1
+
+
+class SizedCountedRedBlackTreeNode(SizedRedBlackTreeNode):
+    __slots__ = ('count',)
+
+    def __init__(self, key, val=None):
+        super(SizedCountedRedBlackTreeNode, self).__init__(key, val)
+        self.count = 1
@@ -0,0 +1,17 @@
+class SplayTreeNode(object):
+    __slots__ = ('key', 'val', 'left', 'right', 'parent', 'sort_key')
+
+    def __init__(self, key, val=None):
+        self.key = key
+        self.val = val
+        self.left = None
+        self.right = None
+        self.parent = None
+
+
+class SizedSplayTreeNode(SplayTreeNode):
+    __slots__ = ('size',)
+
+    def __init__(self, key, val=None):
+        super(SizedSplayTreeNode, self).__init__(key, val)
+        self.size = 1
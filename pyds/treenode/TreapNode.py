@@ -1,4 +1,6 @@
 class TreapNode(object):
+    __slots__ = ('key', 'priority', 'val', 'left', 'right', 'parent', 'sort_key')
+
     def __init__(self, key, priority, val=None):
         self.key = key
         self.priority = priority
@@ -6,3 +8,27 @@ class TreapNode(object):
         self.left = None
         self.right = None
         self.parent = None
+
+
+class SizedTreapNode(TreapNode):
+    __slots__ = ('size',)
+
+    def __init__(self, key, priority, val=None):
+        super(SizedTreapNode, self).__init__(key, priority, val)
+        self.size = 1
+
+
+class CountedTreapNode(TreapNode):
+    __slots__ = ('count',)
+
+    def __init__(self, key, priority, val=None):
+        super(CountedTreapNode, self).__init__(key, priority, val)
+        self.count = 1
+
+
+class SizedCountedTreapNode(SizedTreapNode):
+    __slots__ = ('count',)
+
+    def __init__(self, key, priority, val=None):
+        super(SizedCountedTreapNode, self).__init__(key, priority, val)
+        self.count = 1
@@ -0,0 +1,148 @@
+import operator
+import random
+
+from nose.tools import raises
+from parameterized import parameterized
+
+from tree.ArraySegmentTreeImpl import ArraySegmentTreeImpl, add_compose, add_to_extremum, add_to_sum, \
+    assign_compose, assign_to_extremum, assign_to_sum
+
+
+class TestArraySegmentTree(object):
+    @parameterized([
+        ([5],),
+        ([1, 2],),
+        ([3, 1, 4, 1, 5],),
+        ([3, 1, 4, 1, 5, 9, 2, 6],),
+        ([3, 1, 4, 1, 5, 9, 2, 6, 5],),
+    ])
+    def test_query(self, seq):
+        tree = ArraySegmentTreeImpl(operator.add)
+        tree.build(seq)
+        for low in range(len(seq)):
+            for high in range(low, len(seq) + 2):
+                assert tree.query(low, high) == sum(seq[low:high + 1])
+
+    @parameterized([
+        (['a', 'b', 'c', 'd', 'e'],),
+    ])
+    def test_query_order(self, seq):
+        tree = ArraySegmentTreeImpl(operator.add)
+        tree.build(seq)
+        assert tree.query(1, 3) == 'bcd'
+        assert tree.query(0, 4) == 'abcde'
+
+    @parameterized([
+        ([3, 1, 4, 1, 5], [(0, 7), (4, 0), (2, 2)]),
+        ([3], [(0, 7)]),
+    ])
+    def test_update(self, seq, updates):
+        tree = ArraySegmentTreeImpl(min)
+        tree.build(seq)
+        for idx, val in updates:
+            tree.update(idx, val)
+            seq[idx] = val
+        assert [tree.get(i) for i in range(len(seq))] == seq
+        for low in range(len(seq)):
+            assert tree.query(low, len(seq) - 1) == min(seq[low:])
+
+    def test_query_many(self):
+        tree = ArraySegmentTreeImpl(max)
+        tree.build([3, 1, 4, 1, 5, 9, 2])
+        assert tree.query_many([0, 1, 5], [2, 3, 6]) == [4, 4, 9]
+
+    @parameterized([
+        (operator.add, sum, add_to_sum, add_compose, lambda old, tag: old + tag),
+        (min, min, add_to_extremum, add_compose, lambda old, tag: old + tag),
+        (operator.add, sum, assign_to_sum, assign_compose, lambda old, tag: tag),
+        (max, max, assign_to_extremum, assign_compose, lambda old, tag: tag),
+    ])
+    def test_update_range(self, aggr, reduce, apply, compose, naive):
+        rnd = random.Random(23)
+        for n in (1, 2, 7, 16, 19):
+            seq = [rnd.randrange(50) for _ in range(n)]
+            tree = ArraySegmentTreeImpl(aggr, apply, compose)
+            tree.build(seq)
+            for _ in range(100):
+                low = rnd.randrange(n)
+                high = rnd.randrange(low, n + 2)
+                tag = rnd.randrange(-5, 5)
+                action = rnd.randrange(4)
+                if action == 0:
+                    tree.update_range(low, high, tag)
+                    seq[low:high + 1] = [naive(x, tag) for x in seq[low:high + 1]]
+                elif action == 1:
+                    tree.update(low, tag)
+                    seq[low] = tag
+                elif action == 2:
+                    assert tree.get(low) == seq[low]
+                else:
+                    assert tree.query(low, high) == reduce(seq[low:high + 1])
+
+    @parameterized([
+        (None, None),
+        (add_to_sum, add_compose),
+    ])
+    def test_append(self, apply, compose):
+        rnd = random.Random(31)
+        tree = ArraySegmentTreeImpl(operator.add, apply, compose)
+        seq = []
+        for _ in range(300):
+            action = rnd.randrange(5)
+            if action == 0 or not seq:
+                seq.append(rnd.randrange(10))
+                tree.append(seq[-1])
+            elif action == 1:
+                vals = [rnd.randrange(10) for _ in range(rnd.randrange(5))]
+                tree.extend(iter(vals))
+                seq.extend(vals)
+            elif action == 2 and apply is not None:
+                low = rnd.randrange(len(seq))
+                high = rnd.randrange(low, len(seq))
+                tree.update_range(low, high, 1)
+                seq[low:high + 1] = [x + 1 for x in seq[low:high + 1]]
+            else:
+                low = rnd.randrange(len(seq))
+                assert tree.query(low, len(seq)) == sum(seq[low:])
+                assert tree.get(low) == seq[low]
+
+    @parameterized([
+        (None, None),
+        (add_to_sum, add_compose),
+    ])
+    def test_update_many(self, apply, compose):
+        rnd = random.Random(41)
+        seq = [rnd.randrange(10) for _ in range(21)]
+        tree = ArraySegmentTreeImpl(operator.add, apply, compose)
+        tree.build(seq)
+        for _ in range(30):
+            if apply is not None:
+                tree.update_range(3, 17, 2)
+                seq[3:18] = [x + 2 for x in seq[3:18]]
+            pairs = [(rnd.randrange(21), rnd.randrange(10)) for _ in range(rnd.randrange(1, 10))]
+            tree.update_many(pairs)
+            for idx, val in pairs:
+                seq[idx] = val
+            assert [tree.query(low, 20) for low in range(21)] == [sum(seq[low:]) for low in range(21)]
+
+    @raises(IndexError)
+    def test_update_many_error(self):
+        tree = ArraySegmentTreeImpl(operator.add)
+        tree.build([1, 2])
+        tree.update_many([(0, 1), (2, 1)])
+
+    @raises(ValueError)
+    def test_update_range_error(self):
+        tree = ArraySegmentTreeImpl(operator.add)
+        tree.build([1, 2])
+        tree.update_range(0, 1, 1)
+
+    @raises(ValueError)
+    def test_build_error(self):
+        ArraySegmentTreeImpl(operator.add).build([])
+
+    @raises(IndexError)
+    def test_query_error(self):
+        tree = ArraySegmentTreeImpl(operator.add)
+        tree.build([1, 2])
+        tree.query(2, 3)
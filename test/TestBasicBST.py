@@ -1,3 +1,4 @@
+import random
 from collections import Counter
 
 from nose.tools import raises
@@ -77,3 +78,89 @@ class TestBasicBST(object):
         should = sorted((Counter(seq) - Counter(de)).elements())
         got = [x.key for x in utils.inorder(tree.root)]
         assert should == got
+
+    def test_deep(self):
+        n = 5000
+        tree = BasicBSTImpl()
+        for key in range(n):
+            tree.insert(key=key)
+        assert all(tree.search(key).key == key for key in range(n))
+        assert all(tree.delete(key).key == key for key in range(n))
+        assert tree.root is None
+
+    @parameterized([
+        ([3, 1, 4, 5, 9, 2, 6], {'key': lambda x: -x}, lambda seq: sorted(seq, reverse=True)),
+        (['b', 'C', 'a', 'D'], {'key': str.lower}, lambda seq: sorted(seq, key=str.lower)),
+        ([3, 1, 4, 5, 9, 2, 6], {'eq': lambda a, b: a == b, 'gt': lambda a, b: a < b},
+         lambda seq: sorted(seq, reverse=True)),
+    ])
+    def test_key(self, seq, kwargs, order):
+        tree = BasicBSTImpl(**kwargs)
+        for key in seq:
+            tree.insert(key=key)
+        assert [x.key for x in utils.inorder(tree.root)] == order(seq)
+        for key in seq:
+            assert tree.search(key).key == key
+        assert tree.delete(seq[0]).key == seq[0]
+        assert [x.key for x in utils.inorder(tree.root)] == order(seq[1:])
+
+    @parameterized([
+        (None, None),
+        (10, 30),
+        (-5, 15),
+        (25, 100),
+        (30, 10),
+    ])
+    def test_range(self, low, high):
+        rnd = random.Random(17)
+        keys = [rnd.randrange(40) for _ in range(60)]
+        tree = BasicBSTImpl()
+        for key in keys:
+            tree.insert(key=key)
+        should = sorted(k for k in keys if (low is None or k >= low) and (high is None or k < high))
+        assert [x.key for x in tree.range(low, high)] == should
+        assert [x.key for x in tree.range(low, high, reverse=True)] == should[::-1]
+        if low is None and high is None:
+            assert [x.key for x in tree] == should
+            assert [x.key for x in reversed(tree)] == should[::-1]
+
+    def test_neighbors(self):
+        rnd = random.Random(19)
+        keys = rnd.sample(range(0, 100, 2), 30)
+        tree = BasicBSTImpl()
+        for key in keys:
+            tree.insert(key=key)
+        key = lambda node: node and node.key
+        for probe in range(-1, 101):
+            lower = [k for k in keys if k < probe]
+            upper = [k for k in keys if k > probe]
+            floor = max(lower + [k for k in keys if k == probe] or [None])
+            ceiling = min(upper + [k for k in keys if k == probe] or [None])
+            assert key(tree.floor(probe)) == floor
+            assert key(tree.ceiling(probe)) == ceiling
+            assert key(tree.predecessor(probe)) == max(lower or [None])
+            assert key(tree.successor(probe)) == min(upper or [None])
+
+    def test_multiset(self):
+        rnd = random.Random(23)
+        tree = BasicBSTImpl(multiset=True)
+        counts = Counter()
+        for _ in range(3000):
+            key = rnd.randrange(30)
+            if rnd.random() < 0.6:
+                tree.insert(key=key, val=str(key))
+                counts[key] += 1
+            else:
+                node = tree.remove_one(key)
+                assert (node is None) == (counts[key] == 0)
+                if counts[key]:
+                    counts[key] -= 1
+            assert tree.count(key) == counts[key]
+        distinct = sorted(key for key in counts if counts[key])
+        assert [x.key for x in tree] == distinct
+        assert [x.count for x in tree] == [counts[key] for key in distinct]
+        assert tree.delete(distinct[0]).count == counts[distinct[0]] and tree.count(distinct[0]) == 0
+
+    @raises(ValueError)
+    def test_multiset_disabled(self):
+        BasicBSTImpl().count(1)
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+from collections import Counter
+
+from parameterized import parameterized
+
+from benchmark import bench
+
+
+class TestBenchmark(object):
+    @parameterized([
+        ('sorted',),
+        ('random',),
+        ('adversarial',),
+        ('zipfian',),
+    ])
+    def test_keys(self, distribution):
+        keys = bench.make_keys(101, distribution, bench.random.Random(0))
+        assert sorted(keys) == list(range(101))
+        ranges = bench.make_ranges(101, distribution, bench.random.Random(0), 50)
+        assert len(ranges) == 50 and all(0 <= low <= high < 101 for low, high in ranges)
+
+    def test_zipf(self):
+        probes = bench.make_probes(list(range(1000)), 'zipfian', bench.random.Random(0), 10000)
+        counts = sorted(Counter(probes).values(), reverse=True)
+        assert len(probes) == 10000 and sum(counts[:10]) > 4000
+
+    def test_zipf_distinct(self):
+        probes = bench.make_probes(list(range(1000)), 'zipfian', bench.random.Random(0), 500, distinct=True)
+        assert len(probes) == len(set(probes)) == 500
+        assert sorted(bench.make_probes(list(range(100)), 'zipfian', bench.random.Random(0), 500, distinct=True)) == \
+            list(range(100))
+
+    def test_run_compare(self):
+        results = bench.run(sorted(bench.CASES), None, ['random'], [200], max_ops=50)
+        assert set((r['structure'], r['op']) for r in results) == \
+            set((s, op) for s, (_, ops) in bench.CASES.items() for op in ops)
+        assert all(r['throughput'] > 0 and r['p50'] <= r['p99'] <= r['max'] for r in results)
+        assert bench.compare(results, results, 0.1) == []
+        faster = [dict(r, throughput=r['throughput'] * 2) for r in results]
+        assert len(bench.compare(results, faster, 0.1)) == len(results)
+
+    def test_size_limit(self):
+        messages = []
+        results = bench.run(['BasicBSTImpl'], ['search'], ['sorted'], [10 ** 5], memory=False, log=messages.append)
+        assert results == [] and len(messages) == 1
+
+    def test_main(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            args = ['--structures', 'TreapImpl', '--ops', 'split', '--sizes', '100', '--distributions', 'sorted',
+                    '--quiet']
+            assert bench.main(args + ['--output', path]) == 0
+            with open(path) as f:
+                saved = json.load(f)
+            assert len(saved['results']) == 1 and saved['results'][0]['peak_memory'] > 0
+            saved['results'][0]['throughput'] *= 100
+            with open(path, 'w') as f:
+                json.dump(saved, f)
+            assert bench.main(args + ['--baseline', path, '--no-memory']) == 1
+        finally:
+            os.remove(path)
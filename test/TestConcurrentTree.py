@@ -0,0 +1,105 @@
+import random
+import threading
+
+from nose.tools import raises
+from parameterized import parameterized
+
+from ConcurrentTree import ConcurrentTree, ReadWriteLock
+from tree.RedBlackTreeImpl import RedBlackTreeImpl
+from tree.TreapImpl import TreapImpl
+
+
+class TestConcurrentTree(object):
+    def test_concurrent_readers(self):
+        shared = ConcurrentTree(RedBlackTreeImpl.from_sorted(range(10)))
+        barrier = threading.Barrier(3, timeout=5)
+        results = []
+
+        def read():
+            with shared.reading() as tree:
+                # all readers hold the lock at once, else the barrier times out
+                barrier.wait()
+                results.append([x.key for x in tree])
+
+        threads = [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [list(range(10))] * 3
+
+    def test_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+        acquired = lock.acquire_write()
+
+        def read():
+            with lock.reading():
+                events.append('read')
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join(0.1)
+        events.append('write')
+        lock.release_write(acquired)
+        thread.join()
+        assert events == ['write', 'read']
+
+    @parameterized([
+        (RedBlackTreeImpl, False),
+        (TreapImpl, True),
+    ])
+    def test_threads(self, treeclass, priority):
+        shared = ConcurrentTree(treeclass())
+        errors = []
+
+        def write(offset):
+            rnd = random.Random(offset)
+            for key in range(offset, 2000, 4):
+                if priority:
+                    shared.insert(key=key, priority=rnd.random(), val=key)
+                else:
+                    shared.insert(key=key, val=key)
+
+        def read():
+            for _ in range(200):
+                keys = [x.key for x in shared.range(100, 1900)]
+                if keys != sorted(keys):
+                    errors.append(keys)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        assert [x.key for x in shared] == list(range(2000))
+        assert len(shared) == 2000 and 1999 in shared
+        stats = shared.stats()
+        assert stats['write_acquires'] == 2000
+        assert stats['read_acquires'] >= 800
+        assert stats['max_write_hold'] <= stats['write_hold']
+
+    def test_transaction(self):
+        shared = ConcurrentTree(RedBlackTreeImpl(order_statistics=True))
+        with shared.transaction() as tree:
+            for key in range(10):
+                tree.insert(key=key)
+            tree.delete(3)
+        assert shared.stats()['write_acquires'] == 1
+        assert shared.rank(5) == 4 and shared.select(3).key == 4
+        assert shared.floor(3).key == 2 and shared.ceiling(3).key == 4
+        assert shared.predecessor(4).key == 2 and shared.successor(2).key == 4
+        assert shared.update(9, 'x').val == 'x'
+        assert shared.delete(9).key == 9 and shared.search(9) is None
+
+    @raises(KeyError)
+    def test_transaction_error(self):
+        shared = ConcurrentTree(RedBlackTreeImpl())
+        try:
+            with shared.transaction():
+                raise KeyError()
+        finally:
+            # the lock is released on error
+            shared.insert(key=1)
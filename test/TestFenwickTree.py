@@ -0,0 +1,62 @@
+import bisect
+import operator
+import random
+from itertools import accumulate
+
+from nose.tools import raises
+from parameterized import parameterized
+
+from tree.FenwickTreeImpl import FenwickTreeImpl
+
+
+class TestFenwickTree(object):
+    @parameterized([
+        ([5],),
+        ([3, 1, 4, 1, 5],),
+        ([3, 1, 4, 1, 5, 9, 2, 6],),
+        ([3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5],),
+    ])
+    def test_query(self, seq):
+        tree = FenwickTreeImpl()
+        tree.build(iter(seq))
+        for low in range(len(seq)):
+            for high in range(low, len(seq) + 2):
+                assert tree.query(low, high) == sum(seq[low:high + 1])
+
+    def test_update(self):
+        rnd = random.Random(29)
+        seq = [rnd.randrange(10) for _ in range(13)]
+        tree = FenwickTreeImpl(operator.xor, operator.xor)
+        tree.build(seq)
+        for _ in range(40):
+            idx = rnd.randrange(13)
+            seq[idx] = rnd.randrange(10)
+            tree.update(idx, seq[idx])
+        assert [tree.get(i) for i in range(13)] == seq
+        for low in range(13):
+            should = 0
+            for x in seq[low:]:
+                should ^= x
+            assert tree.query(low, 12) == should
+
+    @parameterized([
+        ([5],),
+        ([3, 0, 4, 1, 0],),
+        ([3, 1, 4, 1, 5, 9, 2, 6, 5],),
+    ])
+    def test_lower_bound(self, seq):
+        tree = FenwickTreeImpl()
+        tree.build(seq)
+        prefix = list(accumulate(seq))
+        for target in range(sum(seq) + 2):
+            assert tree.lower_bound(target) == bisect.bisect_left(prefix, target)
+
+    @raises(ValueError)
+    def test_build_error(self):
+        FenwickTreeImpl().build([])
+
+    @raises(IndexError)
+    def test_get_error(self):
+        tree = FenwickTreeImpl()
+        tree.build([1, 2])
+        tree.get(2)
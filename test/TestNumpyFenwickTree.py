@@ -0,0 +1,39 @@
+import numpy as np
+from nose.tools import raises
+from parameterized import parameterized
+
+from tree.NumpyFenwickTreeImpl import NumpyFenwickTreeImpl
+
+
+class TestNumpyFenwickTree(object):
+    @parameterized([
+        (np.add, np.subtract, 1, None),
+        (np.add, np.subtract, 23, 'float64'),
+        (np.bitwise_xor, np.bitwise_xor, 16, 'int32'),
+    ])
+    def test_query(self, aggr, inv, n, dtype):
+        rnd = np.random.RandomState(n)
+        seq = rnd.randint(0, 100, n)
+        tree = NumpyFenwickTreeImpl(aggr, inv, dtype=dtype)
+        tree.build(seq)
+        for _ in range(n):
+            idx = rnd.randint(n)
+            seq[idx] = rnd.randint(100)
+            tree.update(idx, seq[idx])
+        lows, highs, should = [], [], []
+        for low in range(n):
+            for high in range(low, n + 2):
+                should.append(aggr.reduce(seq[low:high + 1]))
+                lows.append(low)
+                highs.append(high)
+                assert tree.query(low, high) == should[-1]
+        assert np.array_equal(tree.query_many(lows, highs), should)
+
+    def test_lower_bound(self):
+        tree = NumpyFenwickTreeImpl()
+        tree.build([2, 0, 3, 1])
+        assert [tree.lower_bound(x) for x in range(8)] == [0, 0, 0, 2, 2, 2, 3, 4]
+
+    @raises(ValueError)
+    def test_ufunc_error(self):
+        NumpyFenwickTreeImpl(np.minimum)
@@ -0,0 +1,138 @@
+import os
+import tempfile
+
+import numpy as np
+from nose.tools import raises
+from parameterized import parameterized
+
+from tree.NumpySegmentTreeImpl import NumpySegmentTreeImpl
+
+
+class TestNumpySegmentTree(object):
+    @parameterized([
+        (np.add, 1, None),
+        (np.add, 17, 'float64'),
+        (np.minimum, 16, None),
+        (np.maximum, 33, 'int32'),
+    ])
+    def test_query(self, ufunc, n, dtype):
+        rnd = np.random.RandomState(n)
+        seq = rnd.randint(0, 100, n)
+        tree = NumpySegmentTreeImpl(ufunc, dtype=dtype)
+        tree.build(iter(seq.tolist()))
+        lows, highs, should = [], [], []
+        for low in range(n):
+            for high in range(low, n + 2):
+                should.append(ufunc.reduce(seq[low:high + 1]))
+                lows.append(low)
+                highs.append(high)
+                assert tree.query(low, high) == should[-1]
+        assert np.array_equal(tree.query_many(lows, highs), should)
+
+    def test_update(self):
+        rnd = np.random.RandomState(5)
+        seq = rnd.randint(0, 100, 21)
+        tree = NumpySegmentTreeImpl(np.minimum)
+        tree.build(seq)
+        for idx in rnd.randint(0, 21, 30):
+            seq[idx] = rnd.randint(0, 100)
+            tree.update(idx, seq[idx])
+        assert [tree.get(i) for i in range(21)] == seq.tolist()
+        lows = np.arange(21)
+        assert np.array_equal(tree.query_many(lows, lows + 5), [seq[i:i + 6].min() for i in lows])
+
+    @parameterized([
+        (np.add,),
+        (np.minimum,),
+    ])
+    def test_append(self, ufunc):
+        rnd = np.random.RandomState(37)
+        tree = NumpySegmentTreeImpl(ufunc)
+        seq = []
+        for _ in range(200):
+            action = rnd.randint(3)
+            if action == 0 or not seq:
+                seq.append(rnd.randint(100))
+                tree.append(seq[-1])
+            elif action == 1:
+                vals = rnd.randint(0, 100, rnd.randint(5)).tolist()
+                tree.extend(vals)
+                seq.extend(vals)
+            else:
+                lows = np.arange(len(seq))
+                should = [ufunc.reduce(seq[low:]) for low in lows]
+                assert np.array_equal(tree.query_many(lows, lows + len(seq)), should)
+
+    @parameterized([
+        (np.add, 1),
+        (np.maximum, 19),
+        (np.add, 64),
+    ])
+    def test_update_many(self, ufunc, n):
+        rnd = np.random.RandomState(n)
+        seq = rnd.randint(0, 100, n)
+        tree = NumpySegmentTreeImpl(ufunc)
+        tree.build(seq)
+        for _ in range(20):
+            idxs = rnd.randint(0, n, rnd.randint(1, 10))
+            vals = rnd.randint(0, 100, len(idxs))
+            tree.update_arrays(idxs, vals)
+            for idx, val in zip(idxs, vals):
+                seq[idx] = val
+            lows = np.arange(n)
+            assert np.array_equal(tree.query_many(lows, lows + n), [ufunc.reduce(seq[low:]) for low in lows])
+        tree.update_many([(0, 7), (0, 5)])
+        assert tree.get(0) == 5
+
+    def test_update_many_tuple(self):
+        tree = NumpySegmentTreeImpl(np.add)
+        tree.build(np.zeros(8, dtype=np.int64))
+        tree.update_many(((0, 5), (3, 7)))
+        assert [tree.get(idx) for idx in range(8)] == [5, 0, 0, 7, 0, 0, 0, 0]
+        assert tree.query(0, 8) == 12
+
+    @parameterized([
+        (np.add, 'float32', True),
+        (np.minimum, 'int64', True),
+        (np.maximum, 'int16', False),
+    ])
+    def test_save_open(self, ufunc, dtype, mmap):
+        rnd = np.random.RandomState(43)
+        seq = rnd.randint(0, 100, 37)
+        tree = NumpySegmentTreeImpl(ufunc, dtype=dtype)
+        tree.build(seq)
+        tree.append(5)
+        seq = np.append(seq, 5)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            tree.save(path)
+            loaded = NumpySegmentTreeImpl.open(path, mmap=mmap)
+            assert loaded._arr.dtype == np.dtype(dtype)
+            assert isinstance(loaded._arr, np.memmap) == mmap
+            lows = np.arange(len(seq))
+            assert np.array_equal(loaded.query_many(lows, lows + 3), [ufunc.reduce(seq[low:low + 4]) for low in lows])
+            assert loaded.query(2, 30) == ufunc.reduce(seq[2:31])
+            if not mmap:
+                loaded.update(0, 99)
+                assert loaded.get(0) == 99
+            del loaded
+        finally:
+            os.remove(path)
+
+    @raises(ValueError)
+    def test_open_error(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'x' * 100)
+            f.flush()
+            NumpySegmentTreeImpl.open(f.name)
+
+    @raises(ValueError)
+    def test_ufunc_error(self):
+        NumpySegmentTreeImpl(min)
+
+    @raises(IndexError)
+    def test_query_many_error(self):
+        tree = NumpySegmentTreeImpl()
+        tree.build([1, 2])
+        tree.query_many([0, 2], [1, 3])
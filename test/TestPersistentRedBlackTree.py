@@ -0,0 +1,64 @@
+import random
+
+from parameterized import parameterized
+
+from test import utils
+from tree.PersistentRedBlackTreeImpl import PersistentRedBlackTreeImpl
+
+
+class TestPersistentRedBlackTree(object):
+    _is_valid = staticmethod(utils.red_black_is_valid)
+    _sizes_ok = staticmethod(utils.sizes_ok)
+
+    @parameterized([
+        (False, None),
+        (True, None),
+        (False, lambda x: -x),
+    ])
+    def test_snapshots(self, order_statistics, key):
+        rnd = random.Random(3)
+        tree = PersistentRedBlackTreeImpl(order_statistics=order_statistics, key=key)
+        keys = []
+        versions = []
+        for i in range(3000):
+            k = rnd.randrange(300)
+            if rnd.random() < 0.55:
+                tree.insert(key=k, val=-k)
+                keys.append(k)
+            else:
+                node = tree.delete(k)
+                assert (node is not None) == (k in keys)
+                if node is not None:
+                    assert node.key == k
+                    keys.remove(k)
+            if i % 50 == 0:
+                versions.append((tree.snapshot(), sorted(keys, reverse=key is not None)))
+        for version, should in versions:
+            assert [(x.key, x.val) for x in version] == [(k, -k) for k in should]
+            assert version.root is None or self._is_valid(version)
+            if order_statistics:
+                assert version.root is None or self._sizes_ok(version.root)
+
+    def test_shares_structure(self):
+        tree = PersistentRedBlackTreeImpl.from_sorted(range(1000))
+        old = tree.snapshot()
+        tree.delete(500)
+        tree.update(10, 'x')
+        shared = set(map(id, old)) & set(map(id, tree))
+        assert len(shared) > 950
+        assert old.search(10).val is None and tree.search(10).val == 'x'
+        assert old.search(500) is not None and tree.search(500) is None
+        assert self._is_valid(old) and self._is_valid(tree)
+
+    def test_delete_all(self):
+        keys = list(range(200))
+        random.Random(9).shuffle(keys)
+        tree = PersistentRedBlackTreeImpl()
+        for key in keys:
+            tree.insert(key=key)
+        full = tree.snapshot()
+        for key in keys:
+            assert tree.delete(key).key == key
+            assert tree.root is None or self._is_valid(tree)
+        assert tree.root is None
+        assert [x.key for x in full] == sorted(keys)
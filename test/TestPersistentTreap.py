@@ -0,0 +1,96 @@
+import random
+
+from parameterized import parameterized
+
+from test import utils
+from tree.PersistentTreapImpl import PersistentTreapImpl
+
+
+class TestPersistentTreap(object):
+    _is_valid = staticmethod(utils.treap_is_valid)
+
+    @parameterized([
+        (False,),
+        (True,),
+    ])
+    def test_snapshots(self, order_statistics):
+        rnd = random.Random(3)
+        tree = PersistentTreapImpl(order_statistics=order_statistics)
+        keys = []
+        versions = []
+        for i in range(2000):
+            key = rnd.randrange(200)
+            if rnd.random() < 0.55:
+                tree.insert(key=key, priority=rnd.random(), val=-key)
+                keys.append(key)
+            else:
+                node = tree.delete(key)
+                assert (node is not None) == (key in keys)
+                if node is not None:
+                    keys.remove(key)
+            if i % 50 == 0:
+                versions.append((tree.snapshot(), sorted(keys)))
+        for version, should in versions:
+            assert [(x.key, x.val) for x in version] == [(key, -key) for key in should]
+            assert self._is_valid(version)
+            if order_statistics:
+                assert len(version) == len(should)
+                assert [version.select(i).key for i in range(len(should))] == should
+
+    def test_shares_structure(self):
+        rnd = random.Random(5)
+        tree = PersistentTreapImpl.from_sorted(range(1000), (rnd.random() for _ in range(1000)))
+        old = tree.snapshot()
+        tree.insert(key=500.5, priority=0.5)
+        tree.update(10, 'x')
+        shared = set(map(id, old)) & set(map(id, tree))
+        assert len(shared) > 900
+        assert old.search(10).val is None and tree.search(10).val == 'x'
+        assert old.search(500.5) is None
+
+    @parameterized([
+        ([(4, 1), (3, 2), (2, 3), (1, 4)], 2, True),
+        ([(4, 1), (3, 2), (2, 3), (1, 4)], 3, False),
+        ([(1, 1), (2, 2), (3, 3), (4, 4)], 5, False),
+    ])
+    def test_split_join(self, seq, pivot, keep_pivot):
+        tree = PersistentTreapImpl()
+        for key, priority in seq:
+            tree.insert(key=key, priority=priority)
+        res = tree.split(pivot, keep_pivot=keep_pivot)
+        keys = sorted(key for key, _ in seq)
+        assert res.pivot.key == pivot
+        got_left = [x.key for x in res.left]
+        got_right = [x.key for x in res.right]
+        if keep_pivot:
+            assert got_left == [x for x in keys if x <= pivot]
+        else:
+            assert got_left == [x for x in keys if x < pivot]
+        assert got_right == [x for x in keys if x > pivot]
+        assert self._is_valid(res.left) and self._is_valid(res.right)
+        assert [x.key for x in tree] == keys
+        joined = PersistentTreapImpl.join(res.left, res.right)
+        assert self._is_valid(joined)
+        assert [x.key for x in joined] == got_left + got_right
+        assert [x.key for x in res.left] == got_left
+
+    def test_update_priority(self):
+        tree = PersistentTreapImpl()
+        for key in range(10):
+            tree.insert(key=key, priority=key, val=-key)
+        old = tree.snapshot()
+        node = tree.update_priority(9, -1)
+        assert node.val == -9 and tree.root is node
+        assert self._is_valid(tree)
+        assert old.root.key == 0
+        assert tree.update_priority(10, 0) is None
+
+    def test_set_operation(self):
+        t1 = PersistentTreapImpl.from_sorted(range(0, 100, 2), range(50))
+        t2 = PersistentTreapImpl.from_sorted(range(0, 100, 3), range(34))
+        old = t1.snapshot()
+        union = PersistentTreapImpl.union(t1, t2)
+        assert [x.key for x in union] == sorted(set(range(0, 100, 2)) | set(range(0, 100, 3)))
+        assert t1.root is None
+        assert [x.key for x in old] == list(range(0, 100, 2))
+        assert self._is_valid(old)
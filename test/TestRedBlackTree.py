@@ -1,3 +1,6 @@
+import copy
+import pickle
+import random
 from collections import Counter
 
 from nose.tools import raises
@@ -5,9 +8,13 @@ from parameterized import parameterized
 
 from test import utils
 from tree.RedBlackTreeImpl import RedBlackTreeImpl
+from treenode.NodePool import RedBlackNodePool
 
 
 class TestRedBlackTree(object):
+    _sizes_ok = staticmethod(utils.sizes_ok)
+    _is_valid = staticmethod(utils.red_black_is_valid)
+
     @parameterized([
         ([1, 2, 3, 4, 5, 6, 7, 8],),
         ([8, 7, 6, 5, 4, 3, 2, 1],),
@@ -89,27 +96,256 @@ class TestRedBlackTree(object):
         got = [x.key for x in utils.inorder(tree.root)]
         assert should == got
 
-    def _is_valid(self, tree):
-        if tree.root.red:
-            return False
-
-        def recursive(node):
-            if node.red:
-                if node.left and node.right:
-                    if node.left.red or node.right.red:
-                        return False
-                    bhl = recursive(node.left)
-                    bhr = recursive(node.right)
-                    if bhl and bhr and bhl == bhr:
-                        return bhl
-                elif not node.left and not node.right:
-                    return 1
-                return False
+    def test_random(self):
+        rnd = random.Random(42)
+        keys = list(range(2000))
+        rnd.shuffle(keys)
+        tree = RedBlackTreeImpl()
+        for key in keys:
+            tree.insert(key=key)
+        assert self._is_valid(tree)
+        rnd.shuffle(keys)
+        for key in keys[:1500]:
+            assert tree.delete(key).key == key
+            assert tree.root is None or self._is_valid(tree)
+        got = [x.key for x in utils.inorder(tree.root)]
+        assert got == sorted(keys[1500:])
+
+    def test_finger(self):
+        rnd = random.Random(4)
+        tree = RedBlackTreeImpl(order_statistics=True)
+        keys = []
+        for i in range(3000):
+            key = rnd.randrange(1000) if i % 3 == 0 else (keys[-1] + rnd.randrange(-3, 4) if keys else 0)
+            tree.finger_insert(key=key, val=-key)
+            keys.append(key)
+            assert tree.finger.key == key
+            if i % 7 == 0:
+                key = rnd.choice(keys)
+                tree.delete(key)
+                keys.remove(key)
+        assert self._is_valid(tree)
+        assert [x.key for x in tree] == sorted(keys)
+        assert self._sizes_ok(tree.root)
+        for probe in range(-5, 1005):
+            node = tree.finger_search(probe)
+            assert (node is not None) == (probe in keys)
+            assert node is None or (node.key == probe and node.val == -probe)
+            assert tree.finger is not None
+
+    def test_finger_locality(self):
+        tree = RedBlackTreeImpl.from_sorted(range(1 << 14))
+        stats = tree.enable_stats()
+        for key in range(1000, 2000):
+            assert tree.finger_search(key).key == key
+        near = stats.totals['comparisons']
+        stats.reset()
+        for key in range(1000, 2000):
+            tree.search(key)
+        assert near * 2 < stats.totals['comparisons']
+        tree.delete(1999)
+        assert tree.finger is None and tree.finger_search(1998).key == 1998
+
+    def test_node_pool(self):
+        rnd = random.Random(7)
+        keys = list(range(500))
+        rnd.shuffle(keys)
+        pool = RedBlackNodePool()
+        tree = RedBlackTreeImpl(nodeclass=pool)
+        for key in keys:
+            tree.insert(key=key, val=-key)
+        assert self._is_valid(tree)
+        for key in keys[:300]:
+            pool.free(tree.delete(key))
+            assert self._is_valid(tree)
+        for key in keys[:100]:
+            tree.insert(key=key, val=-key)
+        assert self._is_valid(tree)
+        assert len(pool) == 300
+        got = [(x.key, x.val) for x in utils.inorder(tree.root)]
+        assert got == [(k, -k) for k in sorted(keys[:100] + keys[300:])]
+
+    @parameterized([
+        (0,), (1,), (2,), (3,), (6,), (7,), (8,), (100,), (1023,)
+    ])
+    def test_from_sorted(self, n):
+        tree = RedBlackTreeImpl.from_sorted((x for x in range(n)), (-x for x in range(n)))
+        assert tree.root is None if n == 0 else self._is_valid(tree)
+        got = [(x.key, x.val) for x in utils.inorder(tree.root)]
+        assert got == [(x, -x) for x in range(n)]
+        tree.insert(key=n)
+        tree.delete(0)
+        assert tree.root is None if n == 0 else self._is_valid(tree)
+
+    @raises(ValueError)
+    def test_from_sorted_error(self):
+        RedBlackTreeImpl.from_sorted([1, 3, 2])
+
+    @parameterized([
+        ([3, 1, 4, 5, 9, 2, 6], {'key': lambda x: -x}, lambda seq: sorted(seq, reverse=True)),
+        (['b', 'C', 'a', 'D'], {'key': str.lower}, lambda seq: sorted(seq, key=str.lower)),
+        ([3, 1, 4, 5, 9, 2, 6], {'eq': lambda a, b: a == b, 'gt': lambda a, b: a < b},
+         lambda seq: sorted(seq, reverse=True)),
+    ])
+    def test_key(self, seq, kwargs, order):
+        tree = RedBlackTreeImpl(**kwargs)
+        for key in seq:
+            tree.insert(key=key)
+        assert [x.key for x in utils.inorder(tree.root)] == order(seq)
+        for key in seq:
+            assert tree.search(key).key == key
+        assert tree.delete(seq[0]).key == seq[0]
+        assert [x.key for x in utils.inorder(tree.root)] == order(seq[1:])
+        assert self._is_valid(tree)
+
+    @parameterized([
+        (False,),
+        (True,),
+    ])
+    def test_order_statistics(self, pooled):
+        rnd = random.Random(11)
+        keys = rnd.sample(range(1000), 400)
+        if pooled:
+            tree = RedBlackTreeImpl(nodeclass=RedBlackNodePool(sized=True), order_statistics=True)
+        else:
+            tree = RedBlackTreeImpl(order_statistics=True)
+        for key in keys:
+            tree.insert(key=key)
+        for key in keys[:150]:
+            tree.delete(key)
+        live = sorted(keys[150:])
+        assert self._is_valid(tree)
+        assert self._sizes_ok(tree.root)
+        assert len(tree) == len(live)
+        assert [tree.select(i).key for i in range(len(live))] == live
+        assert tree.select(-1).key == live[-1]
+        assert all(tree.rank(key) == live.index(key) for key in live)
+        assert tree.rank(-1) == 0 and tree.rank(1000) == len(live)
+        tree = RedBlackTreeImpl.from_sorted(live, order_statistics=True)
+        assert self._sizes_ok(tree.root)
+        assert tree.select(10).key == live[10]
+
+    @raises(IndexError)
+    def test_select_error(self):
+        tree = RedBlackTreeImpl(order_statistics=True)
+        tree.insert(key=1)
+        tree.select(1)
+
+    @raises(ValueError)
+    def test_rank_error(self):
+        RedBlackTreeImpl().rank(1)
+
+    @parameterized([
+        (None, None),
+        (10, 30),
+        (-5, 15),
+        (25, 100),
+        (30, 10),
+    ])
+    def test_range(self, low, high):
+        rnd = random.Random(17)
+        keys = [rnd.randrange(40) for _ in range(60)]
+        tree = RedBlackTreeImpl()
+        for key in keys:
+            tree.insert(key=key)
+        should = sorted(k for k in keys if (low is None or k >= low) and (high is None or k < high))
+        assert [x.key for x in tree.range(low, high)] == should
+        assert [x.key for x in tree.range(low, high, reverse=True)] == should[::-1]
+        if low is None and high is None:
+            assert [x.key for x in tree] == should
+            assert [x.key for x in reversed(tree)] == should[::-1]
+
+    def test_neighbors(self):
+        rnd = random.Random(19)
+        keys = rnd.sample(range(0, 100, 2), 30)
+        tree = RedBlackTreeImpl()
+        for key in keys:
+            tree.insert(key=key)
+        key = lambda node: node and node.key
+        for probe in range(-1, 101):
+            lower = [k for k in keys if k < probe]
+            upper = [k for k in keys if k > probe]
+            floor = max(lower + [k for k in keys if k == probe] or [None])
+            ceiling = min(upper + [k for k in keys if k == probe] or [None])
+            assert key(tree.floor(probe)) == floor
+            assert key(tree.ceiling(probe)) == ceiling
+            assert key(tree.predecessor(probe)) == max(lower or [None])
+            assert key(tree.successor(probe)) == min(upper or [None])
+
+    @parameterized([
+        (0, False, False),
+        (1000, False, False),
+        (1000, True, False),
+        (1000, True, True),
+    ])
+    def test_pickle(self, n, order_statistics, pooled):
+        kwargs = dict(order_statistics=order_statistics)
+        if pooled:
+            kwargs['nodeclass'] = RedBlackNodePool(sized=order_statistics)
+        tree = RedBlackTreeImpl(**kwargs)
+        for key in random.Random(11).sample(range(n), n):
+            tree.insert(key=key, val=str(key))
+        for loaded in (pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)), copy.deepcopy(tree)):
+            assert [(x.key, x.val) for x in loaded] == [(x, str(x)) for x in range(n)]
+            assert loaded.root is None if n == 0 else self._is_valid(loaded)
+            if order_statistics:
+                assert self._sizes_ok(loaded.root) and loaded.select(n // 2).key == n // 2
+            loaded.insert(key=-1)
+            assert tree.search(-1) is None
+
+    def test_pickle_no_vals(self):
+        tree = RedBlackTreeImpl.from_sorted(range(100))
+        state = tree.__reduce__()[1]
+        assert state[-1] is None
+        assert [x.key for x in pickle.loads(pickle.dumps(tree))] == list(range(100))
+
+    @parameterized([
+        (False, False),
+        (True, False),
+        (False, True),
+        (True, True),
+    ])
+    def test_multiset(self, order_statistics, pooled):
+        rnd = random.Random(29)
+        kwargs = dict(multiset=True, order_statistics=order_statistics)
+        if pooled:
+            kwargs['nodeclass'] = RedBlackNodePool(sized=order_statistics, counted=True)
+        tree = RedBlackTreeImpl(**kwargs)
+        counts = Counter()
+        for _ in range(5000):
+            key = rnd.randrange(50)
+            op = rnd.random()
+            if op < 0.6:
+                tree.insert(key=key)
+                counts[key] += 1
+            elif op < 0.95:
+                node = tree.remove_one(key)
+                assert (node is None) == (counts[key] == 0)
+                if counts[key]:
+                    counts[key] -= 1
             else:
-                bhl = recursive(node.left) if node.left else 1
-                bhr = recursive(node.right) if node.right else 1
-                if bhl and bhr and bhl == bhr:
-                    return bhl + 1
-                return False
+                tree.delete(key)
+                counts[key] = 0
+            assert tree.count(key) == counts[key]
+        assert self._is_valid(tree)
+        distinct = sorted(key for key in counts if counts[key])
+        assert [(x.key, x.count) for x in tree] == [(key, counts[key]) for key in distinct]
+        if order_statistics:
+            assert len(tree) == len(distinct) and self._sizes_ok(tree.root)
+        loaded = pickle.loads(pickle.dumps(tree))
+        assert [(x.key, x.count) for x in loaded] == [(key, counts[key]) for key in distinct]
+
+    def test_multiset_depth(self):
+        tree = RedBlackTreeImpl(multiset=True)
+        for _ in range(100):
+            for key in range(10):
+                tree.finger_insert(key=key)
+        assert tree.finger.key == 9 and tree.finger.count == 100
+        assert len(tree) == 10 and max(self._depths(tree.root)) <= 6
+        tree = RedBlackTreeImpl.from_sorted([1, 1, 2, 3, 3, 3], multiset=True)
+        assert [(x.key, x.count) for x in tree] == [(1, 2), (2, 1), (3, 3)]
 
-        return recursive(tree.root)
+    def _depths(self, node, depth=1):
+        if node is None:
+            return [depth - 1]
+        return self._depths(node.left, depth + 1) + self._depths(node.right, depth + 1)
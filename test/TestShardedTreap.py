@@ -0,0 +1,117 @@
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from nose.tools import raises
+from parameterized import parameterized
+
+from ShardedTreap import ShardedTreap
+from test import utils
+
+
+class TestShardedTreap(object):
+    _is_valid = staticmethod(utils.treap_is_valid)
+
+    def test_insert_split(self):
+        rnd = random.Random(1)
+        keys = list(range(1000))
+        rnd.shuffle(keys)
+        tree = ShardedTreap(max_shard_size=64)
+        for key in keys:
+            tree.insert(key, rnd.random(), -key)
+        assert all(len(shard) <= 64 for shard in tree.shards)
+        assert len(tree.shards) == len(tree.bounds) + 1 >= 16
+        self._check(tree, list(range(1000)))
+        assert all(tree.search(key).val == -key for key in keys)
+        assert tree.search(1000) is None
+
+    def test_delete_merge(self):
+        rnd = random.Random(2)
+        tree = ShardedTreap(max_shard_size=64)
+        for key in range(1000):
+            tree.insert(key, rnd.random())
+        shards = len(tree.shards)
+        for key in range(0, 1000, 2):
+            assert tree.delete(key).key == key
+        for key in range(1, 1000, 2):
+            if key % 10 != 1:
+                tree.delete(key)
+        assert tree.delete(0) is None
+        assert len(tree.shards) < shards
+        self._check(tree, list(range(1, 1000, 10)))
+
+    def test_equal_keys(self):
+        tree = ShardedTreap(max_shard_size=4)
+        for priority in range(10):
+            tree.insert(7, priority)
+        tree.insert(8, 0)
+        tree.insert(6, 0)
+        self._check(tree, [6] + [7] * 10 + [8])
+
+    def test_split_duplicates(self):
+        tree = ShardedTreap(max_shard_size=4)
+        for priority in range(20):
+            tree.insert(9, priority)
+        tree.insert(1, 0)
+        assert tree.bounds == (1,)
+        self._check(tree, [1] + [9] * 20)
+        rnd = random.Random(8)
+        tree = ShardedTreap(max_shard_size=2)
+        keys = []
+        for _ in range(300):
+            keys.append(rnd.randrange(20))
+            tree.insert(keys[-1], rnd.random())
+        self._check(tree, sorted(keys))
+        assert all(len(shard) <= 2 or len(set(x.key for x in shard)) == 1 for shard in tree.shards)
+
+    def test_insert_many_stored(self):
+        tree = ShardedTreap(boundaries=[50], max_shard_size=8)
+        tree.insert(1, 0.1, 'old')
+        tree.insert_many([(1, 0.5, 'new'), (1, 0.05, 'newer')])
+        assert sorted(x.val for x in tree) == ['new', 'newer', 'old']
+        rnd = random.Random(9)
+        keys = [rnd.randrange(100) for _ in range(200)]
+        for key in keys[:100]:
+            tree.insert(key, rnd.random())
+        tree.insert_many((key, rnd.random(), None) for key in keys[100:])
+        self._check(tree, sorted([1, 1, 1] + keys))
+
+    @parameterized([
+        (None,),
+        (ThreadPoolExecutor,),
+        (ProcessPoolExecutor,),
+    ])
+    def test_insert_many_range(self, executor_class):
+        rnd = random.Random(3)
+        keys = rnd.sample(range(10000), 3000)
+        executor = executor_class and executor_class(max_workers=2)
+        try:
+            tree = ShardedTreap(boundaries=[2500, 5000, 7500], max_shard_size=500, executor=executor)
+            tree.insert_many((key, rnd.random(), str(key)) for key in keys[:1000])
+            tree.insert_many((key, rnd.random(), str(key)) for key in keys[1000:])
+            assert all(len(shard) <= 500 for shard in tree.shards)
+            self._check(tree, sorted(keys))
+            assert [(x.key, x.val) for x in tree.range(1234, 8765)] == \
+                [(key, str(key)) for key in sorted(keys) if 1234 <= key < 8765]
+            assert [x.key for x in tree.range(high=100)] == [key for key in sorted(keys) if key < 100]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def test_key(self):
+        tree = ShardedTreap(boundaries=[-50], max_shard_size=8, key=lambda x: -x)
+        for key in range(100):
+            tree.insert(key, key)
+        assert [x.key for x in tree] == list(range(99, -1, -1))
+        assert [x.key for x in tree.range(60, 40)] == list(range(60, 40, -1))
+
+    @raises(ValueError)
+    def test_max_shard_size_error(self):
+        ShardedTreap(max_shard_size=1)
+
+    def _check(self, tree, keys):
+        assert [x.key for x in tree] == keys
+        assert len(tree) == len(keys)
+        for low, shard, high in zip([None] + list(tree.bounds), tree.shards, list(tree.bounds) + [None]):
+            assert self._is_valid(shard)
+            for node in shard:
+                assert (low is None or node.key > low) and (high is None or node.key <= high)
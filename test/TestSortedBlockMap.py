@@ -0,0 +1,86 @@
+import bisect
+import random
+
+from nose.tools import raises
+from parameterized import parameterized
+
+from SortedBlockMap import Entry, SortedBlockMap
+
+
+class TestSortedBlockMap(object):
+    @parameterized([
+        (2, None),
+        (4, None),
+        (4, lambda x: -x),
+        (512, None),
+    ])
+    def test_random(self, load, key):
+        rnd = random.Random(3)
+        tree = SortedBlockMap(load=load, key=key)
+        cmp_key = key or (lambda x: x)
+        ref = []
+        for _ in range(4000):
+            k = rnd.randrange(300)
+            op = rnd.random()
+            if op < 0.55:
+                tree.insert(key=k, val=-k)
+                bisect.insort(ref, (cmp_key(k), k))
+            elif op < 0.85:
+                entry = tree.delete(k)
+                i = bisect.bisect_left(ref, (cmp_key(k), k))
+                found = i < len(ref) and ref[i][1] == k
+                assert (entry is not None) == found
+                if found:
+                    assert entry.key == k and entry.val == -k
+                    del ref[i]
+            else:
+                entry = tree.search(k)
+                assert (entry is not None) == ((cmp_key(k), k) in ref)
+            assert all(len(block) <= 2 * load for block in tree._keys)
+        assert len(tree) == len(ref)
+        assert [x.key for x in tree] == [k for _, k in ref]
+        assert [x.key for x in reversed(tree)] == [k for _, k in reversed(ref)]
+        assert tree._maxes == [block[-1] for block in tree._sort_keys]
+        assert [tree.select(i).key for i in range(len(ref))] == [k for _, k in ref]
+
+    @parameterized([
+        (3,),
+        (512,),
+    ])
+    def test_bounds(self, load):
+        tree = SortedBlockMap(load=load)
+        assert tree.floor(1) is None and tree.ceiling(1) is None and tree.rank(1) == 0
+        assert list(tree.range(0, 10)) == []
+        for k in range(0, 100, 2):
+            tree.insert(key=k, val=str(k))
+        assert tree.floor(51).key == 50 and tree.floor(50).key == 50 and tree.floor(-1) is None
+        assert tree.ceiling(51).key == 52 and tree.ceiling(52).key == 52 and tree.ceiling(99) is None
+        assert tree.predecessor(50).key == 48 and tree.predecessor(0) is None
+        assert tree.successor(50).key == 52 and tree.successor(98) is None
+        assert tree.rank(50) == 25 and tree.rank(51) == 26 and tree.rank(1000) == 50
+        assert [x.key for x in tree.range(11, 21)] == [12, 14, 16, 18, 20]
+        assert [x.key for x in tree.range(11, 21, reverse=True)] == [20, 18, 16, 14, 12]
+        assert [x.key for x in tree.range(high=5)] == [0, 2, 4]
+        assert [x.key for x in tree.range(95)] == [96, 98]
+        assert tree.select(-1).key == 98
+
+    def test_update(self):
+        tree = SortedBlockMap(load=2)
+        for k in [5, 1, 3, 3]:
+            tree.insert(key=k, val=k)
+        assert tree.update(3, 'x').val == 'x'
+        assert tree.search(3).val == 'x' and tree.update(4, 'y') is None
+        assert [x.val for x in tree] == [1, 'x', 3, 5]
+
+    def test_insert_node(self):
+        tree = SortedBlockMap()
+        tree.insert(Entry(1, 'a'))
+        assert tree.search(1).val == 'a'
+
+    @raises(ValueError)
+    def test_insert_error(self):
+        SortedBlockMap().insert()
+
+    @raises(IndexError)
+    def test_select_error(self):
+        SortedBlockMap().select(0)
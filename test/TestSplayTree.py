@@ -0,0 +1,133 @@
+import random
+from collections import Counter
+
+from nose.tools import raises
+from parameterized import parameterized
+
+from test import utils
+from tree.SplayTreeImpl import SplayTreeImpl
+
+
+class TestSplayTree(object):
+    @parameterized([
+        ([1, 2, 3, 4, 5, 6, 7, 8],),
+        ([8, 7, 6, 5, 4, 3, 2, 1],),
+        ([3, 1, 2, 3, 3],),
+    ])
+    def test_insert(self, seq):
+        tree = SplayTreeImpl()
+        for key in seq:
+            tree.insert(key=key)
+            assert tree.root.key == key
+        assert [x.key for x in tree] == sorted(seq)
+        assert utils.parents_ok(tree)
+
+    @raises(ValueError)
+    def test_insert_error(self):
+        SplayTreeImpl().insert()
+
+    @parameterized([
+        (False,),
+        (True,),
+    ])
+    def test_random(self, order_statistics):
+        rnd = random.Random(6)
+        tree = SplayTreeImpl(order_statistics=order_statistics)
+        keys = Counter()
+        for _ in range(3000):
+            key = rnd.randrange(500)
+            op = rnd.random()
+            if op < 0.5:
+                tree.insert(key=key, val=-key)
+                keys[key] += 1
+            elif op < 0.8:
+                node = tree.delete(key)
+                assert (node is not None) == (keys[key] > 0)
+                if node is not None:
+                    keys[key] -= 1
+            else:
+                node = tree.search(key)
+                assert (node is not None) == (keys[key] > 0)
+                assert node is None or self._depth(node) <= 2
+        assert [x.key for x in tree] == sorted(keys.elements())
+        assert utils.parents_ok(tree)
+        if order_statistics:
+            assert len(tree) == sum(keys.values())
+            assert [tree.select(i).key for i in range(len(tree))] == sorted(keys.elements())
+
+    def test_skewed(self):
+        rnd = random.Random(7)
+        keys = list(range(10000))
+        rnd.shuffle(keys)
+        tree = SplayTreeImpl()
+        for key in keys:
+            tree.insert(key=key)
+        hot = keys[:10]
+        for _ in range(200):
+            tree.search(rnd.choice(hot))
+        depth = dict((node.key, self._depth(node)) for node in tree)
+        assert max(depth[key] for key in hot) < 12
+
+    def test_key(self):
+        tree = SplayTreeImpl(key=lambda x: -x)
+        for key in range(50):
+            tree.insert(key=key, val=str(key))
+        assert [x.key for x in tree] == list(range(49, -1, -1))
+        assert tree.update(10, 'x').val == 'x' and tree.root.key == 10
+        assert tree.delete(10).key == 10 and tree.search(10) is None
+
+    def test_stats(self):
+        tree = SplayTreeImpl()
+        for key in range(100):
+            tree.insert(key=key)
+        tree.enable_stats()
+        tree.search(0)
+        assert tree.root.key == 0
+        tree.search(0)
+        report = tree.stats.report()
+        assert report['ops']['search']['calls'] == 2 and report['depths'] == {100: 1, 1: 1}
+        # every node on the path is compared once, and each zig-zig step down the left spine rotates once
+        assert report['totals']['comparisons'] == 200 and report['totals']['rotations'] == 49
+
+    @parameterized([
+        (False, None),
+        (True, None),
+        (False, lambda x: -x),
+        (True, lambda x: -x),
+    ])
+    def test_shallow(self, stats, key):
+        rnd = random.Random(8)
+        keys = rnd.sample(range(1000), 200)
+        tree = SplayTreeImpl(key=key)
+        for k in keys:
+            tree.insert(key=k)
+        if stats:
+            tree.enable_stats()
+        shape = [(node.key, self._depth(node)) for node in tree]
+        by_depth = {}
+        for node in tree:
+            by_depth[self._depth(node)] = node
+        for depth in range(3):
+            assert tree.search(by_depth[depth].key) is by_depth[depth]
+        assert [(node.key, self._depth(node)) for node in tree] == shape
+        deep = by_depth[3]
+        assert tree.search(deep.key) is deep and tree.root is deep
+        assert utils.parents_ok(tree)
+        if stats:
+            assert tree.stats.report()['depths'] == {1: 1, 2: 1, 3: 1, 4: 1}
+
+    def test_finger(self):
+        tree = SplayTreeImpl()
+        for key in range(0, 100, 2):
+            tree.insert(key=key)
+        assert tree.finger_search(40).key == 40 and tree.finger is tree.search(40)
+        assert tree.finger_search(43) is None and tree.finger_search(44).key == 44
+        tree.delete(44)
+        assert tree.finger is None and tree.finger_search(42).key == 42
+
+    def _depth(self, node):
+        depth = 0
+        while node.parent is not None:
+            node = node.parent
+            depth += 1
+        return depth
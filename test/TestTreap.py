@@ -1,13 +1,24 @@
+import copy
+import operator
+import pickle
+import random
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from nose.tools import raises
 from parameterized import parameterized
 
 from test import utils
 from tree.TreapImpl import TreapImpl
+from treenode.NodePool import TreapNodePool
+from treenode.TreapNode import SizedTreapNode
 
 
 class TestTreap(object):
+    _sizes_ok = staticmethod(utils.sizes_ok)
+    _parents_ok = staticmethod(utils.parents_ok)
+    _is_valid = staticmethod(utils.treap_is_valid)
+
     @parameterized([
         ([(1, 1), (2, 2), (3, 3), (4, 4)],),
         ([(4, 1), (3, 2), (2, 3), (1, 4)],),
@@ -159,20 +170,446 @@ class TestTreap(object):
         should = sorted(keys1) + sorted(keys2)
         assert got == should
 
-    def _is_valid(self, tree):
-        if tree.root is None:
-            return True
-
-        def recursive(node):
-            lp = rp = tree._leaf
-            if node.left is not None:
-                lp = node.left.priority
-                if not recursive(node.left):
-                    return False
-            if node.right is not None:
-                rp = node.right.priority
-                if not recursive(node.right):
-                    return False
-            return not tree._priority_lt(lp, node.priority) and not tree._priority_lt(rp, node.priority)
-
-        return recursive(tree.root)
+    def test_deep(self):
+        n = 5000
+        tree = TreapImpl()
+        for key in range(n):
+            tree.insert(key=key, priority=key)
+        assert all(tree.search(key).key == key for key in range(n))
+
+    @parameterized([
+        (False, False),
+        (True, False),
+        (True, True),
+    ])
+    def test_pickle(self, order_statistics, pooled):
+        n = 5000
+        kwargs = dict(order_statistics=order_statistics)
+        if pooled:
+            kwargs['nodeclass'] = TreapNodePool(sized=order_statistics)
+        tree = TreapImpl(**kwargs)
+        # priorities make the treap a path, deeper than the recursion limit
+        for key in range(n):
+            tree.insert(key=key, priority=key, val=-key)
+        for loaded in (pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)), copy.deepcopy(tree)):
+            assert [(x.key, x.priority, x.val) for x in loaded] == [(k, k, -k) for k in range(n)]
+            assert loaded.root.key == 0
+            if order_statistics:
+                assert loaded.root.size == n and loaded.rank(n // 2) == n // 2
+            loaded.delete(0)
+            assert tree.search(0) is not None
+
+    def test_pickle_empty(self):
+        loaded = pickle.loads(pickle.dumps(TreapImpl(priority_lt=operator.gt)))
+        assert loaded.root is None
+        loaded.insert(key=1, priority=1)
+        loaded.insert(key=2, priority=2)
+        assert loaded.root.key == 2
+
+    def test_random_priorities(self):
+        n = 20000
+        tree = TreapImpl(random_priorities=True, seed=1)
+        for key in range(n):
+            tree.insert(key=key, val=-key)
+        assert self._is_valid(tree)
+        assert self._depth(tree.root) < 60
+        assert [(x.key, x.val) for x in tree] == [(key, -key) for key in range(n)]
+        other = TreapImpl(random_priorities=True, seed=1)
+        for key in range(100):
+            other.insert(key=key)
+        assert [x.priority for x in other] == [x.priority for x in tree][:100]
+        # explicit priorities still decide the shape
+        tree.insert(key=n // 2, priority=-1)
+        assert tree.root.key == n // 2 and tree.root.priority == -1
+
+    def test_random_priorities_from_sorted(self):
+        tree = TreapImpl.from_sorted(iter(range(1000)), random_priorities=True, seed=2)
+        assert self._is_valid(tree)
+        assert [x.key for x in tree] == list(range(1000))
+        loaded = pickle.loads(pickle.dumps(tree))
+        assert [x.priority for x in loaded] == [x.priority for x in tree]
+        loaded.insert(key=1000)
+
+    @raises(ValueError)
+    def test_random_priorities_error(self):
+        TreapImpl.from_sorted(range(10))
+
+    @raises(ValueError)
+    def test_priority_error(self):
+        TreapImpl().insert(key=1)
+
+    def _depth(self, root):
+        depth = 0
+        stack = [(root, 1)]
+        while stack:
+            node, d = stack.pop()
+            depth = max(depth, d)
+            for child in (node.left, node.right):
+                if child is not None:
+                    stack.append((child, d + 1))
+        return depth
+
+    def test_finger(self):
+        rnd = random.Random(4)
+        tree = TreapImpl(order_statistics=True)
+        keys = []
+        for i in range(3000):
+            key = rnd.randrange(1000) if i % 3 == 0 else (keys[-1] + rnd.randrange(-3, 4) if keys else 0)
+            tree.finger_insert(key=key, priority=rnd.random(), val=-key)
+            keys.append(key)
+            assert tree.finger.key == key
+            if i % 7 == 0:
+                key = rnd.choice(keys)
+                tree.delete(key)
+                keys.remove(key)
+        assert self._is_valid(tree)
+        assert [x.key for x in tree] == sorted(keys)
+        assert self._sizes_ok(tree.root)
+        for probe in range(-5, 1005):
+            node = tree.finger_search(probe)
+            assert (node is not None) == (probe in keys)
+            assert node is None or (node.key == probe and node.val == -probe)
+            assert tree.finger is not None
+
+    def test_finger_locality(self):
+        tree = TreapImpl.from_sorted(range(1 << 14), random_priorities=True, seed=1)
+        stats = tree.enable_stats()
+        for key in range(1000, 2000):
+            assert tree.finger_search(key).key == key
+        near = stats.totals['comparisons']
+        stats.reset()
+        for key in range(1000, 2000):
+            tree.search(key)
+        assert near * 2 < stats.totals['comparisons']
+        tree.delete(1999)
+        assert tree.finger is None and tree.finger_search(1998).key == 1998
+
+    def test_node_pool(self):
+        rnd = random.Random(7)
+        keys = list(range(500))
+        rnd.shuffle(keys)
+        pool = TreapNodePool()
+        tree = TreapImpl(nodeclass=pool)
+        for key in keys:
+            tree.insert(key=key, priority=rnd.random(), val=-key)
+        assert self._is_valid(tree)
+        for key in keys[:300]:
+            pool.free(tree.delete(key))
+        assert self._is_valid(tree)
+        assert len(pool) == 200
+        got = [(x.key, x.val) for x in utils.inorder(tree.root)]
+        assert got == [(k, -k) for k in sorted(keys[300:])]
+
+    @parameterized([
+        ([],),
+        ([(1, 1), (2, 2), (3, 3), (4, 4)],),
+        ([(1, 4), (2, 3), (3, 2), (4, 1)],),
+        ([(1, 2), (2, 1), (3, 4), (4, 3), (5, 3)],),
+    ])
+    def test_from_sorted(self, seq):
+        keys = [key for key, _ in seq]
+        tree = TreapImpl.from_sorted(iter(keys), (priority for _, priority in seq), [-key for key in keys])
+        assert self._is_valid(tree)
+        assert [(x.key, x.val) for x in utils.inorder(tree.root)] == [(key, -key) for key in keys]
+        for node in utils.inorder(tree.root):
+            for child in (node.left, node.right):
+                assert child is None or child.parent is node
+
+    def test_from_sorted_random(self):
+        rnd = random.Random(3)
+        priorities = [rnd.random() for _ in range(1000)]
+        tree = TreapImpl.from_sorted(range(1000), priorities)
+        expected = TreapImpl()
+        for key, priority in enumerate(priorities):
+            expected.insert(key=key, priority=priority)
+        shape = lambda t: [(x.key, x.parent and x.parent.key) for x in utils.inorder(t.root)]
+        assert shape(tree) == shape(expected)
+
+    @raises(ValueError)
+    def test_from_sorted_error(self):
+        TreapImpl.from_sorted([1, 3, 2], [1, 2, 3])
+
+    @parameterized([
+        ('union', True, None),
+        ('union', False, None),
+        ('union', True, ThreadPoolExecutor),
+        ('union', False, ProcessPoolExecutor),
+        ('intersect', True, None),
+        ('intersect', False, None),
+        ('intersect', True, ThreadPoolExecutor),
+        ('intersect', False, ProcessPoolExecutor),
+        ('difference', True, None),
+        ('difference', False, None),
+        ('difference', True, ThreadPoolExecutor),
+        ('difference', False, ProcessPoolExecutor),
+    ])
+    def test_set_operation(self, op, destructive, executor_class):
+        rnd = random.Random(op)
+        keys1 = rnd.sample(range(600), 300)
+        keys2 = rnd.sample(range(600), 200)
+        tree1 = TreapImpl()
+        tree2 = TreapImpl()
+        for key in keys1:
+            tree1.insert(key=key, priority=rnd.random(), val=1)
+        for key in keys2:
+            tree2.insert(key=key, priority=rnd.random(), val=2)
+        if executor_class is None:
+            res = getattr(TreapImpl, op)(tree1, tree2, destructive=destructive)
+        else:
+            with executor_class(max_workers=2) as executor:
+                res = getattr(TreapImpl, op)(tree1, tree2, destructive=destructive, executor=executor,
+                                             parallel_min_size=16)
+        should = {'union': set(keys1) | set(keys2),
+                  'intersect': set(keys1) & set(keys2),
+                  'difference': set(keys1) - set(keys2)}[op]
+        assert self._is_valid(res)
+        assert self._parents_ok(res)
+        assert [x.key for x in utils.inorder(res.root)] == sorted(should)
+        if op != 'union':
+            assert all(x.val == 1 for x in utils.inorder(res.root))
+        if destructive:
+            assert tree1.root is None and tree2.root is None
+        else:
+            assert sorted(x.key for x in utils.inorder(tree1.root)) == sorted(keys1)
+            assert sorted(x.key for x in utils.inorder(tree2.root)) == sorted(keys2)
+            assert self._is_valid(tree1) and self._is_valid(tree2)
+            assert self._parents_ok(tree1) and self._parents_ok(tree2)
+
+    @parameterized([
+        (None,),
+        (ThreadPoolExecutor,),
+    ])
+    def test_union_keep_duplicates(self, executor_class):
+        rnd = random.Random(37)
+        keys1 = [rnd.randrange(100) for _ in range(300)]
+        keys2 = [rnd.randrange(100) for _ in range(200)]
+        tree1 = TreapImpl(order_statistics=True)
+        tree2 = TreapImpl(order_statistics=True)
+        for key in keys1:
+            tree1.insert(key=key, priority=rnd.random(), val=1)
+        for key in keys2:
+            tree2.insert(key=key, priority=rnd.random(), val=2)
+        executor = executor_class and executor_class(max_workers=2)
+        try:
+            res = TreapImpl.union(tree1, tree2, executor=executor, keep_duplicates=True, parallel_min_size=16)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        assert self._is_valid(res) and self._parents_ok(res) and self._sizes_ok(res.root)
+        assert [x.key for x in res] == sorted(keys1 + keys2)
+        assert sorted((x.key, x.val) for x in res) == sorted([(k, 1) for k in keys1] + [(k, 2) for k in keys2])
+
+    @parameterized([
+        ('intersect', False),
+        ('intersect', True),
+        ('difference', False),
+    ])
+    def test_set_operation_copies(self, op, order_statistics):
+        created = []
+
+        class Node(SizedTreapNode):
+            __slots__ = ()
+
+            def __init__(self, *args):
+                super(Node, self).__init__(*args)
+                created.append(self)
+
+        rnd = random.Random(41)
+        tree1 = TreapImpl(nodeclass=Node, order_statistics=order_statistics)
+        tree2 = TreapImpl(nodeclass=Node, order_statistics=order_statistics)
+        for key in range(2000):
+            tree1.insert(key=key, priority=rnd.random())
+        for key in (5, 700, 1500):
+            tree2.insert(key=key, priority=rnd.random())
+        del created[:]
+        res = getattr(TreapImpl, op)(tree2, tree1, destructive=False)
+        # only the nodes on the split paths of the three keys and those of the result are copied
+        assert [x.key for x in res] == ([5, 700, 1500] if op == 'intersect' else [])
+        assert len(created) < 200
+        assert [x.key for x in tree1] == list(range(2000)) and self._parents_ok(tree1)
+        assert self._is_valid(res) and self._parents_ok(res)
+        if order_statistics:
+            assert self._sizes_ok(res.root) and self._sizes_ok(tree1.root)
+
+    def test_parallel_min_size(self):
+        submitted = []
+
+        class Executor(ThreadPoolExecutor):
+            def submit(self, *args, **kwargs):
+                submitted.append(args)
+                return super(Executor, self).submit(*args, **kwargs)
+
+        rnd = random.Random(43)
+        small = TreapImpl(random_priorities=True, seed=1)
+        large = TreapImpl(random_priorities=True, seed=2)
+        for key in rnd.sample(range(10000), 100):
+            small.insert(key=key)
+        for key in rnd.sample(range(10000), 5000):
+            large.insert(key=key)
+        with Executor(max_workers=2) as executor:
+            res = TreapImpl.union(small, TreapImpl(random_priorities=True), destructive=False, executor=executor)
+            assert len(list(res)) == 100 and submitted == []
+            res = TreapImpl.union(small, large, destructive=False, executor=executor, parallel_depth=3,
+                                  parallel_min_size=500)
+        assert self._is_valid(res) and self._parents_ok(res)
+        assert [x.key for x in res] == sorted(set(x.key for x in small) | set(x.key for x in large))
+        assert 0 < len(submitted) <= 7
+
+    @parameterized([
+        ('union',), ('intersect',), ('difference',),
+    ])
+    def test_set_operation_empty(self, op):
+        tree1 = TreapImpl()
+        tree2 = TreapImpl()
+        tree1.insert(key=1, priority=1)
+        res = getattr(TreapImpl, op)(tree1, tree2)
+        assert [x.key for x in utils.inorder(res.root)] == ([] if op == 'intersect' else [1])
+
+    def test_key(self):
+        rnd = random.Random(5)
+        keys = rnd.sample(range(100), 50)
+        tree = TreapImpl(key=lambda x: -x)
+        for key in keys:
+            tree.insert(key=key, priority=rnd.random())
+        assert [x.key for x in utils.inorder(tree.root)] == sorted(keys, reverse=True)
+        assert all(tree.search(key).key == key for key in keys)
+        other = TreapImpl(key=lambda x: -x)
+        for key in range(0, 100, 2):
+            other.insert(key=key, priority=rnd.random())
+        res = TreapImpl.intersect(tree, other, destructive=False)
+        assert [x.key for x in utils.inorder(res.root)] == sorted((k for k in keys if k % 2 == 0), reverse=True)
+        res = tree.split(keys[0], keep_pivot=False)
+        assert all(x.key > keys[0] for x in utils.inorder(res.left.root))
+        assert all(x.key < keys[0] for x in utils.inorder(res.right.root))
+
+    def test_order_statistics(self):
+        rnd = random.Random(13)
+        keys = rnd.sample(range(1000), 400)
+        tree = TreapImpl(order_statistics=True)
+        for key in keys:
+            tree.insert(key=key, priority=rnd.random())
+        for key in keys[:150]:
+            tree.delete(key)
+        for key in keys[150:200]:
+            tree.update_priority(key, rnd.random())
+        live = sorted(keys[150:])
+        assert self._sizes_ok(tree.root)
+        assert len(tree) == len(live)
+        assert [tree.select(i).key for i in range(len(live))] == live
+        assert all(tree.rank(key) == live.index(key) for key in live)
+        res = tree.split(live[100], keep_pivot=False)
+        assert self._sizes_ok(res.left.root) and self._sizes_ok(res.right.root)
+        assert len(res.left) == 100 and res.right.select(0).key == live[101]
+        joined = TreapImpl.join(res.left, res.right)
+        assert self._sizes_ok(joined.root) and len(joined) == len(live) - 1
+        other = TreapImpl.from_sorted(range(0, 1000, 3), [rnd.random() for _ in range(0, 1000, 3)],
+                                      order_statistics=True)
+        assert self._sizes_ok(other.root)
+        for op in ('union', 'intersect', 'difference'):
+            res = getattr(TreapImpl, op)(joined, other, destructive=False)
+            assert self._sizes_ok(res.root)
+            assert len(res) == len(list(utils.inorder(res.root)))
+
+    @parameterized([
+        (None, None),
+        (10, 30),
+        (-5, 15),
+        (25, 100),
+        (30, 10),
+    ])
+    def test_range(self, low, high):
+        rnd = random.Random(17)
+        keys = [rnd.randrange(40) for _ in range(60)]
+        tree = TreapImpl()
+        for key in keys:
+            tree.insert(key=key, priority=rnd.random())
+        should = sorted(k for k in keys if (low is None or k >= low) and (high is None or k < high))
+        assert [x.key for x in tree.range(low, high)] == should
+        assert [x.key for x in tree.range(low, high, reverse=True)] == should[::-1]
+        if low is None and high is None:
+            assert [x.key for x in tree] == should
+            assert [x.key for x in reversed(tree)] == should[::-1]
+
+    def test_neighbors(self):
+        rnd = random.Random(19)
+        keys = rnd.sample(range(0, 100, 2), 30)
+        tree = TreapImpl()
+        for key in keys:
+            tree.insert(key=key, priority=rnd.random())
+        key = lambda node: node and node.key
+        for probe in range(-1, 101):
+            lower = [k for k in keys if k < probe]
+            upper = [k for k in keys if k > probe]
+            floor = max(lower + [k for k in keys if k == probe] or [None])
+            ceiling = min(upper + [k for k in keys if k == probe] or [None])
+            assert key(tree.floor(probe)) == floor
+            assert key(tree.ceiling(probe)) == ceiling
+            assert key(tree.predecessor(probe)) == max(lower or [None])
+            assert key(tree.successor(probe)) == min(upper or [None])
+
+    @parameterized([
+        (False, False),
+        (True, False),
+        (False, True),
+        (True, True),
+    ])
+    def test_multiset(self, order_statistics, pooled):
+        rnd = random.Random(31)
+        kwargs = dict(multiset=True, order_statistics=order_statistics, random_priorities=True, seed=3)
+        if pooled:
+            kwargs['nodeclass'] = TreapNodePool(sized=order_statistics, counted=True)
+        tree = TreapImpl(**kwargs)
+        counts = Counter()
+        for _ in range(5000):
+            key = rnd.randrange(50)
+            if rnd.random() < 0.6:
+                tree.insert(key=key)
+                counts[key] += 1
+            else:
+                node = tree.remove_one(key)
+                assert (node is None) == (counts[key] == 0)
+                if counts[key]:
+                    counts[key] -= 1
+            assert tree.count(key) == counts[key]
+        assert self._is_valid(tree)
+        distinct = sorted(key for key in counts if counts[key])
+        assert [(x.key, x.count) for x in tree] == [(key, counts[key]) for key in distinct]
+        if order_statistics:
+            assert len(tree) == len(distinct)
+        loaded = pickle.loads(pickle.dumps(tree))
+        assert [(x.key, x.priority, x.count) for x in loaded] == [(x.key, x.priority, x.count) for x in tree]
+        copied = TreapImpl.union(tree, TreapImpl(multiset=True, random_priorities=True), destructive=False)
+        assert [(x.key, x.count) for x in copied] == [(key, counts[key]) for key in distinct]
+        res = tree.split(distinct[1])
+        assert [(x.key, x.count) for x in res.left] == [(key, counts[key]) for key in distinct[:2]]
+        assert [(x.key, x.count) for x in res.right] == [(key, counts[key]) for key in distinct[2:]]
+        assert res.pivot.key == distinct[1] and res.pivot.count == 1
+
+    @parameterized([
+        ('union', False),
+        ('union', True),
+        ('intersect', False),
+        ('difference', False),
+    ])
+    def test_multiset_set_operation(self, op, keep_duplicates):
+        rnd = random.Random(op)
+        trees = []
+        counters = []
+        for keys in ([1, 2, 2, 3], [2, 3, 3, 4]), ([rnd.randrange(40) for _ in range(300)],
+                                                   [rnd.randrange(40) for _ in range(200)]):
+            pair = []
+            for sample in keys:
+                tree = TreapImpl(multiset=True, order_statistics=True, random_priorities=True, seed=rnd.random())
+                for key in sample:
+                    tree.insert(key=key)
+                pair.append(tree)
+            trees.append(pair)
+            counters.append([Counter(sample) for sample in keys])
+        for (tree1, tree2), (count1, count2) in zip(trees, counters):
+            kwargs = dict(keep_duplicates=True) if keep_duplicates else {}
+            res = getattr(TreapImpl, op)(tree1, tree2, **kwargs)
+            should = {'union': count1 + count2, 'intersect': count1 & count2, 'difference': count1 - count2}[op]
+            assert self._is_valid(res) and self._parents_ok(res) and self._sizes_ok(res.root)
+            assert [(x.key, x.count) for x in res] == sorted(should.items())
+            assert all(res.count(key) == should[key] for key in set(count1) | set(count2))
+            assert len(res) == len(should)
@@ -0,0 +1,100 @@
+import pickle
+import random
+
+from parameterized import parameterized
+
+from tree.BasicBSTImpl import BasicBSTImpl
+from tree.PersistentRedBlackTreeImpl import PersistentRedBlackTreeImpl
+from tree.RedBlackTreeImpl import RedBlackTreeImpl
+from tree.TreapImpl import TreapImpl
+from treenode.BinaryIndexTreeNode import BinaryIndexTreeNode
+
+
+class TestTreeStats(object):
+    @parameterized([
+        (RedBlackTreeImpl,),
+        (TreapImpl,),
+        (lambda: BasicBSTImpl(BinaryIndexTreeNode),),
+    ])
+    def test_counts(self, factory):
+        tree = factory()
+        calls = []
+        stats = tree.enable_stats(hook=lambda op, counts: calls.append((op, counts)))
+        rnd = random.Random(5)
+        keys = list(range(500))
+        rnd.shuffle(keys)
+        for key in keys:
+            if isinstance(tree, TreapImpl):
+                tree.insert(key=key, priority=rnd.random())
+            else:
+                tree.insert(key=key)
+        for key in keys[:100]:
+            assert tree.search(key).key == key
+        for key in keys[:250]:
+            tree.delete(key)
+        report = stats.report()
+        assert report['ops']['insert']['calls'] == 500
+        assert report['ops']['search']['calls'] == 100
+        assert report['ops']['delete']['calls'] == 250
+        assert report['totals']['comparisons'] == sum(counts['comparisons'] for _, counts in calls) > 0
+        assert len(calls) == 850
+        if isinstance(tree, RedBlackTreeImpl):
+            assert 0 < report['ops']['insert']['fixups'] < 500
+            assert report['totals']['rotations'] > 0
+        if isinstance(tree, TreapImpl):
+            assert report['totals']['rolling_steps'] == report['totals']['rotations'] > 0
+        if not isinstance(tree, BasicBSTImpl):
+            assert sum(report['depths'].values()) >= 100
+        assert [x.key for x in tree] == sorted(keys[250:])
+
+    @parameterized([
+        (RedBlackTreeImpl,),
+        (PersistentRedBlackTreeImpl,),
+    ])
+    def test_fixups(self, cls):
+        tree = cls()
+        calls = []
+        stats = tree.enable_stats(hook=lambda op, counts: calls.append((op, counts['fixups'])))
+        for key in range(3):
+            tree.insert(key=key)
+        assert stats.totals['fixups'] == 0
+        # red parent and red uncle: recolor and climb once to the root
+        tree.insert(key=3)
+        assert stats.totals['fixups'] == 1
+        for key in range(4, 1000):
+            tree.insert(key=key)
+        for key in range(1000):
+            tree.delete(key)
+        assert max(fixups for op, fixups in calls if op == 'insert') > 1
+        assert max(fixups for op, fixups in calls if op == 'delete') > 1
+        assert stats.ops['insert']['fixups'] != stats.ops['insert']['calls']
+
+    def test_depths(self):
+        tree = RedBlackTreeImpl.from_sorted(range(7))
+        stats = tree.enable_stats()
+        for key in range(7):
+            tree.search(key)
+        tree.search(7)
+        assert stats.report()['depths'] == {1: 1, 2: 2, 3: 5}
+
+    def test_disable(self):
+        tree = RedBlackTreeImpl()
+        stats = tree.enable_stats()
+        assert tree.stats is stats and not tree._native
+        tree.disable_stats()
+        assert tree.stats is None and tree._native
+        assert set(tree.__dict__) == set(RedBlackTreeImpl().__dict__)
+        tree.insert(key=1)
+        assert stats.totals['comparisons'] == 0
+
+    def test_copies(self):
+        tree = TreapImpl()
+        stats = tree.enable_stats()
+        for key in range(20):
+            tree.insert(key=key, priority=key)
+        loaded = pickle.loads(pickle.dumps(tree))
+        assert loaded.stats is None and [x.key for x in loaded] == list(range(20))
+        res = tree.split(10)
+        assert res.left.stats is None and res.left._native
+        res.left.insert(key=-1, priority=0)
+        assert stats.ops['insert']['calls'] == 20
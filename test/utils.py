@@ -4,3 +4,69 @@ def inorder(node):
     yield from inorder(node.left)
     yield node
     yield from inorder(node.right)
+
+
+def sizes_ok(node):
+    return all(x.size == 1 + (x.left.size if x.left else 0) + (x.right.size if x.right else 0)
+               for x in inorder(node))
+
+
+def parents_ok(tree):
+    if tree.root is not None and tree.root.parent is not None:
+        return False
+    for node in inorder(tree.root):
+        for child in (node.left, node.right):
+            if child is not None and child.parent is not node:
+                return False
+    return True
+
+
+def treap_is_valid(tree):
+    """
+    whether no node of `tree` has a lower priority than its children
+    """
+    if tree.root is None:
+        return True
+
+    def recursive(node):
+        lp = rp = tree._leaf
+        if node.left is not None:
+            lp = node.left.priority
+            if not recursive(node.left):
+                return False
+        if node.right is not None:
+            rp = node.right.priority
+            if not recursive(node.right):
+                return False
+        return not tree._priority_lt(lp, node.priority) and not tree._priority_lt(rp, node.priority)
+
+    return recursive(tree.root)
+
+
+def red_black_is_valid(tree):
+    """
+    whether `tree` has a black root, no red node with a red child and the same black height on every path
+    """
+    if tree.root.red:
+        return False
+
+    def recursive(node):
+        if node.red:
+            if node.left and node.right:
+                if node.left.red or node.right.red:
+                    return False
+                bhl = recursive(node.left)
+                bhr = recursive(node.right)
+                if bhl and bhr and bhl == bhr:
+                    return bhl
+            elif not node.left and not node.right:
+                return 1
+            return False
+        else:
+            bhl = recursive(node.left) if node.left else 1
+            bhr = recursive(node.right) if node.right else 1
+            if bhl and bhr and bhl == bhr:
+                return bhl + 1
+            return False
+
+    return recursive(tree.root)